@@ -0,0 +1,271 @@
+"""
+Admission control for the nutrition agent.
+
+Agent calls are slow (seconds to minutes) and each runs a subprocess, so
+they are gated before they start:
+
+- a token bucket per API key caps how fast one client can submit analyses
+  (429 when empty);
+- a global limit on concurrent agent calls, with a bounded FIFO queue of
+  waiters that give up after a timeout (503 when full or timed out);
+- a circuit breaker that fails calls fast (503) after repeated agent
+  failures, instead of letting each one wait out its timeout.
+
+All rejections carry a Retry-After estimate, and all are cheap, so sync and
+read endpoints never wait behind LLM work.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from config import (
+    AGENT_BREAKER_FAILURES,
+    AGENT_BREAKER_RESET_SECONDS,
+    AGENT_MAX_CONCURRENCY,
+    AGENT_QUEUE_SIZE,
+    AGENT_QUEUE_TIMEOUT,
+    ANALYZE_BURST,
+    ANALYZE_RATE_PER_MINUTE,
+)
+from metrics import AGENT_ADMISSION_SECONDS, AGENT_BREAKER_TRANSITIONS, AGENT_REJECTIONS
+
+
+class Rejected(Exception):
+    """A request turned away by admission control."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateLimited(Rejected):
+    status_code = 429
+
+
+class Overloaded(Rejected):
+    status_code = 503
+
+
+class CircuitOpen(Rejected):
+    status_code = 503
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token. Returns 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    One token bucket per key, created on first use. At most `max_keys`
+    buckets are kept; the least recently used is dropped (a dropped key
+    starts over with a full bucket).
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 4096):
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def check(self, key: str) -> None:
+        """Raises RateLimited when `key` has no token left."""
+        if self.rate <= 0:
+            return  # unlimited
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        wait = bucket.take()
+        if wait:
+            AGENT_REJECTIONS.labels("rate_limited").inc()
+            raise RateLimited("Too many analysis requests for this API key", wait)
+
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` holders at a time. Further callers wait in FIFO order,
+    up to `queue_size` of them and for at most `timeout` seconds each.
+    """
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._hold_seconds = 10.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _retry_after(self) -> float:
+        return self._hold_seconds * (len(self._waiters) + 1) / self.limit
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one slot for the block. Raises Overloaded when the queue is full or the wait times out."""
+        started = time.perf_counter()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        elif len(self._waiters) >= self.queue_size:
+            AGENT_REJECTIONS.labels("queue_full").inc()
+            raise Overloaded("Nutrition analysis is at capacity; try again later", self._retry_after())
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    self._abandon(waiter)
+                    AGENT_REJECTIONS.labels("queue_timeout").inc()
+                    raise Overloaded("Timed out waiting for a free analysis slot", self._retry_after()) from None
+                # else the slot was handed over just as the wait ran out
+            except asyncio.CancelledError:
+                if waiter.done():
+                    self._release()  # handed over, but the caller is gone
+                else:
+                    self._abandon(waiter)
+                raise
+        AGENT_ADMISSION_SECONDS.observe(time.perf_counter() - started)
+
+        held_from = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - held_from)
+            self._release()
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free right now, without queueing; release() it afterwards."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    def release(self) -> None:
+        """Give back a slot taken with try_acquire()."""
+        self._release()
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        self._waiters.remove(waiter)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the next waiter so newcomers can't jump the queue
+        if self._waiters:
+            self._waiters.popleft().set_result(None)
+        else:
+            self.active -= 1
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through, and `failures` failed calls in a row open it.
+    Open: calls are rejected until `reset_seconds` have passed. Half-open:
+    one probe call goes through; its success closes the breaker, its failure
+    opens it again.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def check(self) -> None:
+        """Raises CircuitOpen while the breaker is open."""
+        if self.state == "open":
+            AGENT_REJECTIONS.labels("circuit_open").inc()
+            raise CircuitOpen("Nutrition agent is failing; try again later", self.retry_after())
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[None]:
+        """
+        Admit one call for the block, which must record_success() or
+        record_failure(). In the half-open state only one call is let through.
+        """
+        self.check()
+        probe = self.state == "half_open"
+        if probe:
+            if self._probing:
+                AGENT_REJECTIONS.labels("circuit_open").inc()
+                raise CircuitOpen("Nutrition agent is recovering; try again shortly", 1)
+            self._probing = True
+        try:
+            yield
+        finally:
+            if probe:
+                self._probing = False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self._opened_at is not None:
+            self._opened_at = None
+            AGENT_BREAKER_TRANSITIONS.labels("closed").inc()
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (self._opened_at is None and self.consecutive_failures >= self.failures):
+            self._opened_at = time.monotonic()
+            AGENT_BREAKER_TRANSITIONS.labels("open").inc()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self.retry_after(), 1),
+        }
+
+
+ANALYZE_RATE_LIMITER = RateLimiter(ANALYZE_RATE_PER_MINUTE, ANALYZE_BURST)
+AGENT_SLOTS = ConcurrencyLimiter(AGENT_MAX_CONCURRENCY, AGENT_QUEUE_SIZE, AGENT_QUEUE_TIMEOUT)
+AGENT_BREAKER = CircuitBreaker(AGENT_BREAKER_FAILURES, AGENT_BREAKER_RESET_SECONDS)
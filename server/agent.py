@@ -0,0 +1,343 @@
+"""
+Nutrition agent backends.
+
+nutrition._call_agent hands prompts to the backend selected by
+HEALTHCLAW_AGENT_BACKEND:
+
+- "openclaw": the OpenClaw CLI talking to the gateway (production).
+- "simulated": a local stand-in with configurable latency and failure rate
+  that returns canned or randomized replies, for load tests without the
+  gateway.
+
+Calls are async and stop when cancelled (the CLI process is killed), so each
+analysis gets a total time budget (AGENT_TIMEOUT, counted from admission) and,
+optionally, a hedged second attempt when the first is slow or fails early.
+The hedge takes a concurrency slot of its own and is skipped when none is
+free. Calls go through the circuit breaker in admission.py, which fails them
+fast while the agent is down instead of letting each one wait out the budget.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import signal
+import time
+import uuid
+from collections import deque
+from functools import lru_cache
+
+from admission import AGENT_BREAKER, AGENT_SLOTS
+from config import (
+    AGENT_BACKEND,
+    AGENT_HEDGE_AFTER,
+    AGENT_TIMEOUT,
+    SIM_AGENT_FAILURE_RATE,
+    SIM_AGENT_JITTER_MS,
+    SIM_AGENT_LATENCY_MS,
+    SIM_AGENT_RESPONSES,
+    SIM_AGENT_SEED,
+)
+from fooddb import NUTRIENT_COLUMNS, get_food_index
+from metrics import AGENT_CALL_SECONDS, AGENT_EXIT_CODES, AGENT_HEDGES, AGENT_TIMEOUTS
+
+# Full path to openclaw CLI
+OPENCLAW_BIN = os.getenv("OPENCLAW_BIN", "/home/lars/.npm-global/bin/openclaw")
+GATEWAY_TOKEN = os.getenv(
+    "OPENCLAW_GATEWAY_TOKEN",
+    "f8ac08ae67eb64d576d08214be062d2fc74c31849e8463cb",
+)
+
+# "p95" hedges after the recent 95th percentile of successful calls, once
+# there are enough of them; a number hedges after that many seconds
+_HEDGE_ADAPTIVE = AGENT_HEDGE_AFTER == "p95"
+_HEDGE_AFTER = None if _HEDGE_ADAPTIVE or AGENT_HEDGE_AFTER in ("", "off") else float(AGENT_HEDGE_AFTER)
+_HEDGE_MIN_SAMPLES = 20
+
+# The CLI's own --timeout is the time left in the budget minus this margin (at
+# most a fifth of what is left), so it gives up and reports before the budget
+# runs out and the process is killed; 150 s left gives it 120 s
+_CLI_TIMEOUT_MARGIN = 30.0
+
+
+class AgentError(RuntimeError):
+    """The agent could not be reached or did not answer."""
+
+
+class AgentTimeout(AgentError):
+    """The agent did not answer within the time budget."""
+
+
+class AgentBackend:
+    """Turns a prompt (plus an optional food photo on disk) into the agent's text reply."""
+
+    name = ""
+
+    def __init__(self):
+        # Durations of recent successful attempts, for the adaptive hedge delay
+        self._latencies: deque[float] = deque(maxlen=200)
+
+    async def attempt(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        """
+        One call to the agent, which has until `deadline` (event loop time).
+        Raises AgentError on failure; cancelling it stops the call.
+        """
+        raise NotImplementedError
+
+    def hedge_delay(self) -> float | None:
+        """Seconds after which a second attempt is started, or None for no hedging."""
+        if not _HEDGE_ADAPTIVE:
+            return _HEDGE_AFTER
+        if len(self._latencies) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def complete(self, prompt: str, image_path: str | None = None, deadline: float | None = None) -> str:
+        """
+        The agent's reply by `deadline` (event loop time; default AGENT_TIMEOUT
+        from now). Raises CircuitOpen while the breaker is open, AgentTimeout
+        when the budget runs out and AgentError when the agent fails.
+        """
+        if deadline is None:
+            deadline = asyncio.get_running_loop().time() + AGENT_TIMEOUT
+        elif deadline <= asyncio.get_running_loop().time():
+            # Spent queueing and preprocessing; not the agent's fault, so the breaker is left alone
+            AGENT_TIMEOUTS.inc()
+            raise AgentTimeout(f"Agent time budget of {AGENT_TIMEOUT:g}s ran out before the call started")
+        async with AGENT_BREAKER.call():
+            try:
+                async with asyncio.timeout_at(deadline):
+                    reply = await self._hedged(prompt, image_path, deadline)
+            except TimeoutError:
+                AGENT_TIMEOUTS.inc()
+                AGENT_BREAKER.record_failure()
+                raise AgentTimeout(f"Agent did not answer within {AGENT_TIMEOUT:g}s") from None
+            except AgentError:
+                AGENT_BREAKER.record_failure()
+                raise
+            AGENT_BREAKER.record_success()
+            return reply
+
+    async def _hedged(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        delay = self.hedge_delay()
+        primary = asyncio.create_task(self._timed_attempt(prompt, image_path, deadline))
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        hedge = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done or primary.exception() is not None:
+                # Slow or already failed: start the one extra attempt if a slot is free
+                if AGENT_SLOTS.try_acquire():
+                    hedge = asyncio.create_task(self._timed_attempt(prompt, image_path, deadline))
+                    # A callback, not a finally: a task cancelled before it starts never runs its body
+                    hedge.add_done_callback(lambda _: AGENT_SLOTS.release())
+                    pending = {primary, hedge} - done
+                else:
+                    AGENT_HEDGES.labels("skipped").inc()
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedge is not None:
+                            AGENT_HEDGES.labels("hedge" if task is hedge else "primary").inc()
+                        return task.result()
+                    error = task.exception()
+            if hedge is not None:
+                AGENT_HEDGES.labels("none").inc()
+            raise error or primary.exception()
+        finally:
+            losers = [t for t in (primary, hedge) if t is not None and not t.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _timed_attempt(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        started = time.perf_counter()
+        try:
+            reply = await self.attempt(prompt, image_path, deadline)
+        except asyncio.CancelledError:
+            AGENT_CALL_SECONDS.labels("cancelled").observe(time.perf_counter() - started)
+            raise
+        except Exception:
+            AGENT_CALL_SECONDS.labels("error").observe(time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        AGENT_CALL_SECONDS.labels("ok").observe(elapsed)
+        self._latencies.append(elapsed)
+        return reply
+
+
+def _cli_timeout(deadline: float) -> int:
+    """Whole seconds to pass as the CLI's --timeout for an attempt due by `deadline`."""
+    remaining = deadline - asyncio.get_running_loop().time()
+    return max(1, int(remaining - min(_CLI_TIMEOUT_MARGIN, remaining / 5)))
+
+
+class OpenClawBackend(AgentBackend):
+    """
+    Call an OpenClaw agent via CLI to get an LLM response.
+    For images: instructs the agent to use the image tool on the spooled file.
+    """
+
+    name = "openclaw"
+
+    async def attempt(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        session_id = f"nutrition-{uuid.uuid4().hex[:8]}"
+
+        # Prepend image analysis instruction
+        if image_path:
+            prompt_with_image = (
+                f"First, use the image tool to analyze the food photo at {image_path}. "
+                f"Then respond to this request:\n\n{prompt}"
+            )
+        else:
+            prompt_with_image = prompt
+
+        env = os.environ.copy()
+        env["OPENCLAW_GATEWAY_TOKEN"] = GATEWAY_TOKEN
+        env["PATH"] = "/home/lars/.npm-global/bin:" + env.get("PATH", "")
+
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                OPENCLAW_BIN, "agent",
+                "--session-id", session_id,
+                "--json",
+                "-m", prompt_with_image,
+                "--timeout", str(_cli_timeout(deadline)),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                start_new_session=True,  # own process group, so kill() takes its children too
+            )
+        except OSError as e:
+            raise AgentError(f"Could not start the agent: {e}") from e
+
+        try:
+            stdout, stderr = await proc.communicate()
+        except BaseException:  # cancelled: budget spent, hedge lost or shutting down
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+            raise
+        AGENT_EXIT_CODES.labels(proc.returncode).inc()
+
+        if proc.returncode != 0:
+            stderr_text = stderr.decode(errors="replace")
+            raise AgentError(f"Agent call failed (code {proc.returncode}): {stderr_text[:500]}")
+
+        output = stdout.decode(errors="replace").strip()
+        try:
+            data = json.loads(output)
+            result_obj = data.get("result", data)
+            payloads = result_obj.get("payloads", [])
+            if payloads:
+                return payloads[0].get("text", output)
+            payloads = data.get("payloads", [])
+            if payloads:
+                return payloads[0].get("text", output)
+            return output
+        except json.JSONDecodeError:
+            return output
+
+
+# Vision calls take about this much longer than text-only ones
+_IMAGE_LATENCY_FACTOR = 2.0
+# How randomized replies are wrapped, like real agent output sometimes is
+_REPLY_WRAPPERS = ("{}", "```json\n{}\n```", "Here is the analysis:\n\n{}")
+
+
+class SimulatedAgentBackend(AgentBackend):
+    """
+    Local stand-in for the agent. Each call sleeps for a latency drawn around
+    `latency_ms`, fails with probability `failure_rate`, and otherwise returns
+    one of `responses` or, without any, a randomized reply built from the
+    bundled food table.
+    """
+
+    name = "simulated"
+
+    def __init__(
+        self,
+        latency_ms: float = 1500,
+        jitter_ms: float = 500,
+        failure_rate: float = 0.0,
+        responses: list[str] | None = None,
+        seed: int | None = None,
+    ):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.responses = responses or []
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_config(cls) -> "SimulatedAgentBackend":
+        responses = None
+        if SIM_AGENT_RESPONSES:
+            # JSONL with a "text" field per line (the bench/corpus format)
+            with open(SIM_AGENT_RESPONSES, encoding="utf-8") as f:
+                responses = [json.loads(line)["text"] for line in f if line.strip()]
+        return cls(SIM_AGENT_LATENCY_MS, SIM_AGENT_JITTER_MS, SIM_AGENT_FAILURE_RATE, responses, SIM_AGENT_SEED)
+
+    async def attempt(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        latency = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        fails = self._rng.random() < self.failure_rate
+        reply = self._rng.choice(self.responses) if self.responses else self._random_reply()
+        if image_path:
+            latency *= _IMAGE_LATENCY_FACTOR
+        await asyncio.sleep(latency)
+        if fails:
+            raise AgentError("Agent call failed (code 1): simulated failure")
+        return reply
+
+    def _random_reply(self) -> str:
+        foods = self._rng.sample(get_food_index().foods, self._rng.randint(1, 4))
+        items, totals = [], dict.fromkeys(NUTRIENT_COLUMNS, 0.0)
+        for food in foods:
+            grams = self._rng.choice((50, 80, 100, 150, 200, 250, 300))
+            amounts = {col: round(value * grams / 100, 1) for col, value in food.per_100g.items()}
+            for col, amount in amounts.items():
+                totals[col] += amount
+            items.append({
+                "name": food.name,
+                "portion": f"{grams} g",
+                "calories": amounts["kcal"],
+                **{col: amounts[col] for col in ("protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg")},
+                "nutrients": [
+                    {"name": name, "amount": amounts[col], "unit": unit, "daily_value_pct": None}
+                    for col, (name, unit, _, _) in NUTRIENT_COLUMNS.items()
+                    if col in ("iron_mg", "calcium_mg", "vitamin_c_mg")
+                ],
+            })
+        body = json.dumps({
+            "description": ", ".join(f["name"] for f in items),
+            "food_items": items,
+            "totals": {
+                "calories": round(totals["kcal"], 1),
+                **{col: round(totals[col], 1) for col in ("protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg")},
+            },
+            "healthkit_samples": [
+                {"identifier": ident, "value": round(totals[col], 2), "unit": unit}
+                for col, (_, unit, ident, _) in NUTRIENT_COLUMNS.items()
+            ],
+        })
+        return self._rng.choice(_REPLY_WRAPPERS).format(body)
+
+
+@lru_cache(maxsize=1)
+def get_agent() -> AgentBackend:
+    """The configured agent backend. Raises LookupError for an unknown name."""
+    if AGENT_BACKEND == "openclaw":
+        return OpenClawBackend()
+    if AGENT_BACKEND == "simulated":
+        return SimulatedAgentBackend.from_config()
+    raise LookupError(f"Unknown agent backend {AGENT_BACKEND!r} (expected openclaw or simulated)")
@@ -0,0 +1,194 @@
+"""
+Parsing of nutrition agent responses.
+
+The agent is asked for raw JSON but often wraps it in prose or code fences,
+leaves trailing commas, or writes numbers as strings ("12 g"). This module
+finds the JSON object in a single scan and validates it straight into the
+API models with a compiled TypeAdapter, repairing those defects on the way.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Annotated, Any, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError, model_validator
+
+from models import FoodItem, NutrientDetail, NutritionTotals
+
+_NUMBER = re.compile(r"[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+")
+_THOUSANDS = re.compile(r"^[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?$")
+_JSON_TOKEN = re.compile(r'[{}]|"[^"\\]*(?:\\.[^"\\]*)*"')
+# Strings are matched first so repairs never touch their contents
+_REPAIR = re.compile(
+    r'(?P<string>"[^"\\]*(?:\\.[^"\\]*)*")|,(?P<close>\s*[}\]])|\b(?P<literal>None|True|False|NaN)\b'
+)
+_PY_LITERALS = {"None": "null", "True": "true", "False": "false", "NaN": "null"}
+
+
+class AgentOutputError(ValueError):
+    """The agent response did not contain a usable nutrition JSON object."""
+
+
+def _to_number(value: Any) -> Any:
+    """Coerce LLM-style numbers ("12 g", "~150", "1,200", null) to floats."""
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, str):
+        m = _NUMBER.search(value)
+        if not m:
+            return 0.0
+        raw = m.group(0)
+        raw = raw.replace(",", "") if _THOUSANDS.match(raw) else raw.replace(",", ".")
+        try:
+            return float(raw)
+        except ValueError:
+            return 0.0
+    return value
+
+
+def _to_optional_number(value: Any) -> Any:
+    return None if value is None or value == "" else _to_number(value)
+
+
+def _text(default: str):
+    return BeforeValidator(lambda v: default if v is None else v if isinstance(v, str) else str(v))
+
+
+Number = Annotated[float, BeforeValidator(_to_number)]
+OptionalNumber = Annotated[Optional[float], BeforeValidator(_to_optional_number)]
+
+
+class AgentNutrient(NutrientDetail):
+    name: Annotated[str, _text("")] = ""
+    amount: Number = 0.0
+    unit: Annotated[str, _text("")] = ""
+    daily_value_pct: OptionalNumber = None
+
+
+class AgentFoodItem(FoodItem):
+    name: Annotated[str, _text("Unknown")] = "Unknown"
+    portion: Annotated[str, _text("")] = ""
+    calories: Number = 0.0
+    protein_g: Number = 0.0
+    carbs_g: Number = 0.0
+    fat_g: Number = 0.0
+    fiber_g: Number = 0.0
+    sugar_g: Number = 0.0
+    sodium_mg: Number = 0.0
+    nutrients: list[AgentNutrient] = []
+
+
+class AgentTotals(NutritionTotals):
+    calories: Number = 0.0
+    protein_g: Number = 0.0
+    carbs_g: Number = 0.0
+    fat_g: Number = 0.0
+    fiber_g: Number = 0.0
+    sugar_g: Number = 0.0
+    sodium_mg: Number = 0.0
+
+
+class HealthKitSample(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    identifier: Annotated[str, _text("")] = ""
+    value: Number = 0.0
+    unit: Annotated[str, _text("")] = ""
+
+
+class AgentNutritionResult(BaseModel):
+    description: Optional[str] = None
+    food_items: list[AgentFoodItem] = []
+    totals: AgentTotals = Field(default_factory=AgentTotals)
+    healthkit_samples: list[HealthKitSample] = []
+
+    @model_validator(mode="after")
+    def _fill_totals(self) -> "AgentNutritionResult":
+        # Some responses skip the totals block; derive it from the items
+        if "totals" not in self.model_fields_set and self.food_items:
+            self.totals = AgentTotals(**{
+                field: round(sum(getattr(item, field) for item in self.food_items), 2)
+                for field in AgentTotals.model_fields
+            })
+        return self
+
+
+AGENT_RESULT = TypeAdapter(AgentNutritionResult)
+AGENT_FOOD_ITEMS = TypeAdapter(list[AgentFoodItem])
+
+
+def find_json_span(text: str) -> tuple[int, int]:
+    """
+    Locate the first complete top-level JSON object in `text` with one regex
+    scan, honouring strings and escapes. A truncated object extends to the
+    last "}".
+    """
+    start = text.find("{")
+    if start == -1:
+        raise AgentOutputError(f"No JSON object in agent response: {text[:300]}")
+
+    depth = 0
+    # String literals are consumed whole, so braces inside them never count
+    for m in _JSON_TOKEN.finditer(text, start):
+        token = m.group(0)
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return start, m.end()
+
+    end = text.rfind("}")
+    if end <= start:
+        raise AgentOutputError(f"Unterminated JSON object in agent response: {text[:300]}")
+    return start, end + 1
+
+
+def repair_json(span: str) -> str:
+    """Fix common LLM JSON defects outside strings: trailing commas, Python literals."""
+    return _REPAIR.sub(_repair_token, span)
+
+
+def _repair_token(m: re.Match) -> str:
+    if m.group("string"):
+        return m.group("string")
+    if m.group("close"):
+        return m.group("close")
+    return _PY_LITERALS[m.group("literal")]
+
+
+def _validate(span: str) -> AgentNutritionResult | None:
+    """Validate a JSON span; None if it isn't valid JSON, raise if the shape is wrong."""
+    try:
+        return AGENT_RESULT.validate_json(span)
+    except ValidationError as e:
+        if any(err["type"] == "json_invalid" for err in e.errors()):
+            return None
+        raise AgentOutputError(f"Agent JSON has the wrong shape: {e}") from e
+
+
+def parse_agent_output(text: str) -> AgentNutritionResult:
+    """
+    Validate an agent response into an AgentNutritionResult.
+
+    The common case (one object, possibly fenced or wrapped in prose) is
+    validated straight from the first "{" to the last "}". Only when that is
+    not valid JSON is the balanced span located and repaired.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise AgentOutputError(f"No JSON object in agent response: {text[:300]}")
+
+    span = text[start : end + 1]
+    result = _validate(span)
+    if result is None:
+        span_start, span_end = find_json_span(text)
+        if (span_start, span_end) != (start, end + 1):
+            span = text[span_start:span_end]
+            result = _validate(span)
+    if result is None:
+        result = _validate(repair_json(span))
+    if result is None:
+        raise AgentOutputError(f"Could not parse agent JSON: {text[:300]}")
+    return result
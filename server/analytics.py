@@ -0,0 +1,304 @@
+"""
+Long-range analytics for HealthClaw.
+
+Multi-year scans (per-month averages of every daily_summary column, workout
+breakdowns, correlations between metrics) run on DuckDB over Parquet
+snapshots of the SQLite tables when duckdb is installed, and on SQLite
+otherwise. Ingest always stays in SQLite; a tenant's snapshots are rebuilt
+on the next analytics query after a sync or restore changed the underlying
+tables (or after ANALYTICS_REFRESH_SECONDS at the latest).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config import ANALYTICS_BACKEND, ANALYTICS_DIR, ANALYTICS_REFRESH_SECONDS
+from database import connect
+from tenants import active_tenant, db_path_for
+
+try:
+    import duckdb
+except ImportError:  # analytics fall back to SQLite
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# Numeric daily_summary columns averaged per period
+SUMMARY_METRICS = (
+    "steps", "distance_km", "active_calories", "exercise_minutes", "stand_hours",
+    "flights_climbed", "resting_hr", "avg_hr", "hrv_sdnn", "sleep_duration_min",
+    "deep_sleep_min", "rem_sleep_min", "core_sleep_min", "awake_min", "weight_kg",
+    "body_fat_pct", "body_battery", "mood_avg_valence", "workout_count",
+    "workout_minutes", "workout_calories", "mindfulness_minutes", "blood_oxygen_pct",
+    "respiratory_rate",
+)
+
+# (x, y) daily_summary pairs reported by correlations(); y is read `lag_days` after x
+CORRELATION_PAIRS = (
+    ("workout_minutes", "sleep_duration_min"),
+    ("workout_minutes", "deep_sleep_min"),
+    ("workout_minutes", "hrv_sdnn"),
+    ("workout_minutes", "resting_hr"),
+    ("steps", "sleep_duration_min"),
+    ("active_calories", "deep_sleep_min"),
+    ("sleep_duration_min", "mood_avg_valence"),
+    ("sleep_duration_min", "hrv_sdnn"),
+    ("deep_sleep_min", "body_battery"),
+    ("hrv_sdnn", "resting_hr"),
+)
+
+# Length of the date prefix that identifies a period
+PERIODS = {"month": 7, "year": 4}
+
+SNAPSHOT_TABLES = ("daily_summary", "workouts")
+
+# Grows with every sync or restore, the only writes to the snapshot tables.
+# Event ids are never reused, so unlike a timestamp it also moves for a second
+# sync within the same second; answered from the primary key.
+_CHANGE_MARKER_SQL = """
+    SELECT MAX(id) FROM change_events WHERE kind IN ('sync', 'restore')
+"""
+
+_DUCKDB_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "TEXT": "VARCHAR"}
+_CSV_NULL = "\\N"
+
+
+def _averages_sql(source: str, period: str) -> str:
+    columns = ", ".join(f"ROUND(AVG({c}), 2) AS {c}" for c in SUMMARY_METRICS)
+    return f"""SELECT substr(date, 1, {PERIODS[period]}) AS period, COUNT(*) AS days, {columns}
+               FROM {source}
+               WHERE date BETWEEN ? AND ?
+               GROUP BY period ORDER BY period"""
+
+
+def _workouts_sql(source: str, period: str) -> str:
+    return f"""SELECT substr(date, 1, {PERIODS[period]}) AS period, workout_type,
+                      COUNT(*) AS sessions,
+                      ROUND(SUM(duration_min), 1) AS duration_min,
+                      ROUND(SUM(distance_km), 2) AS distance_km,
+                      ROUND(SUM(active_calories), 0) AS active_calories,
+                      ROUND(AVG(avg_hr), 1) AS avg_hr
+               FROM {source}
+               WHERE date BETWEEN ? AND ?
+               GROUP BY period, workout_type ORDER BY period, workout_type"""
+
+
+def _rows(cursor) -> list[dict]:
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+class SQLiteAnalytics:
+    """Analytics straight off the tenant's SQLite database."""
+
+    name = "sqlite"
+
+    async def averages(self, date_from: str, date_to: str, period: str) -> tuple[list[dict], str | None]:
+        async with connect(read_only=True) as db:
+            cursor = await db.execute(_averages_sql("daily_summary", period), (date_from, date_to))
+            return await self._fetch(cursor), None
+
+    async def workouts(self, date_from: str, date_to: str, period: str) -> tuple[list[dict], str | None]:
+        async with connect(read_only=True) as db:
+            cursor = await db.execute(_workouts_sql("workouts", period), (date_from, date_to))
+            return await self._fetch(cursor), None
+
+    async def correlations(self, date_from: str, date_to: str, lag_days: int) -> tuple[list[dict], str | None]:
+        # SQLite has no corr(); collect the sums Pearson's r needs for every pair in one pass
+        sums = []
+        for x, y in CORRELATION_PAIRS:
+            both = f"a.{x} IS NOT NULL AND b.{y} IS NOT NULL"
+            sums += [
+                f"SUM(CASE WHEN {both} THEN 1 ELSE 0 END)",
+                f"SUM(CASE WHEN {both} THEN a.{x} END)",
+                f"SUM(CASE WHEN {both} THEN b.{y} END)",
+                f"SUM(CASE WHEN {both} THEN a.{x} * b.{y} END)",
+                f"SUM(CASE WHEN {both} THEN a.{x} * a.{x} END)",
+                f"SUM(CASE WHEN {both} THEN b.{y} * b.{y} END)",
+            ]
+        async with connect(read_only=True) as db:
+            cursor = await db.execute(
+                f"""SELECT {", ".join(sums)}
+                    FROM daily_summary a
+                    JOIN daily_summary b ON b.date = date(a.date, '+{int(lag_days)} days')
+                    WHERE a.date BETWEEN ? AND ?""",
+                (date_from, date_to),
+            )
+            row = await cursor.fetchone()
+
+        results = []
+        for i, (x, y) in enumerate(CORRELATION_PAIRS):
+            n, sx, sy, sxy, sxx, syy = (v or 0 for v in row[i * 6 : i * 6 + 6])
+            denominator = math.sqrt(max(n * sxx - sx * sx, 0) * max(n * syy - sy * sy, 0))
+            r = (n * sxy - sx * sy) / denominator if n > 1 and denominator else None
+            results.append(_correlation(x, y, lag_days, n, r))
+        return results, None
+
+    @staticmethod
+    async def _fetch(cursor) -> list[dict]:
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in await cursor.fetchall()]
+
+
+class DuckDBAnalytics:
+    """Columnar analytics over per-tenant Parquet snapshots of the SQLite tables."""
+
+    name = "duckdb"
+
+    def __init__(self, snapshot_dir: Path, refresh_seconds: float):
+        self.snapshot_dir = snapshot_dir
+        self.refresh_seconds = refresh_seconds
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._markers: dict[str, tuple] = {}
+        # Opening DuckDB costs ~20 ms; queries run on cheap cursors of one connection
+        self._con = None
+        self._con_lock = threading.Lock()
+
+    def _cursor(self):
+        with self._con_lock:
+            if self._con is None:
+                self._con = duckdb.connect()
+            return self._con.cursor()
+
+    async def averages(self, date_from: str, date_to: str, period: str) -> tuple[list[dict], str | None]:
+        paths, snapshot_at = await self.snapshot()
+        sql = _averages_sql(f"read_parquet({_sql_str(paths['daily_summary'])})", period)
+        return await asyncio.to_thread(self._query, sql, [date_from, date_to]), snapshot_at
+
+    async def workouts(self, date_from: str, date_to: str, period: str) -> tuple[list[dict], str | None]:
+        paths, snapshot_at = await self.snapshot()
+        sql = _workouts_sql(f"read_parquet({_sql_str(paths['workouts'])})", period)
+        return await asyncio.to_thread(self._query, sql, [date_from, date_to]), snapshot_at
+
+    async def correlations(self, date_from: str, date_to: str, lag_days: int) -> tuple[list[dict], str | None]:
+        paths, snapshot_at = await self.snapshot()
+        source = f"read_parquet({_sql_str(paths['daily_summary'])})"
+        columns = ", ".join(
+            f"regr_count(b.{y}, a.{x}), corr(b.{y}, a.{x})" for x, y in CORRELATION_PAIRS
+        )
+        sql = f"""SELECT {columns}
+                  FROM {source} a
+                  JOIN {source} b ON b.date = strftime(CAST(a.date AS DATE) + {int(lag_days)}, '%Y-%m-%d')
+                  WHERE a.date BETWEEN ? AND ?"""
+        row = await asyncio.to_thread(self._query_row, sql, [date_from, date_to])
+        results = []
+        for i, (x, y) in enumerate(CORRELATION_PAIRS):
+            n, r = row[i * 2] or 0, row[i * 2 + 1]
+            results.append(_correlation(x, y, lag_days, n, None if r is None or math.isnan(r) else r))
+        return results, snapshot_at
+
+    async def snapshot(self, force: bool = False) -> tuple[dict[str, str], str]:
+        """
+        Parquet snapshot paths of the current tenant's tables, rebuilt first
+        if the tables changed since or the snapshot is older than
+        refresh_seconds. Also returns when the snapshot was taken.
+        """
+        tenant = active_tenant()
+        directory = self.snapshot_dir / tenant
+        paths = {table: directory / f"{table}.parquet" for table in SNAPSHOT_TABLES}
+        lock = self._locks.setdefault(tenant, asyncio.Lock())
+        async with lock:
+            existing = [p.stat().st_mtime for p in paths.values() if p.exists()]
+            taken = min(existing) if len(existing) == len(paths) else None
+            async with connect(read_only=True) as db:
+                cursor = await db.execute(_CHANGE_MARKER_SQL)
+                marker = tuple(await cursor.fetchone())
+            if (
+                force
+                or taken is None
+                or marker != self._markers.get(tenant)
+                or time.time() - taken > self.refresh_seconds
+            ):
+                started = time.perf_counter()
+                await asyncio.to_thread(self._write_snapshots, db_path_for(tenant), paths)
+                logger.info(
+                    "Refreshed analytics snapshot for tenant %s in %.0f ms",
+                    tenant, (time.perf_counter() - started) * 1000,
+                )
+                taken = min(p.stat().st_mtime for p in paths.values())
+                self._markers[tenant] = marker
+        snapshot_at = datetime.fromtimestamp(taken, tz=timezone.utc).isoformat()
+        return {table: str(path) for table, path in paths.items()}, snapshot_at
+
+    def _query(self, sql: str, params: list) -> list[dict]:
+        with self._cursor() as cur:
+            return _rows(cur.execute(sql, params))
+
+    def _query_row(self, sql: str, params: list) -> tuple:
+        with self._cursor() as cur:
+            return cur.execute(sql, params).fetchone()
+
+    def _write_snapshots(self, db_path: Path, paths: dict[str, Path]) -> None:
+        """
+        Copy tables from SQLite to Parquet. Rows are staged as CSV, which DuckDB
+        bulk-loads orders of magnitude faster than row-wise inserts.
+        """
+        next(iter(paths.values())).parent.mkdir(parents=True, exist_ok=True)
+        # Read-only connection: under WAL this never blocks ingest
+        src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        con = self._cursor()
+        try:
+            for table, dest in paths.items():
+                columns = {
+                    name: _DUCKDB_TYPES.get(decl.upper(), "VARCHAR")
+                    for _, name, decl, *_ in src.execute(f"PRAGMA table_info({table})")
+                }
+                staging = dest.with_suffix(".csv.tmp")
+                with open(staging, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    cursor = src.execute(f"SELECT {', '.join(columns)} FROM {table}")
+                    while rows := cursor.fetchmany(5000):
+                        writer.writerows([_CSV_NULL if v is None else v for v in row] for row in rows)
+                spec = "{" + ", ".join(f"{_sql_str(n)}: {_sql_str(t)}" for n, t in columns.items()) + "}"
+                partial = dest.with_suffix(".parquet.tmp")
+                try:
+                    con.execute(
+                        f"""COPY (SELECT * FROM read_csv({_sql_str(staging)}, auto_detect = false, header = false,
+                                                         delim = ',', quote = '"', escape = '"',
+                                                         nullstr = {_sql_str(_CSV_NULL)}, columns = {spec}))
+                            TO {_sql_str(partial)} (FORMAT parquet)"""
+                    )
+                    os.replace(partial, dest)
+                finally:
+                    staging.unlink(missing_ok=True)
+                    partial.unlink(missing_ok=True)
+        finally:
+            con.close()
+            src.close()
+
+
+def _correlation(x: str, y: str, lag_days: int, n: int, r: float | None) -> dict:
+    return {"x": x, "y": y, "lag_days": lag_days, "n": n, "r": None if r is None else round(r, 3)}
+
+
+def _sql_str(value: str | Path) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+_sqlite_backend = SQLiteAnalytics()
+_duckdb_backend = DuckDBAnalytics(ANALYTICS_DIR, ANALYTICS_REFRESH_SECONDS) if duckdb is not None else None
+
+
+def get_backend(name: str | None = None) -> SQLiteAnalytics | DuckDBAnalytics:
+    """
+    Analytics backend to use: `name` if given ("sqlite"/"duckdb"), else
+    ANALYTICS_BACKEND. Raises LookupError if duckdb is asked for but missing.
+    """
+    name = name or ANALYTICS_BACKEND
+    if name == "sqlite":
+        return _sqlite_backend
+    if _duckdb_backend is None:
+        if name == "duckdb":
+            raise LookupError("duckdb is not installed")
+        return _sqlite_backend
+    return _duckdb_backend
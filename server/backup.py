@@ -0,0 +1,230 @@
+"""
+Streaming backup and restore for HealthClaw.
+
+A backup is NDJSON: a header line, then one {"table": ..., "row": {...}} line
+per row. Every table is read inside one read transaction on a read-only
+connection, so the dump is a consistent snapshot even while syncs keep
+writing, and rows are fetched in fixed-size batches so memory stays flat.
+JSON text columns are decoded inline, and meals carry their nutrients and
+food items; derived tables (daily_nutrition, search index) are rebuilt on
+restore. Single tables can also be dumped as CSV.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+BACKUP_FORMAT = "healthclaw-backup"
+BACKUP_VERSION = 1
+
+# Restore order matters only for readability; no table references another
+BACKUP_TABLES = ("sync_log", "daily_summary", "workouts", "mood_entries", "sleep_sessions", "meal_entries")
+
+# JSON text columns decoded in backups: table -> column -> key in the backup row
+JSON_COLUMNS = {
+    "sync_log": {"payload_json": "payload"},
+    "mood_entries": {"labels": "labels", "associations": "associations"},
+    "sleep_sessions": {"stages_json": "stages"},
+}
+
+# food_items_json is superseded by the inline food_items of each meal; the
+# day/ts sort keys are derived from date and time columns and rebuilt on restore
+_SKIPPED_COLUMNS = {
+    "workouts": {"day", "ts"},
+    "mood_entries": {"day", "ts"},
+    "sleep_sessions": {"day", "ts"},
+    "meal_entries": {"food_items_json", "day", "ts"},
+}
+
+_BATCH_ROWS = 1000
+
+
+class BackupError(ValueError):
+    """The backup stream is malformed or names unknown tables."""
+
+
+def _decode_row(table: str, row: dict) -> dict:
+    for column, key in JSON_COLUMNS.get(table, {}).items():
+        value = row.pop(column)
+        try:
+            row[key] = json.loads(value) if value is not None else None
+        except json.JSONDecodeError:
+            row[key] = value  # keep unreadable legacy text as-is
+    return row
+
+
+def _encode_row(table: str, row: dict) -> dict:
+    for column, key in JSON_COLUMNS.get(table, {}).items():
+        if key in row:
+            value = row.pop(key)
+            row[column] = value if value is None or isinstance(value, str) else json.dumps(value)
+    return row
+
+
+def _placeholders(n: int) -> str:
+    return ", ".join("?" * n)
+
+
+def _meal_extras(db: sqlite3.Connection, meal_ids: list[int]) -> tuple[dict, dict]:
+    """Nutrients and food items (with their nutrients) for a batch of meals."""
+    marks = _placeholders(len(meal_ids))
+    nutrients: dict[int, list] = {}
+    for meal_id, name, amount, unit in db.execute(
+        f"""SELECT mn.meal_entry_id, n.name, mn.amount, n.unit
+            FROM meal_nutrients mn JOIN nutrients n ON n.id = mn.nutrient_id
+            WHERE mn.meal_entry_id IN ({marks})""",
+        meal_ids,
+    ):
+        nutrients.setdefault(meal_id, []).append({"name": name, "amount": amount, "unit": unit})
+
+    items: dict[int, list] = {}
+    by_item: dict[int, dict] = {}
+    cursor = db.execute(
+        f"""SELECT * FROM meal_food_items WHERE meal_entry_id IN ({marks})
+            ORDER BY meal_entry_id, position""",
+        meal_ids,
+    )
+    names = [d[0] for d in cursor.description]
+    for values in cursor:
+        item = dict(zip(names, values))
+        item_id, meal_id = item.pop("id"), item.pop("meal_entry_id")
+        item.pop("position")
+        item["nutrients"] = []
+        items.setdefault(meal_id, []).append(item)
+        by_item[item_id] = item
+    for item_id, name, amount, unit, daily_value_pct in db.execute(
+        f"""SELECT fn.food_item_id, n.name, fn.amount, n.unit, fn.daily_value_pct
+            FROM meal_food_item_nutrients fn JOIN nutrients n ON n.id = fn.nutrient_id
+            WHERE fn.food_item_id IN (SELECT id FROM meal_food_items WHERE meal_entry_id IN ({marks}))""",
+        meal_ids,
+    ):
+        by_item[item_id]["nutrients"].append(
+            {"name": name, "amount": amount, "unit": unit, "daily_value_pct": daily_value_pct}
+        )
+    return nutrients, items
+
+
+def _columns(db: sqlite3.Connection, table: str) -> list[str]:
+    skipped = _SKIPPED_COLUMNS.get(table, set())
+    return [r[1] for r in db.execute(f"PRAGMA table_info({table})") if r[1] not in skipped]
+
+
+def _table_rows(db: sqlite3.Connection, table: str) -> Iterator[list[dict]]:
+    """Decoded rows of `table` in batches of _BATCH_ROWS."""
+    columns = _columns(db, table)
+    cursor = db.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+    while batch := cursor.fetchmany(_BATCH_ROWS):
+        rows = [_decode_row(table, dict(zip(columns, values))) for values in batch]
+        if table == "meal_entries":
+            # A second cursor on the same connection still reads the same snapshot
+            nutrients, items = _meal_extras(db, [r["id"] for r in rows])
+            for row in rows:
+                row["nutrients"] = nutrients.get(row["id"], [])
+                row["food_items"] = items.get(row["id"], [])
+        yield rows
+
+
+def _snapshot(db_path: Path) -> sqlite3.Connection:
+    # Starlette pulls each chunk on a worker thread, not necessarily the same one
+    db = sqlite3.connect(
+        f"file:{db_path}?mode=ro", uri=True, isolation_level=None, check_same_thread=False
+    )
+    db.execute("BEGIN")
+    return db
+
+
+def iter_ndjson(db_path: Path, tables: tuple[str, ...] = BACKUP_TABLES) -> Iterator[bytes]:
+    """Yield a full NDJSON backup of `tables`, one chunk per batch of rows."""
+    db = _snapshot(db_path)
+    try:
+        header = {
+            "format": BACKUP_FORMAT,
+            "version": BACKUP_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "tables": list(tables),
+        }
+        yield (json.dumps(header) + "\n").encode()
+        for table in tables:
+            for rows in _table_rows(db, table):
+                yield "".join(
+                    json.dumps({"table": table, "row": row}, ensure_ascii=False) + "\n" for row in rows
+                ).encode()
+    finally:
+        db.execute("ROLLBACK")
+        db.close()
+
+
+def iter_csv(db_path: Path, table: str) -> Iterator[bytes]:
+    """Yield one table as CSV; nested values (stages, labels, food items) are JSON text cells."""
+    db = _snapshot(db_path)
+    try:
+        out = io.StringIO()
+        writer = None
+        for rows in _table_rows(db, table):
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+                writer.writeheader()
+            writer.writerows(
+                {k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in row.items()}
+                for row in rows
+            )
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+        if writer is None:  # empty table: still emit the header
+            row = _decode_row(table, dict.fromkeys(_columns(db, table)))
+            if table == "meal_entries":
+                row.update(nutrients=None, food_items=None)
+            yield (",".join(row) + "\r\n").encode()
+    finally:
+        db.execute("ROLLBACK")
+        db.close()
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Parse a backup stream into (table, row) pairs ready for insertion, with
+    JSON columns re-encoded. Raises BackupError on malformed input.
+    """
+    buffer = b""
+    header_seen = False
+    line_no = 0
+
+    async def lines() -> AsyncIterator[bytes]:
+        nonlocal buffer
+        async for chunk in chunks:
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+        if buffer:
+            yield buffer
+
+    async for line in lines():
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BackupError(f"Line {line_no}: invalid JSON ({e})") from e
+        if not header_seen:
+            if not isinstance(record, dict) or record.get("format") != BACKUP_FORMAT:
+                raise BackupError("Not a HealthClaw backup (missing header line)")
+            if record.get("version") != BACKUP_VERSION:
+                raise BackupError(f"Unsupported backup version {record.get('version')}")
+            header_seen = True
+            continue
+        table, row = record.get("table"), record.get("row")
+        if table not in BACKUP_TABLES or not isinstance(row, dict):
+            raise BackupError(f"Line {line_no}: expected a row of one of {', '.join(BACKUP_TABLES)}")
+        yield table, _encode_row(table, row)
+
+    if not header_seen:
+        raise BackupError("Empty backup")
@@ -0,0 +1 @@
+"""Benchmarks for the HealthClaw server. Run modules from `server/`, e.g. `python -m bench.parsing`."""
@@ -0,0 +1,135 @@
+"""
+Analytics backend benchmark.
+
+Generates years of synthetic daily summaries and workouts in a scratch
+database, then times every analytics query on SQLite and on DuckDB, plus the
+cost of refreshing DuckDB's Parquet snapshots.
+
+    python -m bench.analytics [--years 10] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+WORKOUT_TYPES = ("running", "cycling", "walking", "strength", "yoga", "swimming")
+# daily_summary INTEGER columns (the rest are REAL)
+INTEGER_METRICS = ("stand_hours", "flights_climbed", "body_battery", "workout_count")
+
+
+def generate(db_path: str, years: int, seed: int, metrics: tuple[str, ...]) -> dict:
+    """Fill daily_summary and workouts with `years` of plausible, correlated data."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=365 * years)
+    summaries, workouts = [], []
+    for offset in range(365 * years):
+        day = (start + timedelta(days=offset)).isoformat()
+        minutes = 0.0
+        for _ in range(rng.choice((0, 0, 1, 1, 1, 2))):
+            duration = rng.uniform(15, 90)
+            minutes += duration
+            workouts.append((
+                day, rng.choice(WORKOUT_TYPES), f"{day}T07:00:00", f"{day}T08:00:00", duration,
+                rng.uniform(0, 20), duration * rng.uniform(6, 11), rng.uniform(110, 160),
+                rng.uniform(150, 190), rng.uniform(0, 300),
+            ))
+        sleep = rng.gauss(420 + minutes * 0.3, 40)
+        row = {m: rng.uniform(0, 100) for m in metrics}
+        row.update({m: rng.randint(0, 24) for m in INTEGER_METRICS})
+        row.update(
+            steps=int(rng.gauss(8000 + minutes * 80, 2500)),
+            sleep_duration_min=sleep,
+            deep_sleep_min=sleep * rng.uniform(0.12, 0.22),
+            hrv_sdnn=rng.gauss(45 + minutes * 0.05, 8),
+            resting_hr=rng.gauss(60 - minutes * 0.02, 4),
+            workout_minutes=minutes,
+            # leave gaps like real exports do
+            weight_kg=rng.gauss(75, 2) if rng.random() < 0.3 else None,
+        )
+        summaries.append((day, *(row[m] for m in metrics)))
+
+    db = sqlite3.connect(db_path)
+    with db:
+        db.executemany(
+            f"INSERT INTO daily_summary (date, {', '.join(metrics)}) VALUES ({', '.join('?' * (len(metrics) + 1))})",
+            summaries,
+        )
+        db.executemany(
+            """INSERT INTO workouts (date, workout_type, start_time, end_time, duration_min, distance_km,
+                                     active_calories, avg_hr, max_hr, elevation_gain_m)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            workouts,
+        )
+    db.close()
+    return {"daily_summary_rows": len(summaries), "workout_rows": len(workouts)}
+
+
+async def _time_ms(fn, repeat: int) -> float:
+    await fn()  # warm up (and take the first snapshot)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+async def run(years: int, repeat: int, seed: int) -> dict:
+    # Imported here so the scratch database settings above take effect
+    import analytics
+    from database import close_pool, init_db
+    from tenants import DEFAULT_TENANT, use_tenant
+
+    with use_tenant(DEFAULT_TENANT):
+        try:
+            await init_db()
+            report = {"years": years, **generate(os.environ["HEALTHCLAW_DB"], years, seed, analytics.SUMMARY_METRICS)}
+            lo, hi = "0000-01-01", "9999-12-31"
+            queries = {
+                "averages_month": lambda b: b.averages(lo, hi, "month"),
+                "averages_year": lambda b: b.averages(lo, hi, "year"),
+                "workouts_month": lambda b: b.workouts(lo, hi, "month"),
+                "correlations_next_day": lambda b: b.correlations(lo, hi, 1),
+            }
+            engines = ["sqlite"] + (["duckdb"] if analytics.duckdb is not None else [])
+            for engine in engines:
+                backend = analytics.get_backend(engine)
+                report[engine] = {
+                    f"{name}_ms": await _time_ms(lambda q=query: q(backend), repeat)
+                    for name, query in queries.items()
+                }
+            if analytics.duckdb is not None:
+                backend = analytics.get_backend("duckdb")
+                report["duckdb"]["snapshot_refresh_ms"] = await _time_ms(
+                    lambda: backend.snapshot(force=True), max(1, repeat // 4)
+                )
+            return report
+        finally:
+            await close_pool()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--years", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="healthclaw-bench-") as tmp:
+        os.environ["HEALTHCLAW_DB"] = os.path.join(tmp, "bench.db")
+        os.environ["HEALTHCLAW_ANALYTICS_DIR"] = os.path.join(tmp, "analytics")
+        os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+        print(json.dumps(asyncio.run(run(args.years, args.repeat, args.seed)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
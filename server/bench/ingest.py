@@ -0,0 +1,121 @@
+"""
+Sync ingest benchmark.
+
+Builds backfill payloads (many days of sleep, workouts, mood and mindfulness
+in one sync, as the app sends after a long offline stretch) and measures,
+per size:
+
+- parse: the old dict pipeline (json.loads, model_validate, then
+  model_dump_json for sync_log) against model_validate_json on the raw bytes,
+  with time and peak allocated memory;
+- post: end-to-end POST /api/health/sync latency in-process over ASGI.
+
+    python -m bench.ingest [--days 30,180,730] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from bench.load import API_KEY, summarize
+from bench.payloads import generate_payloads
+
+
+def backfill_payload(days: int, seed: int) -> dict:
+    """One sync carrying `days` days of records, with the latest day's aggregates."""
+    payloads = list(generate_payloads(days, seed))
+    merged = dict(payloads[-1])
+    for key in ("sleep", "workouts", "mood", "mindfulness"):
+        merged[key] = [record for p in payloads for record in p[key]]
+    merged["period_from"] = payloads[0]["period_from"]
+    return merged
+
+
+def _measure(fn, repeat: int) -> dict:
+    fn()  # warm up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {**summarize(samples, 0, sum(samples) / 1000), "peak_alloc_kb": round(peak / 1024)}
+
+
+def parse_scenarios(body: bytes, repeat: int) -> dict:
+    from models import HealthSyncPayload
+
+    def dict_pipeline() -> None:
+        HealthSyncPayload.model_validate(json.loads(body)).model_dump_json()
+
+    def raw_pipeline() -> None:
+        HealthSyncPayload.model_validate_json(body)
+        body.decode()
+
+    return {"dict": _measure(dict_pipeline, repeat), "raw": _measure(raw_pipeline, repeat)}
+
+
+async def post_scenario(client, body: bytes, repeat: int) -> dict:
+    headers = {"X-API-Key": API_KEY, "Content-Type": "application/json"}
+    samples, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        response = await client.post("/api/health/sync", content=body, headers=headers)
+        samples.append((time.perf_counter() - t) * 1000)
+        errors += response.status_code >= 400
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # Imported here so the scratch settings in main() take effect
+    import httpx
+
+    from main import app
+
+    report: dict = {"meta": {"days": args.days, "repeat": args.repeat, "seed": args.seed}, "scenarios": {}}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for days in args.days:
+                body = json.dumps(backfill_payload(days, args.seed)).encode()
+                report["meta"][f"bytes_{days}d"] = len(body)
+                parse = parse_scenarios(body, args.repeat)
+                report["scenarios"][f"parse_{days}d"] = parse
+                report["scenarios"][f"post_{days}d"] = {"sync": await post_scenario(client, body, args.repeat)}
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--days", type=lambda s: [int(d) for d in s.split(",")], default=[30, 180, 730])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--output", "-o", help="Write results here as well as to stdout")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="healthclaw-bench-") as tmp:
+        os.environ["HEALTHCLAW_DB"] = os.path.join(tmp, "bench.db")
+        os.environ["HEALTHCLAW_API_KEY"] = API_KEY
+        os.environ.setdefault("HEALTHCLAW_LOG_LEVEL", "ERROR")
+        os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
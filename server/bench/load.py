@@ -0,0 +1,296 @@
+"""
+Load benchmark for the HTTP API.
+
+Seeds a scratch database with `--days` of synthetic syncs and meals (timing
+store_sync on the way), then drives the app in-process over ASGI, without
+sockets: every GET endpoint on its own, then concurrent iOS syncs mixed with
+agent reads. Results are JSON with p50/p95/p99 latency and throughput per
+endpoint; `compare` flags regressions between two result files.
+
+    python -m bench.load run [--days 365] [--requests 50] [--seconds 10] [--output FILE]
+    python -m bench.load compare BASELINE.json CANDIDATE.json [--tolerance 0.2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from bench.payloads import generate_meals, generate_payloads
+
+API_KEY = "bench"
+
+# Agent-style reads used by the mixed scenario
+AGENT_READS = (
+    "/api/health/summary",
+    "/api/health/latest",
+    "/api/health/workouts",
+    "/api/health/mood",
+    "/api/health/sleep",
+    "/api/nutrition/history",
+    "/api/nutrition/summary",
+)
+
+
+def read_urls(meal_id: int) -> dict[str, str]:
+    """Concrete URL to request for each GET route template."""
+    today = date.today()
+    return {
+        "/api/health/summary": "/api/health/summary?days=30",
+        "/api/health/latest": "/api/health/latest",
+        "/api/health/workouts": "/api/health/workouts?days=30",
+        "/api/health/mood": "/api/health/mood?days=30",
+        "/api/health/sleep": "/api/health/sleep?days=30",
+        "/api/health/ping": "/api/health/ping",
+        "/api/widget": "/api/widget",
+        "/metrics": "/metrics",
+        "/api/nutrition/history": "/api/nutrition/history?days=7",
+        "/api/nutrition/summary": f"/api/nutrition/summary?date={today}",
+        "/api/nutrition/summary/range": f"/api/nutrition/summary/range?from={today - timedelta(days=90)}&bucket=week",
+        "/api/nutrition/foods": "/api/nutrition/foods?days=90",
+        "/api/nutrition/search": "/api/nutrition/search?q=chick",
+        "/api/nutrition/meals/{meal_id}": f"/api/nutrition/meals/{meal_id}",
+        "/api/analytics/averages": "/api/analytics/averages?period=month",
+        "/api/analytics/workouts": "/api/analytics/workouts?period=month",
+        "/api/analytics/correlations": "/api/analytics/correlations?lag_days=1",
+        "/api/export/{table}.parquet": "/api/export/daily_summary.parquet",
+        "/api/export/{table}.arrow": "/api/export/workouts.arrow",
+        "/api/admin/slow-queries": "/api/admin/slow-queries",
+        "/api/backup.ndjson": "/api/backup.ndjson",
+        "/api/backup/{table}.csv": "/api/backup/workouts.csv",
+    }
+
+
+def summarize(samples_ms: list[float], errors: int, elapsed: float) -> dict:
+    """Latency percentiles (ms) and throughput for one endpoint or operation."""
+    if not samples_ms:
+        return {"requests": 0, "errors": errors}
+    cuts = statistics.quantiles(samples_ms, n=100, method="inclusive") if len(samples_ms) > 1 else samples_ms * 99
+    return {
+        "requests": len(samples_ms),
+        "errors": errors,
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(max(samples_ms), 3),
+        "throughput_rps": round(len(samples_ms) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+class _Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs) -> None:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed: dict[str, float] | float) -> dict:
+        return {
+            name: summarize(samples, self.errors.get(name, 0), elapsed if isinstance(elapsed, float) else elapsed[name])
+            for name, samples in sorted(self.samples.items())
+        }
+
+
+async def seed(days: int, seed_value: int) -> tuple[dict, int]:
+    """Store `days` of syncs and meals directly; returns store_sync timings and the last meal id."""
+    from database import store_meal_entry, store_sync
+    from models import HealthSyncPayload
+
+    samples = []
+    started = time.perf_counter()
+    for raw in generate_payloads(days, seed_value):
+        payload = HealthSyncPayload.model_validate(raw)
+        t = time.perf_counter()
+        await store_sync(payload)
+        samples.append((time.perf_counter() - t) * 1000)
+    sync_elapsed = time.perf_counter() - started
+
+    meal_samples = []
+    started = time.perf_counter()
+    meal_id = 0
+    for meal in generate_meals(days, seed_value):
+        t = time.perf_counter()
+        meal_id, _ = await store_meal_entry(**meal)
+        meal_samples.append((time.perf_counter() - t) * 1000)
+    meal_elapsed = time.perf_counter() - started
+    return {
+        "store_sync": summarize(samples, 0, sync_elapsed),
+        "store_meal_entry": summarize(meal_samples, 0, meal_elapsed),
+    }, meal_id
+
+
+async def endpoints(client, urls: dict[str, str], requests: int) -> dict:
+    """Every GET endpoint, one request at a time."""
+    recorder = _Recorder()
+    elapsed = {}
+    for name, url in urls.items():
+        await client.get(url, headers={"X-API-Key": API_KEY})  # warm up
+        started = time.perf_counter()
+        for _ in range(requests):
+            await recorder.request(client, name, "GET", url, headers={"X-API-Key": API_KEY})
+        elapsed[name] = time.perf_counter() - started
+    return recorder.report(elapsed)
+
+
+async def mixed(client, urls: dict[str, str], seconds: float, syncers: int, readers: int, seed_value: int) -> dict:
+    """Concurrent iOS syncs of today's data alongside agent reads, for `seconds`."""
+    headers = {"X-API-Key": API_KEY}
+    recorder = _Recorder()
+    deadline = time.perf_counter() + seconds
+    # The app re-syncs the current day several times a day
+    payloads = [json.dumps(next(generate_payloads(1, seed_value + 100 + i))).encode() for i in range(syncers)]
+
+    async def syncer(i: int) -> None:
+        body = payloads[i % len(payloads)]
+        while time.perf_counter() < deadline:
+            await recorder.request(
+                client, "POST /api/health/sync", "POST", "/api/health/sync",
+                content=body, headers={**headers, "Content-Type": "application/json"},
+            )
+
+    async def reader(i: int) -> None:
+        n = i
+        while time.perf_counter() < deadline:
+            name = AGENT_READS[n % len(AGENT_READS)]
+            await recorder.request(client, name, "GET", urls[name], headers=headers)
+            n += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(syncer(i) for i in range(syncers)), *(reader(i) for i in range(readers)))
+    elapsed = time.perf_counter() - started
+    report = recorder.report(elapsed)
+    total = sum(len(s) for s in recorder.samples.values())
+    report["_all"] = {
+        "requests": total,
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(total / elapsed, 1),
+    }
+    return report
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # Imported here so the scratch database settings in main() take effect
+    import httpx
+    from fastapi.routing import APIRoute
+
+    from main import app
+    from tenants import DEFAULT_TENANT, use_tenant
+
+    report: dict = {
+        "meta": {
+            "days": args.days,
+            "seed": args.seed,
+            "requests": args.requests,
+            "seconds": args.seconds,
+            "syncers": args.syncers,
+            "readers": args.readers,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            with use_tenant(DEFAULT_TENANT):
+                report["scenarios"]["seed"], meal_id = await seed(args.days, args.seed)
+
+            urls = read_urls(meal_id)
+            routes = [r.path for r in app.routes if isinstance(r, APIRoute) and "GET" in r.methods]
+            missing = [path for path in routes if path not in urls]
+            if missing:
+                print(f"warning: no benchmark URL for {', '.join(missing)}", file=sys.stderr)
+            report["meta"]["unbenchmarked"] = missing
+            urls = {path: urls[path] for path in routes if path in urls}
+
+            report["scenarios"]["endpoints"] = await endpoints(client, urls, args.requests)
+            report["scenarios"]["mixed"] = await mixed(
+                client, urls, args.seconds, args.syncers, args.readers, args.seed
+            )
+    return report
+
+
+# Latency keys compared by `compare`; throughput is compared inversely
+_LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(baseline: dict, candidate: dict, tolerance: float, min_ms: float) -> list[str]:
+    """Regressions of `candidate` against `baseline`, one line each."""
+    regressions = []
+    for scenario, results in baseline.get("scenarios", {}).items():
+        for name, before in results.items():
+            after = candidate.get("scenarios", {}).get(scenario, {}).get(name)
+            if after is None:
+                continue
+            for key in _LATENCY_KEYS:
+                old, new = before.get(key), after.get(key)
+                if old is not None and new is not None and new > old * (1 + tolerance) and new - old >= min_ms:
+                    regressions.append(f"{scenario} {name} {key}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+            old, new = before.get("throughput_rps"), after.get("throughput_rps")
+            if old and new is not None and new < old * (1 - tolerance):
+                regressions.append(f"{scenario} {name} throughput_rps: {old} -> {new} ({(new / old - 1) * 100:.0f}%)")
+            if after.get("errors", 0) > before.get("errors", 0):
+                regressions.append(f"{scenario} {name} errors: {before.get('errors', 0)} -> {after['errors']}")
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="Seed a scratch database and benchmark the API")
+    run_p.add_argument("--days", type=int, default=365, help="Days of synthetic history to seed")
+    run_p.add_argument("--requests", type=int, default=50, help="Requests per endpoint in the endpoints scenario")
+    run_p.add_argument("--seconds", type=float, default=10, help="Duration of the mixed scenario")
+    run_p.add_argument("--syncers", type=int, default=4, help="Concurrent syncing clients in the mixed scenario")
+    run_p.add_argument("--readers", type=int, default=8, help="Concurrent agent readers in the mixed scenario")
+    run_p.add_argument("--seed", type=int, default=7)
+    run_p.add_argument("--output", "-o", help="Write results here as well as to stdout")
+
+    cmp_p = sub.add_parser("compare", help="Compare two result files; exits 1 on regressions")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("candidate")
+    cmp_p.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+    cmp_p.add_argument("--min-ms", type=float, default=0.5, help="Ignore latency changes smaller than this")
+    args = ap.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        regressions = compare(baseline, candidate, args.tolerance, args.min_ms)
+        print("\n".join(regressions) if regressions else "No regressions")
+        sys.exit(1 if regressions else 0)
+
+    with tempfile.TemporaryDirectory(prefix="healthclaw-bench-") as tmp:
+        os.environ["HEALTHCLAW_DB"] = os.path.join(tmp, "bench.db")
+        os.environ["HEALTHCLAW_ANALYTICS_DIR"] = os.path.join(tmp, "analytics")
+        os.environ["HEALTHCLAW_API_KEY"] = API_KEY
+        os.environ.setdefault("HEALTHCLAW_LOG_LEVEL", "ERROR")
+        os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Nutrition pipeline benchmark.
+
+Sends analyze requests end to end (HTTP in-process, agent call, parsing,
+storage) against the simulated agent backend at several concurrency levels,
+for text meals and for photo uploads. Reports latency percentiles and
+throughput, requests shed by admission control (429/503), the time calls
+spent queueing for an agent slot, and the process's peak memory. Output works
+with `python -m bench.load compare`.
+
+    python -m bench.nutrition [--concurrency 1,4,16,64] [--requests 64] [--latency-ms 200] [--agent-slots 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+
+from bench.load import API_KEY, summarize
+
+MEALS = (
+    "two scrambled eggs with toast and butter",
+    "chicken caesar salad and a glass of orange juice",
+    "a bowl of oatmeal with banana and honey",
+    "spaghetti bolognese with parmesan",
+    "salmon with rice and steamed broccoli",
+)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:  # not Linux: peak so far is the best we have
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_photo() -> bytes:
+    """A phone-camera-sized JPEG (noise, so it doesn't compress away)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + os.urandom(3 * 2**20)
+    noise = Image.effect_noise((4032, 3024), 48)
+    buf = io.BytesIO()
+    Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise)).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+async def _level(client, kind: str, concurrency: int, requests: int, photo: bytes) -> dict:
+    from metrics import AGENT_ADMISSION_SECONDS, AGENT_CALL_SECONDS
+
+    headers = {"X-API-Key": API_KEY}
+    queue, calls = AGENT_ADMISSION_SECONDS.labels(), AGENT_CALL_SECONDS.labels("ok")
+    queue_before = (queue.sum, queue.count)
+    calls_before = (calls.sum, calls.count)
+    samples: list[float] = []
+    errors = shed = 0
+    remaining = requests
+    rss_start = peak = _rss_mb()
+    done = asyncio.Event()
+
+    async def sample_memory() -> None:
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, _rss_mb())
+            await asyncio.sleep(0.01)
+
+    async def worker(n: int) -> None:
+        nonlocal remaining, errors, shed
+        while remaining > 0:
+            remaining -= 1
+            # Numbered so identical meals are not coalesced into one agent call
+            meal = f"{MEALS[(n + remaining) % len(MEALS)]} #{remaining}"
+            started = time.perf_counter()
+            if kind == "image":
+                response = await client.post(
+                    "/api/nutrition/analyze/upload", headers=headers,
+                    data={"text": meal}, files={"image": ("meal.jpg", photo, "image/jpeg")},
+                )
+            else:
+                response = await client.post("/api/nutrition/analyze", headers=headers, json={"text": meal})
+            if response.status_code in (429, 503):
+                shed += 1
+                continue
+            samples.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    queued = queue.count - queue_before[1]
+    completed = calls.count - calls_before[1]
+    return {
+        **summarize(samples, errors, elapsed),
+        "shed": shed,
+        "agent_queue_ms_mean": round((queue.sum - queue_before[0]) / queued * 1000, 2) if queued else None,
+        "agent_ms_mean": round((calls.sum - calls_before[0]) / completed * 1000, 2) if completed else None,
+        "rss_start_mb": round(rss_start, 1),
+        "rss_peak_mb": round(peak, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # Imported here so the scratch settings in main() take effect
+    import httpx
+
+    from main import app
+
+    photo = make_photo()
+    report: dict = {
+        "meta": {
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "failure_rate": args.failure_rate,
+            "agent_slots": args.agent_slots,
+            "queue_size": args.queue_size,
+            "photo_bytes": len(photo),
+            "cpu_count": os.cpu_count(),
+        },
+        "scenarios": {"text": {}, "image": {}},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for kind in ("text", "image"):
+                for concurrency in args.concurrency:
+                    report["scenarios"][kind][f"concurrency_{concurrency}"] = await _level(
+                        client, kind, concurrency, args.requests, photo
+                    )
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=64, help="Requests per concurrency level and kind")
+    ap.add_argument("--latency-ms", type=float, default=200, help="Mean simulated agent latency")
+    ap.add_argument("--jitter-ms", type=float, default=50)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--agent-slots", type=int, default=4, help="Concurrent agent calls admitted")
+    ap.add_argument("--queue-size", type=int, default=64, help="Analyses allowed to wait for a slot")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--output", "-o", help="Write results here as well as to stdout")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="healthclaw-bench-") as tmp:
+        os.environ.update({
+            "HEALTHCLAW_DB": os.path.join(tmp, "bench.db"),
+            "HEALTHCLAW_UPLOAD_DIR": tmp,
+            "HEALTHCLAW_API_KEY": API_KEY,
+            "HEALTHCLAW_LOCAL_NUTRITION": "0",  # every meal goes through the agent
+            "HEALTHCLAW_AGENT_BACKEND": "simulated",
+            "HEALTHCLAW_SIM_AGENT_LATENCY_MS": str(args.latency_ms),
+            "HEALTHCLAW_SIM_AGENT_JITTER_MS": str(args.jitter_ms),
+            "HEALTHCLAW_SIM_AGENT_FAILURE_RATE": str(args.failure_rate),
+            "HEALTHCLAW_SIM_AGENT_SEED": str(args.seed),
+            "HEALTHCLAW_AGENT_MAX_CONCURRENCY": str(args.agent_slots),
+            "HEALTHCLAW_AGENT_QUEUE_SIZE": str(args.queue_size),
+            "HEALTHCLAW_ANALYZE_RATE_PER_MINUTE": "0",  # one client plays many users
+        })
+        os.environ.setdefault("HEALTHCLAW_LOG_LEVEL", "ERROR")
+        os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+        report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Agent-output parsing benchmark.
+
+Replays the response corpus in bench/corpus/agent_responses.jsonl through the
+single-pass parser and through the previous multi-attempt json.loads + manual
+model building path, reporting per-response cost and failure rates.
+
+    python -m bench.parsing [--iterations 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from agent_output import parse_agent_output
+from models import FoodItem, NutrientDetail, NutritionTotals
+
+CORPUS = Path(__file__).parent / "corpus" / "agent_responses.jsonl"
+
+# Both paths serialize the food items, as meals stored them when this was written
+FOOD_ITEMS = TypeAdapter(list[FoodItem])
+
+
+def _legacy_extract_json(text: str) -> dict:
+    """The pre-TypeAdapter extraction: up to four json.loads attempts."""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    for fence in ("```json", "```"):
+        if fence in text:
+            start = text.index(fence) + len(fence)
+            try:
+                end = text.index("```", start)
+                return json.loads(text[start:end].strip())
+            except (json.JSONDecodeError, ValueError):
+                pass
+    brace_start, brace_end = text.find("{"), text.rfind("}")
+    if brace_start != -1 and brace_end != -1:
+        try:
+            return json.loads(text[brace_start : brace_end + 1])
+        except json.JSONDecodeError:
+            pass
+    raise ValueError("Could not extract JSON")
+
+
+def legacy_parse(text: str) -> tuple[list[FoodItem], NutritionTotals, str]:
+    data = _legacy_extract_json(text)
+    items = [
+        FoodItem(
+            name=item.get("name", "Unknown"),
+            portion=item.get("portion", ""),
+            calories=float(item.get("calories", 0)),
+            protein_g=float(item.get("protein_g", 0)),
+            carbs_g=float(item.get("carbs_g", 0)),
+            fat_g=float(item.get("fat_g", 0)),
+            fiber_g=float(item.get("fiber_g", 0)),
+            sugar_g=float(item.get("sugar_g", 0)),
+            sodium_mg=float(item.get("sodium_mg", 0)),
+            nutrients=[
+                NutrientDetail(
+                    name=n.get("name", ""),
+                    amount=float(n.get("amount", 0)),
+                    unit=n.get("unit", ""),
+                    daily_value_pct=n.get("daily_value_pct"),
+                )
+                for n in item.get("nutrients", [])
+            ],
+        )
+        for item in data.get("food_items", [])
+    ]
+    t = data.get("totals", {})
+    totals = NutritionTotals(**{k: float(t.get(k, 0)) for k in NutritionTotals.model_fields})
+    return items, totals, json.dumps(data.get("food_items", []))
+
+
+def current_parse(text: str) -> tuple[list[FoodItem], NutritionTotals, str]:
+    result = parse_agent_output(text)
+    return result.food_items, result.totals, FOOD_ITEMS.dump_json(result.food_items).decode()
+
+
+def _outcomes(parser, cases: list[dict]) -> dict[str, str]:
+    outcomes = {}
+    for case in cases:
+        try:
+            parser(case["text"])
+            outcomes[case["id"]] = "ok"
+        except Exception:
+            outcomes[case["id"]] = "fail"
+    return outcomes
+
+
+def _us_per_response(parser, cases: list[dict], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for case in cases:
+            parser(case["text"])
+    return round((time.perf_counter() - started) / max(1, iterations * len(cases)) * 1e6, 2)
+
+
+def run(parser, cases: list[dict], shared: list[dict], iterations: int) -> dict:
+    outcomes = _outcomes(parser, cases)
+    accepted = [c for c in cases if outcomes[c["id"]] == "ok"]
+    expected_ok = [c for c in cases if c["expect"] == "ok"]
+    return {
+        # Responses every parser accepts, i.e. a like-for-like comparison
+        "us_per_response_shared": _us_per_response(parser, shared, iterations),
+        "us_per_response_accepted": _us_per_response(parser, accepted, iterations),
+        "failure_rate": round(sum(outcomes[c["id"]] == "fail" for c in expected_ok) / len(expected_ok), 3),
+        "false_accepts": sorted(c["id"] for c in cases if c["expect"] == "fail" and outcomes[c["id"]] == "ok"),
+        "failed": sorted(c["id"] for c in expected_ok if outcomes[c["id"]] == "fail"),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--iterations", type=int, default=2000)
+    args = ap.parse_args()
+
+    cases = [json.loads(line) for line in CORPUS.read_text().splitlines() if line.strip()]
+    parsers = {"legacy": legacy_parse, "single_pass": current_parse}
+    outcomes = {name: _outcomes(parser, cases) for name, parser in parsers.items()}
+    shared = [c for c in cases if all(o[c["id"]] == "ok" for o in outcomes.values())]
+    report = {"corpus_size": len(cases), "shared_cases": len(shared)}
+    for name, parser in parsers.items():
+        report[name] = run(parser, cases, shared, args.iterations)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Seeded generator of realistic sync payloads and meals for benchmarks.
+
+One payload per day, shaped like the iOS app's daily sync: activity, heart,
+body and vitals blocks, a Watch sleep session with stages that the iPhone
+often reports again with a slightly different start, a few workouts, mood
+check-ins and mindfulness sessions. The same seed always yields the same data.
+"""
+
+from __future__ import annotations
+
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterator
+
+from models import FoodItem, NutrientDetail
+
+WORKOUT_TYPES = ("running", "cycling", "walking", "strength", "yoga", "swimming", "hiking")
+MOOD_LABELS = ("calm", "content", "happy", "stressed", "tired", "anxious", "grateful", "irritated")
+MOOD_ASSOCIATIONS = ("work", "family", "fitness", "health", "weather", "friends", "sleep")
+# (name, portion, kcal, protein, carbs, fat, fiber, sugar, sodium mg)
+FOODS = (
+    ("Oatmeal", "1 bowl", 150, 5, 27, 3, 4, 1, 2),
+    ("Banana", "1 medium", 105, 1.3, 27, 0.4, 3.1, 14, 1),
+    ("Greek yogurt", "170 g", 100, 17, 6, 0.7, 0, 6, 60),
+    ("Scrambled eggs", "2 eggs", 180, 12, 2, 14, 0, 1, 340),
+    ("Chicken breast", "150 g", 250, 46, 0, 5, 0, 0, 110),
+    ("Brown rice", "1 cup", 215, 5, 45, 1.8, 3.5, 0.7, 10),
+    ("Salmon fillet", "150 g", 310, 34, 0, 19, 0, 0, 90),
+    ("Mixed salad", "1 bowl", 60, 2, 10, 1, 3, 4, 40),
+    ("Pasta bolognese", "1 plate", 620, 28, 75, 20, 6, 9, 780),
+    ("Apple", "1 medium", 95, 0.5, 25, 0.3, 4.4, 19, 2),
+    ("Dark chocolate", "30 g", 170, 2, 13, 12, 3, 7, 6),
+    ("Crème brûlée", "1 ramekin", 330, 5, 30, 21, 0, 28, 60),
+)
+
+
+def _at(day: date, hours: float) -> datetime:
+    return datetime.combine(day, time(), tzinfo=timezone.utc) + timedelta(hours=hours)
+
+
+def _stages(rng: random.Random, start: datetime, total_min: float) -> list[dict]:
+    stages, at, left = [], start, total_min
+    while left > 1:
+        stage = rng.choices(("core", "deep", "rem", "awake"), weights=(50, 18, 24, 8))[0]
+        minutes = min(left, rng.uniform(5, 45))
+        stages.append({
+            "stage": stage,
+            "start": at.isoformat(),
+            "end": (at + timedelta(minutes=minutes)).isoformat(),
+            "duration_min": round(minutes, 1),
+        })
+        at += timedelta(minutes=minutes)
+        left -= minutes
+    return stages
+
+
+def day_payload(rng: random.Random, day: date, device_id: str = "bench-iphone") -> dict:
+    """One day's sync payload as the JSON the app posts."""
+    workouts = []
+    for _ in range(rng.choices((0, 1, 2, 3), weights=(35, 40, 20, 5))[0]):
+        start = _at(day, rng.uniform(6, 20))
+        minutes = rng.uniform(15, 100)
+        workouts.append({
+            "workout_type": rng.choice(WORKOUT_TYPES),
+            "start": start.isoformat(),
+            "end": (start + timedelta(minutes=minutes)).isoformat(),
+            "duration_min": round(minutes, 1),
+            "distance_km": round(rng.uniform(1, 25), 2) if rng.random() < 0.7 else None,
+            "active_calories": round(minutes * rng.uniform(5, 12), 1),
+            "avg_hr": round(rng.uniform(100, 160), 1),
+            "max_hr": round(rng.uniform(150, 190), 1),
+            "elevation_gain_m": round(rng.uniform(0, 400), 1) if rng.random() < 0.4 else None,
+        })
+
+    # Overnight sleep ending on `day`; the iPhone often reports it again without stages
+    sleep_start = _at(day, rng.uniform(-2.5, 0.5))
+    sleep_min = max(180.0, rng.gauss(430, 45))
+    sleep = [{
+        "start": sleep_start.isoformat(),
+        "end": (sleep_start + timedelta(minutes=sleep_min)).isoformat(),
+        "total_duration_min": round(sleep_min, 1),
+        "in_bed_duration_min": round(sleep_min + rng.uniform(5, 40), 1),
+        "stages": _stages(rng, sleep_start, sleep_min),
+    }]
+    if rng.random() < 0.6:
+        phone_start = sleep_start - timedelta(minutes=rng.uniform(5, 30))
+        phone_min = sleep_min + rng.uniform(-20, 20)
+        sleep.append({
+            "start": phone_start.isoformat(),
+            "end": (phone_start + timedelta(minutes=phone_min)).isoformat(),
+            "total_duration_min": round(phone_min, 1),
+            "in_bed_duration_min": round(phone_min + 10, 1),
+            "stages": [],
+        })
+    if rng.random() < 0.15:  # afternoon nap
+        nap_start = _at(day, rng.uniform(13, 16))
+        nap_min = rng.uniform(15, 60)
+        sleep.append({
+            "start": nap_start.isoformat(),
+            "end": (nap_start + timedelta(minutes=nap_min)).isoformat(),
+            "total_duration_min": round(nap_min, 1),
+            "stages": _stages(rng, nap_start, nap_min),
+        })
+
+    mood = [
+        {
+            "kind": "momentary_emotion",
+            "timestamp": _at(day, rng.uniform(8, 22)).isoformat(),
+            "valence": round(rng.uniform(-1, 1), 2),
+            "labels": rng.sample(MOOD_LABELS, rng.randint(1, 3)),
+            "associations": rng.sample(MOOD_ASSOCIATIONS, rng.randint(0, 2)),
+        }
+        for _ in range(rng.randint(0, 4))
+    ]
+    if rng.random() < 0.7:
+        mood.append({
+            "kind": "daily_mood",
+            "timestamp": _at(day, 21).isoformat(),
+            "valence": round(rng.uniform(-0.5, 1), 2),
+            "labels": rng.sample(MOOD_LABELS, 2),
+            "associations": rng.sample(MOOD_ASSOCIATIONS, 1),
+        })
+
+    mindfulness = []
+    for _ in range(rng.choices((0, 1, 2), weights=(60, 32, 8))[0]):
+        start = _at(day, rng.uniform(6, 22))
+        minutes = rng.choice((3, 5, 10, 15, 20))
+        mindfulness.append({
+            "start": start.isoformat(),
+            "end": (start + timedelta(minutes=minutes)).isoformat(),
+            "duration_min": minutes,
+        })
+
+    return {
+        "device_id": device_id,
+        "synced_at": _at(day, 23.5).isoformat(),
+        "period_from": _at(day, 0).isoformat(),
+        "period_to": _at(day, 23.99).isoformat(),
+        "activity": {
+            "steps": max(0, int(rng.gauss(8500, 3000))),
+            "distance_km": round(rng.uniform(2, 14), 2),
+            "active_calories": round(rng.uniform(200, 900), 1),
+            "basal_calories": round(rng.uniform(1500, 1800), 1),
+            "exercise_minutes": round(sum(w["duration_min"] for w in workouts) + rng.uniform(0, 20), 1),
+            "stand_hours": rng.randint(6, 14),
+            "flights_climbed": rng.randint(0, 25),
+            "vo2_max": round(rng.gauss(44, 2), 1),
+            "walking_speed_kmh": round(rng.gauss(5, 0.4), 2),
+        },
+        "heart": {
+            "resting_hr": round(rng.gauss(58, 4), 1),
+            "avg_hr": round(rng.gauss(75, 6), 1),
+            "min_hr": round(rng.gauss(48, 3), 1),
+            "max_hr": round(rng.gauss(150, 15), 1),
+            "hrv_sdnn": round(rng.gauss(48, 10), 1),
+            "walking_hr_avg": round(rng.gauss(95, 8), 1),
+        },
+        "sleep": sleep,
+        "workouts": workouts,
+        "mood": mood,
+        "body": {"weight_kg": round(rng.gauss(75, 1.5), 1), "body_fat_pct": round(rng.gauss(18, 1), 1)}
+        if rng.random() < 0.4 else None,
+        "vitals": {
+            "blood_oxygen_pct": round(rng.uniform(94, 99.5), 1),
+            "respiratory_rate": round(rng.gauss(14, 1.5), 1),
+        },
+        "mindfulness": mindfulness,
+        "body_battery": rng.randint(5, 100),
+    }
+
+
+def generate_payloads(days: int, seed: int = 7, end: date | None = None) -> Iterator[dict]:
+    """`days` consecutive daily payloads ending on `end` (default today), oldest first."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    for offset in range(days - 1, -1, -1):
+        yield day_payload(rng, end - timedelta(days=offset))
+
+
+def generate_meals(days: int, seed: int = 7, end: date | None = None) -> Iterator[dict]:
+    """Keyword arguments for database.store_meal_entry, 2-5 meals per day."""
+    rng = random.Random(seed + 1)
+    end = end or date.today()
+    for offset in range(days - 1, -1, -1):
+        day = end - timedelta(days=offset)
+        for hour in sorted(rng.sample((7.5, 10, 12.5, 15.5, 19, 21), rng.randint(2, 5))):
+            foods = rng.sample(FOODS, rng.randint(1, 4))
+            items = [
+                FoodItem(
+                    name=name, portion=portion, calories=kcal, protein_g=protein, carbs_g=carbs,
+                    fat_g=fat, fiber_g=fiber, sugar_g=sugar, sodium_mg=sodium,
+                    nutrients=[NutrientDetail(name="Vitamin C", amount=round(rng.uniform(0, 30), 1), unit="mg")],
+                )
+                for name, portion, kcal, protein, carbs, fat, fiber, sugar, sodium in foods
+            ]
+            yield {
+                "date": day.isoformat(),
+                "timestamp": _at(day, hour).isoformat(),
+                "description": " with ".join(item.name.lower() for item in items),
+                "analysis_json": "{}",
+                "total_calories": sum(i.calories for i in items),
+                "total_protein_g": sum(i.protein_g for i in items),
+                "total_carbs_g": sum(i.carbs_g for i in items),
+                "total_fat_g": sum(i.fat_g for i in items),
+                "nutrients": [
+                    {"name": "Sodium", "amount": sum(i.sodium_mg for i in items), "unit": "mg"},
+                    {"name": "Fiber", "amount": sum(i.fiber_g for i in items), "unit": "g"},
+                ],
+                "food_items": items,
+            }
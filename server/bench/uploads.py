@@ -0,0 +1,98 @@
+"""
+Upload memory benchmark.
+
+Posts one large photo through the legacy base64 JSON endpoint and through the
+multipart upload endpoint (in-process over ASGI, simulated agent) and reports
+the peak traced Python allocations of each request. The client builds its
+request body before tracing starts, so the numbers are the server side only.
+
+    python -m bench.uploads [--megabytes 10] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+
+from bench.load import API_KEY
+
+
+async def _peak_mb(client, build) -> float:
+    method, url, kwargs = build()
+    request = client.build_request(method, url, **kwargs)
+    body = request.read()  # encode outside the traced window
+    gc.collect()
+    tracemalloc.start()
+    try:
+        response = await client.send(request)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if response.status_code >= 400:
+        raise SystemExit(f"{url}: HTTP {response.status_code} {response.text[:200]}")
+    del body
+    return peak / 2**20
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # Imported here so the scratch settings in main() take effect
+    import httpx
+
+    from main import app
+
+    photo = b"\xff\xd8\xff\xe0" + os.urandom(int(args.megabytes * 2**20))
+    headers = {"X-API-Key": API_KEY}
+    scenarios = {
+        "base64_json": lambda: ("POST", "/api/nutrition/analyze", {
+            "headers": headers,
+            "json": {"text": "lunch", "image_base64": base64.b64encode(photo).decode()},
+        }),
+        "multipart": lambda: ("POST", "/api/nutrition/analyze/upload", {
+            "headers": headers,
+            "data": {"text": "lunch"},
+            "files": {"image": ("meal.jpg", photo, "image/jpeg")},
+        }),
+    }
+    report: dict = {"meta": {"photo_bytes": len(photo), "repeat": args.repeat}, "peak_traced_mb": {}}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, build in scenarios.items():
+                peaks = [await _peak_mb(client, build) for _ in range(args.repeat)]
+                report["peak_traced_mb"][name] = round(min(peaks), 1)
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--megabytes", type=float, default=10, help="Photo size")
+    ap.add_argument("--repeat", type=int, default=3, help="Requests per endpoint; the lowest peak is reported")
+    args = ap.parse_args()
+
+    spool = "/dev/shm" if os.path.isdir("/dev/shm") else None  # same default as UPLOAD_DIR
+    with tempfile.TemporaryDirectory(prefix="healthclaw-bench-") as tmp, \
+            tempfile.TemporaryDirectory(prefix="healthclaw-bench-", dir=spool) as uploads:
+        os.environ.update({
+            "HEALTHCLAW_DB": os.path.join(tmp, "bench.db"),
+            "HEALTHCLAW_UPLOAD_DIR": uploads,
+            "HEALTHCLAW_API_KEY": API_KEY,
+            "HEALTHCLAW_AGENT_BACKEND": "simulated",
+            "HEALTHCLAW_SIM_AGENT_LATENCY_MS": "0",
+            "HEALTHCLAW_SIM_AGENT_JITTER_MS": "0",
+            "HEALTHCLAW_ANALYZE_RATE_PER_MINUTE": "0",
+        })
+        os.environ.setdefault("HEALTHCLAW_LOG_LEVEL", "ERROR")
+        os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+        report = asyncio.run(run(args))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
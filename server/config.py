@@ -1,14 +1,100 @@
 """HealthClaw server configuration."""
 
 import os
+import tempfile
 from pathlib import Path
 
 # API key for authenticating the iOS app
 API_KEY = os.getenv("HEALTHCLAW_API_KEY", "change-me-in-production")
 
-# SQLite database path
+# SQLite database path (the "default" tenant's database)
 DB_PATH = Path(os.getenv("HEALTHCLAW_DB", "/home/lars/.openclaw/workspace-coder/HealthClaw/server/healthclaw.db"))
 
+# Multi-tenant setup: JSON file mapping API keys to tenant ids; each tenant
+# gets its own SQLite file in TENANT_DB_DIR
+TENANTS_FILE = os.getenv("HEALTHCLAW_TENANTS_FILE")
+TENANT_DB_DIR = Path(os.getenv("HEALTHCLAW_TENANT_DB_DIR", str(DB_PATH.parent / "tenants")))
+# Open tenant connections kept in the LRU cache, and how long an unused one stays open
+DB_POOL_SIZE = int(os.getenv("HEALTHCLAW_DB_POOL_SIZE", "32"))
+DB_IDLE_SECONDS = float(os.getenv("HEALTHCLAW_DB_IDLE_SECONDS", "300"))
+# Read-only connections per tenant that run alongside its writer; 0 sends reads to the writer
+DB_READERS = int(os.getenv("HEALTHCLAW_DB_READERS", "4"))
+
+# Where uploaded food photos are spooled for the agent; tmpfs keeps them off disk
+UPLOAD_DIR = Path(os.getenv(
+    "HEALTHCLAW_UPLOAD_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+))
+MAX_UPLOAD_BYTES = int(os.getenv("HEALTHCLAW_MAX_UPLOAD_MB", "20")) * 1024 * 1024
+
+# Food photos are downscaled to this longest edge (px) and re-encoded before
+# vision analysis; 0 disables preprocessing
+IMAGE_MAX_EDGE = int(os.getenv("HEALTHCLAW_IMAGE_MAX_EDGE", "1568"))
+IMAGE_JPEG_QUALITY = int(os.getenv("HEALTHCLAW_IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("HEALTHCLAW_IMAGE_WORKERS", "2"))
+
+# Answer simple text meals from the bundled food table instead of the agent
+LOCAL_NUTRITION = os.getenv("HEALTHCLAW_LOCAL_NUTRITION", "1") == "1"
+# Minimum match confidence (0..1) for every food in a meal to skip the agent;
+# kept above what a one-word phrase scores against a two-word alias (~0.6)
+LOCAL_NUTRITION_MIN_CONFIDENCE = float(os.getenv("HEALTHCLAW_LOCAL_NUTRITION_MIN_CONFIDENCE", "0.7"))
+# Optional extra food-composition CSV merged over the bundled table
+FOOD_DB_EXTRA = os.getenv("HEALTHCLAW_FOOD_DB")
+
+# Nutrition agent: "openclaw" (CLI through the gateway) or "simulated", a local
+# stand-in for load tests without the gateway
+AGENT_BACKEND = os.getenv("HEALTHCLAW_AGENT_BACKEND", "openclaw")
+# Simulated agent: mean latency and jitter (ms), share of calls that fail, an
+# optional JSONL file of canned replies ({"text": ...} per line) and RNG seed
+SIM_AGENT_LATENCY_MS = float(os.getenv("HEALTHCLAW_SIM_AGENT_LATENCY_MS", "1500"))
+SIM_AGENT_JITTER_MS = float(os.getenv("HEALTHCLAW_SIM_AGENT_JITTER_MS", "500"))
+SIM_AGENT_FAILURE_RATE = float(os.getenv("HEALTHCLAW_SIM_AGENT_FAILURE_RATE", "0"))
+SIM_AGENT_RESPONSES = os.getenv("HEALTHCLAW_SIM_AGENT_RESPONSES")
+SIM_AGENT_SEED = int(os.environ["HEALTHCLAW_SIM_AGENT_SEED"]) if os.getenv("HEALTHCLAW_SIM_AGENT_SEED") else None
+
+# Total time one analysis may spend on agent calls (s), including a hedged
+# second attempt. HEDGE_AFTER starts that attempt once the first has run this
+# many seconds, "p95" for the recent 95th percentile of successful calls, or
+# "off". The breaker opens after BREAKER_FAILURES failed or timed out calls in
+# a row and stays open for BREAKER_RESET_SECONDS before letting a probe through
+AGENT_TIMEOUT = float(os.getenv("HEALTHCLAW_AGENT_TIMEOUT", "150"))
+AGENT_HEDGE_AFTER = os.getenv("HEALTHCLAW_AGENT_HEDGE_AFTER", "off")
+AGENT_BREAKER_FAILURES = int(os.getenv("HEALTHCLAW_AGENT_BREAKER_FAILURES", "5"))
+AGENT_BREAKER_RESET_SECONDS = float(os.getenv("HEALTHCLAW_AGENT_BREAKER_RESET_SECONDS", "30"))
+
+# Admission control for agent calls: concurrent calls, callers allowed to wait
+# for a free slot and for how long (s), and per-API-key analyses per minute
+# with their burst allowance (0 per minute disables the rate limit)
+AGENT_MAX_CONCURRENCY = int(os.getenv("HEALTHCLAW_AGENT_MAX_CONCURRENCY", "4"))
+AGENT_QUEUE_SIZE = int(os.getenv("HEALTHCLAW_AGENT_QUEUE_SIZE", "16"))
+AGENT_QUEUE_TIMEOUT = float(os.getenv("HEALTHCLAW_AGENT_QUEUE_TIMEOUT", "30"))
+ANALYZE_RATE_PER_MINUTE = float(os.getenv("HEALTHCLAW_ANALYZE_RATE_PER_MINUTE", "10"))
+ANALYZE_BURST = int(os.getenv("HEALTHCLAW_ANALYZE_BURST", "5"))
+
+# How long an Idempotency-Key on /api/nutrition/analyze keeps returning its meal
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("HEALTHCLAW_IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+# /api/events: seconds between keepalives on an idle stream, and how long
+# change events are kept for clients resuming with Last-Event-ID
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("HEALTHCLAW_EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_RETENTION_HOURS = float(os.getenv("HEALTHCLAW_EVENTS_RETENTION_HOURS", "72"))
+
+# Long-range analytics: "duckdb" (columnar, over Parquet snapshots), "sqlite",
+# or "auto" (duckdb when installed)
+ANALYTICS_BACKEND = os.getenv("HEALTHCLAW_ANALYTICS_BACKEND", "auto")
+ANALYTICS_DIR = Path(os.getenv("HEALTHCLAW_ANALYTICS_DIR", str(DB_PATH.parent / "analytics")))
+# Snapshots older than this are rebuilt before the next analytics query
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("HEALTHCLAW_ANALYTICS_REFRESH_SECONDS", "300"))
+
+# Rows per record batch (and Parquet row group) in /api/export streams
+EXPORT_BATCH_ROWS = int(os.getenv("HEALTHCLAW_EXPORT_BATCH_ROWS", "8192"))
+
+# Statements slower than this (ms) are kept with their query plan for
+# /api/admin/slow-queries; a negative value turns the log off
+SLOW_QUERY_MS = float(os.getenv("HEALTHCLAW_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("HEALTHCLAW_SLOW_QUERY_LOG_SIZE", "200"))
+
 # Server settings
 HOST = os.getenv("HEALTHCLAW_HOST", "0.0.0.0")
 PORT = int(os.getenv("HEALTHCLAW_PORT", "8099"))
+LOG_LEVEL = os.getenv("HEALTHCLAW_LOG_LEVEL", "INFO")
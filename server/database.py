@@ -1,153 +1,867 @@
-"""SQLite database layer for HealthClaw."""
+"""
+SQLite database layer for HealthClaw.
+
+Each tenant has its own SQLite file (see tenants.py). Functions here work on
+the current tenant's database through connect(), which hands out that
+tenant's pooled writer, or one of its readers for read-only operations, for
+the duration of one operation.
+"""
 
 from __future__ import annotations
 
 import aiosqlite
+import asyncio
 import json
-from datetime import datetime
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date as date_type, datetime, timezone
 from pathlib import Path
+from typing import AsyncIterator
+
+from agent_output import AGENT_FOOD_ITEMS, AgentOutputError, parse_agent_output
+from config import DB_IDLE_SECONDS, DB_POOL_SIZE, DB_READERS, EVENTS_RETENTION_HOURS, IDEMPOTENCY_KEY_TTL_HOURS
+from events import CHANGES
+from widget import WIDGETS, WidgetDocument
+from metrics import timed_query
+from migrations import Migration, column_exists, migrate, table_exists
+from querylog import instrument, plan_lines
+from models import FoodItem, HealthSyncPayload
+from tenants import active_tenant, db_path_for
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PooledConnection:
+    # Bounds how many readers may be open at once
+    reader_slots: asyncio.Semaphore
+    db: aiosqlite.Connection | None = None
+    # Held for a whole write operation, so transactions on the writer never interleave
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Idle query_only connections
+    readers: list[aiosqlite.Connection] = field(default_factory=list)
+    # Operations holding or waiting for a connection; only idle entries may be evicted
+    users: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """
+    Per-tenant SQLite connections, kept in an LRU cache of at most `size`
+    tenants and closed after `idle_seconds` without use. Each tenant has one
+    writer, used by one operation at a time, and up to `readers` query_only
+    connections that WAL lets read alongside it. Different tenants never wait
+    on each other.
+    """
+
+    def __init__(self, size: int, idle_seconds: float, readers: int):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.readers = readers
+        self._entries: OrderedDict[str, _PooledConnection] = OrderedDict()
+        self._initialized: set[Path] = set()
+        self._reaper: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def connection(self, tenant: str, read_only: bool = False) -> AsyncIterator[aiosqlite.Connection]:
+        entry = self._entries.get(tenant)
+        if entry is None:
+            entry = self._entries[tenant] = _PooledConnection(asyncio.Semaphore(self.readers))
+        self._entries.move_to_end(tenant)
+        entry.users += 1
+        try:
+            if read_only and self.readers > 0:
+                async with self._reader(entry, tenant) as db:
+                    yield instrument(db, tenant)
+            else:
+                async with self._writer(entry, tenant) as db:
+                    yield instrument(db, tenant)
+        finally:
+            entry.users -= 1
+        if len(self._entries) > self.size:
+            await self._evict_overflow()
+
+    @asynccontextmanager
+    async def _writer(self, entry: _PooledConnection, tenant: str) -> AsyncIterator[aiosqlite.Connection]:
+        async with entry.lock:
+            if entry.db is None:
+                entry.db = await self._open(db_path_for(tenant))
+                await self._evict_overflow()
+            entry.db.row_factory = None
+            try:
+                yield entry.db
+            finally:
+                # Whatever the operation left uncommitted (errors, early returns) is dropped
+                if entry.db.in_transaction:
+                    await entry.db.rollback()
+                entry.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def _reader(self, entry: _PooledConnection, tenant: str) -> AsyncIterator[aiosqlite.Connection]:
+        if entry.db is None:
+            # The writer migrates the file, so it is opened before any reader
+            async with self._writer(entry, tenant):
+                pass
+        async with entry.reader_slots:
+            db = entry.readers.pop() if entry.readers else await self._open_reader(db_path_for(tenant))
+            db.row_factory = None
+            try:
+                yield db
+            finally:
+                if db.in_transaction:
+                    await db.rollback()
+                entry.readers.append(db)
+                entry.last_used = time.monotonic()
+
+    async def _open(self, path: Path) -> aiosqlite.Connection:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = await aiosqlite.connect(path)
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute("PRAGMA busy_timeout = 5000")
+        if path not in self._initialized:
+            await migrate(db, SCHEMA_MIGRATIONS)
+            self._initialized.add(path)
+        logger.debug("Opened database %s", path)
+        return db
+
+    async def _open_reader(self, path: Path) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(path)
+        await db.execute("PRAGMA query_only = ON")
+        await db.execute("PRAGMA busy_timeout = 5000")
+        logger.debug("Opened reader for %s", path)
+        return db
+
+    async def _evict_overflow(self) -> None:
+        while len(self._entries) > self.size:
+            victim = next((t for t, e in self._entries.items() if e.users == 0), None)
+            if victim is None:
+                return  # everything is busy; shrink on a later call
+            await self._close_entry(victim)
+
+    async def _close_entry(self, tenant: str) -> None:
+        entry = self._entries.pop(tenant)
+        for db in entry.readers:
+            await db.close()
+        entry.readers.clear()
+        if entry.db is not None:
+            await entry.db.close()
+            logger.debug("Closed database for tenant %s", tenant)
+
+    async def close_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for tenant in [t for t, e in self._entries.items() if e.users == 0 and e.last_used < cutoff]:
+            await self._close_entry(tenant)
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_seconds / 2))
+            await self.close_idle()
+
+    def start(self) -> None:
+        """Start closing idle connections in the background."""
+        if self._reaper is None:
+            self._reaper = asyncio.get_running_loop().create_task(self._reap())
+
+    async def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for tenant in list(self._entries):
+            await self._close_entry(tenant)
+
+
+_pool = ConnectionPool(DB_POOL_SIZE, DB_IDLE_SECONDS, DB_READERS)
+
+
+def connect(tenant: str | None = None, *, read_only: bool = False):
+    """
+    Async context manager yielding a connection to `tenant`'s database
+    (default: the current tenant). The writer is held exclusively for the
+    block; `read_only` blocks get a query_only reader instead and run
+    alongside it.
+    """
+    return _pool.connection(tenant or active_tenant(), read_only)
+
+
+def start_pool() -> None:
+    _pool.start()
+
+
+async def close_pool() -> None:
+    await _pool.close()
+
+
+async def init_db(tenant: str | None = None) -> None:
+    """Create or upgrade `tenant`'s schema (default: the current tenant)."""
+    async with connect(tenant):
+        pass  # the pool migrates every database when first opened
+
 
-from config import DB_PATH
-from models import HealthSyncPayload
-
-
-async def init_db() -> None:
-    """Create tables if they don't exist."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript("""
-            CREATE TABLE IF NOT EXISTS sync_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT NOT NULL,
-                synced_at TEXT NOT NULL,
-                period_from TEXT NOT NULL,
-                period_to TEXT NOT NULL,
-                payload_json TEXT NOT NULL,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE TABLE IF NOT EXISTS daily_summary (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL UNIQUE,
-                steps INTEGER,
-                distance_km REAL,
-                active_calories REAL,
-                exercise_minutes REAL,
-                stand_hours INTEGER,
-                flights_climbed INTEGER,
-                resting_hr REAL,
-                avg_hr REAL,
-                hrv_sdnn REAL,
-                sleep_duration_min REAL,
-                deep_sleep_min REAL,
-                rem_sleep_min REAL,
-                core_sleep_min REAL,
-                awake_min REAL,
-                weight_kg REAL,
-                body_fat_pct REAL,
-                body_battery INTEGER,
-                mood_avg_valence REAL,
-                workout_count INTEGER,
-                workout_minutes REAL,
-                workout_calories REAL,
-                mindfulness_minutes REAL,
-                blood_oxygen_pct REAL,
-                respiratory_rate REAL,
-                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE TABLE IF NOT EXISTS workouts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                workout_type TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL,
-                duration_min REAL,
-                distance_km REAL,
-                active_calories REAL,
-                avg_hr REAL,
-                max_hr REAL,
-                elevation_gain_m REAL,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE TABLE IF NOT EXISTS mood_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                kind TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                valence REAL NOT NULL,
-                labels TEXT,
-                associations TEXT,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE TABLE IF NOT EXISTS sleep_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL,
-                total_duration_min REAL,
-                in_bed_duration_min REAL,
-                stages_json TEXT,
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                UNIQUE(date, start_time)
-            );
-
-            CREATE TABLE IF NOT EXISTS meal_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                description TEXT NOT NULL,
-                image_path TEXT,
-                analysis_json TEXT NOT NULL,
-                total_calories REAL,
-                total_protein_g REAL,
-                total_carbs_g REAL,
-                total_fat_g REAL,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE TABLE IF NOT EXISTS meal_nutrients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                meal_entry_id INTEGER NOT NULL REFERENCES meal_entries(id),
-                nutrient_name TEXT NOT NULL,
-                amount REAL NOT NULL,
-                unit TEXT NOT NULL,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_daily_summary_date ON daily_summary(date);
-            CREATE INDEX IF NOT EXISTS idx_workouts_date ON workouts(date);
-            CREATE INDEX IF NOT EXISTS idx_mood_date ON mood_entries(date);
-            CREATE INDEX IF NOT EXISTS idx_sleep_date ON sleep_sessions(date);
-            CREATE INDEX IF NOT EXISTS idx_meal_entries_date ON meal_entries(date);
-            CREATE INDEX IF NOT EXISTS idx_meal_nutrients_entry ON meal_nutrients(meal_entry_id);
+# Schema migrations, oldest first. Released steps are never edited; changes
+# go in a new step appended to SCHEMA_MIGRATIONS.
+
+_BASE_TABLES = (
+    """CREATE TABLE IF NOT EXISTS sync_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        synced_at TEXT NOT NULL,
+        period_from TEXT NOT NULL,
+        period_to TEXT NOT NULL,
+        payload_json TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS daily_summary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL UNIQUE,
+        steps INTEGER,
+        distance_km REAL,
+        active_calories REAL,
+        exercise_minutes REAL,
+        stand_hours INTEGER,
+        flights_climbed INTEGER,
+        resting_hr REAL,
+        avg_hr REAL,
+        hrv_sdnn REAL,
+        sleep_duration_min REAL,
+        deep_sleep_min REAL,
+        rem_sleep_min REAL,
+        core_sleep_min REAL,
+        awake_min REAL,
+        weight_kg REAL,
+        body_fat_pct REAL,
+        body_battery INTEGER,
+        mood_avg_valence REAL,
+        workout_count INTEGER,
+        workout_minutes REAL,
+        workout_calories REAL,
+        mindfulness_minutes REAL,
+        blood_oxygen_pct REAL,
+        respiratory_rate REAL,
+        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        workout_type TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        duration_min REAL,
+        distance_km REAL,
+        active_calories REAL,
+        avg_hr REAL,
+        max_hr REAL,
+        elevation_gain_m REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS mood_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        valence REAL NOT NULL,
+        labels TEXT,
+        associations TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS sleep_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        total_duration_min REAL,
+        in_bed_duration_min REAL,
+        stages_json TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        UNIQUE(date, start_time)
+    )""",
+    """CREATE TABLE IF NOT EXISTS meal_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        description TEXT NOT NULL,
+        image_path TEXT,
+        analysis_json TEXT NOT NULL,
+        total_calories REAL,
+        total_protein_g REAL,
+        total_carbs_g REAL,
+        total_fat_g REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_daily_summary_date ON daily_summary(date)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_summary_updated ON daily_summary(updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_workouts_date ON workouts(date)",
+    "CREATE INDEX IF NOT EXISTS idx_mood_date ON mood_entries(date)",
+    "CREATE INDEX IF NOT EXISTS idx_sleep_date ON sleep_sessions(date)",
+    "CREATE INDEX IF NOT EXISTS idx_meal_entries_date ON meal_entries(date)",
+)
+
+
+async def _create_base_tables(db: aiosqlite.Connection) -> None:
+    for statement in _BASE_TABLES:
+        await db.execute(statement)
+
+
+async def _add_food_items_json(db: aiosqlite.Connection) -> None:
+    # Legacy column, still read by the meal_food_items backfill
+    if not await column_exists(db, "meal_entries", "food_items_json"):
+        await db.execute("ALTER TABLE meal_entries ADD COLUMN food_items_json TEXT")
+
+
+async def _unique_sleep_sessions(db: aiosqlite.Connection) -> None:
+    """Deduplicate sleep_sessions of databases created without UNIQUE(date, start_time)."""
+    cursor = await db.execute("""
+        SELECT 1 FROM pragma_index_list('sleep_sessions') il
+        WHERE il."unique" AND (
+            SELECT group_concat(name) FROM (SELECT name FROM pragma_index_info(il.name) ORDER BY seqno)
+        ) = 'date,start_time'
+    """)
+    if await cursor.fetchone() is not None:
+        return
+    await db.execute("""
+        DELETE FROM sleep_sessions WHERE id NOT IN (
+            SELECT MIN(id) FROM sleep_sessions GROUP BY date, start_time
+        )
+    """)
+    await db.execute("CREATE UNIQUE INDEX idx_sleep_unique ON sleep_sessions(date, start_time)")
+
+
+_NUTRIENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS nutrients (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        unit TEXT NOT NULL,
+        UNIQUE(name, unit)
+    )
+"""
+
+_MEAL_NUTRIENTS_TABLE = """
+    CREATE TABLE {if_not_exists} meal_nutrients (
+        meal_entry_id INTEGER NOT NULL REFERENCES meal_entries(id),
+        nutrient_id INTEGER NOT NULL REFERENCES nutrients(id),
+        amount REAL NOT NULL,
+        PRIMARY KEY (meal_entry_id, nutrient_id)
+    ) WITHOUT ROWID
+"""
+
+
+# Legacy meal_nutrients rows moved per backfill transaction
+_NUTRIENT_BACKFILL_ROWS = 5000
+
+
+async def _backfill_nutrient_dictionary(db: aiosqlite.Connection) -> bool:
+    """
+    Move legacy name/unit-per-row meal_nutrients rows into the dictionary
+    layout, oldest first, in batches. The legacy table, renamed to
+    meal_nutrients_legacy, is the resume marker: moved rows are deleted
+    from it. Returns False once there is nothing (left) to move.
+    """
+    if not await table_exists(db, "meal_nutrients_legacy"):
+        if not await column_exists(db, "meal_nutrients", "nutrient_name"):
+            return False
+        await db.execute(_NUTRIENTS_TABLE)
+        await db.execute("ALTER TABLE meal_nutrients RENAME TO meal_nutrients_legacy")
+        await db.execute(_MEAL_NUTRIENTS_TABLE.format(if_not_exists=""))
+        return True
+
+    cursor = await db.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM meal_nutrients_legacy ORDER BY id LIMIT ?)",
+        (_NUTRIENT_BACKFILL_ROWS,),
+    )
+    (last_id,) = await cursor.fetchone()
+    if last_id is None:
+        return False
+    await db.create_function("canonical_unit", 1, canonical_unit, deterministic=True)
+    await db.execute("""
+        INSERT OR IGNORE INTO nutrients (name, unit)
+        SELECT DISTINCT trim(nutrient_name), canonical_unit(unit)
+        FROM meal_nutrients_legacy WHERE id <= ?
+    """, (last_id,))
+    # A meal's rows may straddle two batches, so later rows add to earlier ones
+    await db.execute("""
+        INSERT INTO meal_nutrients (meal_entry_id, nutrient_id, amount)
+        SELECT l.meal_entry_id, n.id, SUM(l.amount)
+        FROM meal_nutrients_legacy l
+        JOIN nutrients n ON n.name = trim(l.nutrient_name) AND n.unit = canonical_unit(l.unit)
+        WHERE l.id <= ?
+        GROUP BY l.meal_entry_id, n.id
+        ON CONFLICT(meal_entry_id, nutrient_id) DO UPDATE SET amount = amount + excluded.amount
+    """, (last_id,))
+    await db.execute("DELETE FROM meal_nutrients_legacy WHERE id <= ?", (last_id,))
+    return True
+
+
+async def _create_nutrient_dictionary(db: aiosqlite.Connection) -> None:
+    """
+    Nutrient names and canonical units are stored once in `nutrients`; the
+    primary key of meal_nutrients doubles as the covering index for per-meal
+    reads. Legacy rows have been moved by _backfill_nutrient_dictionary.
+    """
+    await db.execute(_NUTRIENTS_TABLE)
+    await db.execute(_MEAL_NUTRIENTS_TABLE.format(if_not_exists="IF NOT EXISTS"))
+    if not await table_exists(db, "meal_nutrients_legacy"):
+        return
+    await db.execute("DROP TABLE meal_nutrients_legacy")
+    if await table_exists(db, "daily_nutrition"):
+        await _rebuild_daily_nutrition(db)  # units may have been renamed
+
+
+async def _create_meal_food_items(db: aiosqlite.Connection) -> None:
+    """Food items of a meal in display order, backfilled from the legacy JSON columns."""
+    created = not await table_exists(db, "meal_food_items")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS meal_food_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            meal_entry_id INTEGER NOT NULL REFERENCES meal_entries(id),
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            portion TEXT NOT NULL,
+            calories REAL NOT NULL,
+            protein_g REAL NOT NULL,
+            carbs_g REAL NOT NULL,
+            fat_g REAL NOT NULL,
+            fiber_g REAL NOT NULL DEFAULT 0,
+            sugar_g REAL NOT NULL DEFAULT 0,
+            sodium_mg REAL NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS meal_food_item_nutrients (
+            food_item_id INTEGER NOT NULL REFERENCES meal_food_items(id),
+            nutrient_id INTEGER NOT NULL REFERENCES nutrients(id),
+            amount REAL NOT NULL,
+            daily_value_pct REAL,
+            PRIMARY KEY (food_item_id, nutrient_id)
+        ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_meal_food_items_meal ON meal_food_items(meal_entry_id, position)"
+    )
+    if created:
+        await _backfill_meal_food_items(db)
+
+
+_MEAL_SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS meal_search_insert AFTER INSERT ON meal_entries BEGIN
+        INSERT INTO meal_search (rowid, description, foods) VALUES (new.id, new.description, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meal_search_update AFTER UPDATE OF description ON meal_entries BEGIN
+        UPDATE meal_search SET description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meal_search_delete AFTER DELETE ON meal_entries BEGIN
+        DELETE FROM meal_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meal_search_item_insert AFTER INSERT ON meal_food_items BEGIN
+        UPDATE meal_search SET foods = (
+            SELECT group_concat(name, ' ') FROM meal_food_items WHERE meal_entry_id = new.meal_entry_id
+        ) WHERE rowid = new.meal_entry_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meal_search_item_update AFTER UPDATE OF name ON meal_food_items BEGIN
+        UPDATE meal_search SET foods = (
+            SELECT group_concat(name, ' ') FROM meal_food_items WHERE meal_entry_id = new.meal_entry_id
+        ) WHERE rowid = new.meal_entry_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meal_search_item_delete AFTER DELETE ON meal_food_items BEGIN
+        UPDATE meal_search SET foods = COALESCE((
+            SELECT group_concat(name, ' ') FROM meal_food_items WHERE meal_entry_id = old.meal_entry_id
+        ), '') WHERE rowid = old.meal_entry_id;
+    END""",
+)
+
+
+async def _create_meal_search(db: aiosqlite.Connection) -> None:
+    """Full-text index over meals (rowid is the meal_entries id), kept current by triggers."""
+    created = not await table_exists(db, "meal_search")
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS meal_search USING fts5(
+            description,
+            foods,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    for statement in _MEAL_SEARCH_TRIGGERS:
+        await db.execute(statement)
+    if created:
+        await db.execute("""
+            INSERT INTO meal_search (rowid, description, foods)
+            SELECT me.id, me.description, COALESCE(
+                (SELECT group_concat(name, ' ') FROM meal_food_items WHERE meal_entry_id = me.id), '')
+            FROM meal_entries me
         """)
-        # Migration: add food_items_json column if missing
+
+
+async def _create_daily_nutrition(db: aiosqlite.Connection) -> None:
+    """Per-day nutrition totals, maintained by the meal write functions."""
+    created = not await table_exists(db, "daily_nutrition")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS daily_nutrition (
+            date TEXT PRIMARY KEY,
+            meal_count INTEGER NOT NULL,
+            total_calories REAL NOT NULL,
+            total_protein_g REAL NOT NULL,
+            total_carbs_g REAL NOT NULL,
+            total_fat_g REAL NOT NULL,
+            nutrients_json TEXT NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    if created:
+        await _rebuild_daily_nutrition(db)
+
+
+# Tables with integer sort keys: day (epoch day of `date`) and ts (Unix time of
+# the row's start or timestamp column). Range reads filter and sort on them.
+_SORT_KEY_SOURCES = {
+    "workouts": "start_time",
+    "mood_entries": "timestamp",
+    "sleep_sessions": "start_time",
+    "meal_entries": "timestamp",
+}
+
+
+async def _backfill_sort_keys(db: aiosqlite.Connection) -> None:
+    """Fill day/ts on rows that lack them, with the same values epoch_day/epoch_seconds give."""
+    for table, ts_column in _SORT_KEY_SOURCES.items():
+        await db.execute(
+            f"""UPDATE {table}
+                SET day = CAST(julianday(date) - 2440587.5 AS INTEGER),
+                    ts = CAST(strftime('%s', {ts_column}) AS INTEGER)
+                WHERE day IS NULL"""
+        )
+
+
+async def _add_sort_keys(db: aiosqlite.Connection) -> None:
+    for table in _SORT_KEY_SOURCES:
+        for column in ("day", "ts"):
+            if not await column_exists(db, table, column):
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_day_ts ON {table}(day, ts)")
+    await _backfill_sort_keys(db)
+
+
+async def _create_idempotency_keys(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            meal_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        )"""
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_meal ON idempotency_keys(meal_id)")
+
+
+async def _add_ts_indexes(db: aiosqlite.Connection) -> None:
+    # Range reads walk ts newest first; only meal_entries still reads by day
+    for table in _SORT_KEY_SOURCES:
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)")
+        if table != "meal_entries":
+            await db.execute(f"DROP INDEX IF EXISTS idx_{table}_day_ts")
+
+
+async def _create_change_events(db: aiosqlite.Connection) -> None:
+    # AUTOINCREMENT so ids are never reused after pruning; clients resume from them
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS change_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            tables TEXT NOT NULL,
+            dates TEXT NOT NULL
+        )"""
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_change_events_created ON change_events(created_at)")
+
+
+async def _create_widget_state(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS widget_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            date TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            body TEXT NOT NULL
+        )"""
+    )
+
+
+SCHEMA_MIGRATIONS = (
+    Migration(1, "base tables", _create_base_tables),
+    Migration(2, "meal_entries.food_items_json", _add_food_items_json),
+    Migration(3, "unique sleep sessions", _unique_sleep_sessions),
+    Migration(4, "nutrient dictionary", _create_nutrient_dictionary, _backfill_nutrient_dictionary),
+    Migration(5, "meal food items", _create_meal_food_items),
+    Migration(6, "meal full-text search", _create_meal_search),
+    Migration(7, "daily nutrition totals", _create_daily_nutrition),
+    Migration(8, "epoch day and timestamp sort keys", _add_sort_keys),
+    Migration(9, "analysis idempotency keys", _create_idempotency_keys),
+    Migration(10, "change events feed", _create_change_events),
+    Migration(11, "precomputed widget document", _create_widget_state),
+    Migration(12, "timestamp indexes for range reads", _add_ts_indexes),
+)
+
+
+# Spellings agents and clients use for the same unit
+_UNIT_ALIASES = {
+    "µg": "mcg",
+    "μg": "mcg",
+    "ug": "mcg",
+    "microgram": "mcg",
+    "micrograms": "mcg",
+    "milligram": "mg",
+    "milligrams": "mg",
+    "gram": "g",
+    "grams": "g",
+    "kilocalorie": "kcal",
+    "kilocalories": "kcal",
+    "kcals": "kcal",
+}
+
+
+def canonical_unit(unit: str) -> str:
+    """Normalize a nutrient unit spelling ("µg", "grams") to its short form."""
+    unit = (unit or "").strip()
+    return _UNIT_ALIASES.get(unit.lower(), unit)
+
+
+_NUTRIENT_INSERT = "INSERT INTO nutrients (name, unit) VALUES (?, ?) ON CONFLICT DO NOTHING"
+
+# Repeated nutrients within one meal are summed into a single row
+_MEAL_NUTRIENT_INSERT = """
+    INSERT INTO meal_nutrients (meal_entry_id, nutrient_id, amount)
+    SELECT ?, id, ? FROM nutrients WHERE name = ? AND unit = ?
+    ON CONFLICT(meal_entry_id, nutrient_id) DO UPDATE SET amount = amount + excluded.amount
+"""
+
+
+async def _insert_meal_nutrients(db: aiosqlite.Connection, meal_id: int, nutrients: list[dict]) -> None:
+    """Store a meal's nutrients, registering unseen name/unit pairs in the dictionary."""
+    rows = [(meal_id, n["amount"], n["name"].strip(), canonical_unit(n["unit"])) for n in nutrients]
+    await db.executemany(_NUTRIENT_INSERT, [row[2:] for row in rows])
+    await db.executemany(_MEAL_NUTRIENT_INSERT, rows)
+
+
+async def _backfill_meal_food_items(db: aiosqlite.Connection) -> None:
+    """Decode food_items_json (or the raw agent output) of existing meals into meal_food_items."""
+    cursor = await db.execute("SELECT id, food_items_json, analysis_json FROM meal_entries")
+    for meal_id, food_items_json, analysis_json in await cursor.fetchall():
         try:
-            await db.execute("ALTER TABLE meal_entries ADD COLUMN food_items_json TEXT")
-        except Exception:
-            pass  # column already exists
+            if food_items_json:
+                items = AGENT_FOOD_ITEMS.validate_json(food_items_json)
+            elif analysis_json:
+                items = parse_agent_output(analysis_json).food_items
+            else:
+                continue
+        except (ValueError, AgentOutputError):
+            continue  # unreadable legacy row; the meal keeps its totals
+        await _insert_food_items(db, meal_id, items)
+
+
+# Columns of meal_food_items copied from / to FoodItem fields
+_FOOD_ITEM_FIELDS = (
+    "name", "portion", "calories", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg",
+)
 
-        # Migration: deduplicate sleep_sessions and add unique constraint
+# FoodItem macro fields and the meal_nutrients rows they contribute to
+_FOOD_ITEM_NUTRIENTS = {
+    "calories": ("Energy", "kcal"),
+    "protein_g": ("Protein", "g"),
+    "carbs_g": ("Carbohydrates", "g"),
+    "fat_g": ("Fat Total", "g"),
+    "fiber_g": ("Fiber", "g"),
+    "sugar_g": ("Sugar", "g"),
+    "sodium_mg": ("Sodium", "mg"),
+}
+
+_FOOD_ITEM_NUTRIENT_INSERT = """
+    INSERT INTO meal_food_item_nutrients (food_item_id, nutrient_id, amount, daily_value_pct)
+    SELECT ?, id, ?, ? FROM nutrients WHERE name = ? AND unit = ?
+    ON CONFLICT(food_item_id, nutrient_id) DO UPDATE SET amount = amount + excluded.amount
+"""
+
+
+async def _insert_food_item_nutrients(db: aiosqlite.Connection, item_id: int, item: FoodItem) -> None:
+    rows = [
+        (item_id, n.amount, n.daily_value_pct, n.name.strip(), canonical_unit(n.unit))
+        for n in item.nutrients
+    ]
+    await db.executemany(_NUTRIENT_INSERT, [row[3:] for row in rows])
+    await db.executemany(_FOOD_ITEM_NUTRIENT_INSERT, rows)
+
+
+async def _insert_food_items(db: aiosqlite.Connection, meal_id: int, food_items: list[FoodItem]) -> list[int]:
+    """Store a meal's food items in order. Returns their ids."""
+    item_ids = []
+    for position, item in enumerate(food_items):
+        cursor = await db.execute(
+            f"""INSERT INTO meal_food_items (meal_entry_id, position, {", ".join(_FOOD_ITEM_FIELDS)})
+                VALUES (?, ?, {", ".join("?" * len(_FOOD_ITEM_FIELDS))})""",
+            (meal_id, position, *(getattr(item, f) for f in _FOOD_ITEM_FIELDS)),
+        )
+        item_ids.append(cursor.lastrowid)
+        if item.nutrients:
+            await _insert_food_item_nutrients(db, cursor.lastrowid, item)
+    return item_ids
+
+
+async def _item_nutrient_ids(db: aiosqlite.Connection, meal_id: int) -> set[int]:
+    """Nutrients reported by at least one food item of the meal."""
+    cursor = await db.execute(
+        """SELECT DISTINCT fn.nutrient_id
+           FROM meal_food_item_nutrients fn JOIN meal_food_items fi ON fi.id = fn.food_item_id
+           WHERE fi.meal_entry_id = ?""",
+        (meal_id,),
+    )
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def _recompute_meal_from_items(db: aiosqlite.Connection, meal_id: int, reported: set[int]) -> None:
+    """
+    Set a meal's totals and its macro nutrient rows to the sums over its food
+    items, and likewise every nutrient in `reported` or reported by an item
+    now. Item macro fields win over item nutrients of the same name; meal
+    nutrients no item has ever reported are left as stored.
+    """
+    await db.executemany(_NUTRIENT_INSERT, list(_FOOD_ITEM_NUTRIENTS.values()))
+    cursor = await db.execute(
+        f"""SELECT {", ".join(f"COALESCE(SUM({f}), 0)" for f in _FOOD_ITEM_NUTRIENTS)}
+            FROM meal_food_items WHERE meal_entry_id = ?""",
+        (meal_id,),
+    )
+    macros = dict(zip(_FOOD_ITEM_NUTRIENTS, await cursor.fetchone()))
+    cursor = await db.execute(
+        f"""SELECT id, name, unit FROM nutrients
+            WHERE (name, unit) IN (VALUES {", ".join(["(?, ?)"] * len(_FOOD_ITEM_NUTRIENTS))})""",
+        [v for pair in _FOOD_ITEM_NUTRIENTS.values() for v in pair],
+    )
+    field_for = {pair: f for f, pair in _FOOD_ITEM_NUTRIENTS.items()}
+    macro_ids = {row[0]: field_for[(row[1], row[2])] for row in await cursor.fetchall()}
+
+    cursor = await db.execute(
+        """SELECT fn.nutrient_id, SUM(fn.amount)
+           FROM meal_food_item_nutrients fn JOIN meal_food_items fi ON fi.id = fn.food_item_id
+           WHERE fi.meal_entry_id = ?
+           GROUP BY fn.nutrient_id""",
+        (meal_id,),
+    )
+    amounts = {nutrient_id: amount for nutrient_id, amount in await cursor.fetchall()}
+    amounts.update({nutrient_id: macros[f] for nutrient_id, f in macro_ids.items()})
+
+    recomputed = reported | amounts.keys()
+    await db.execute(
+        f"""DELETE FROM meal_nutrients
+            WHERE meal_entry_id = ? AND nutrient_id IN ({", ".join("?" * len(recomputed))})""",
+        (meal_id, *recomputed),
+    )
+    await db.executemany(
+        "INSERT INTO meal_nutrients (meal_entry_id, nutrient_id, amount) VALUES (?, ?, ?)",
+        [(meal_id, nutrient_id, amount) for nutrient_id, amount in amounts.items()],
+    )
+    await db.execute(
+        """UPDATE meal_entries
+           SET total_calories = ?, total_protein_g = ?, total_carbs_g = ?, total_fat_g = ?
+           WHERE id = ?""",
+        (macros["calories"], macros["protein_g"], macros["carbs_g"], macros["fat_g"], meal_id),
+    )
+
+
+async def _delete_food_items(db: aiosqlite.Connection, meal_id: int) -> None:
+    await db.execute(
+        """DELETE FROM meal_food_item_nutrients WHERE food_item_id IN
+           (SELECT id FROM meal_food_items WHERE meal_entry_id = ?)""",
+        (meal_id,),
+    )
+    await db.execute("DELETE FROM meal_food_items WHERE meal_entry_id = ?", (meal_id,))
+
+
+async def _load_food_items(db: aiosqlite.Connection, meal_ids_sql: str, params: tuple) -> dict[int, list[dict]]:
+    """
+    Load food items with their nutrients for the meals selected by the
+    `meal_ids_sql` subquery, keyed by meal id and in display order.
+    """
+    cursor = await db.execute(
+        f"""SELECT id, meal_entry_id, {", ".join(_FOOD_ITEM_FIELDS)}
+            FROM meal_food_items
+            WHERE meal_entry_id IN ({meal_ids_sql})
+            ORDER BY meal_entry_id, position""",
+        params,
+    )
+    by_meal: dict[int, list[dict]] = {}
+    by_item: dict[int, dict] = {}
+    for row in await cursor.fetchall():
+        item = {"item_id": row[0], **dict(zip(_FOOD_ITEM_FIELDS, row[2:])), "nutrients": []}
+        by_meal.setdefault(row[1], []).append(item)
+        by_item[row[0]] = item
+
+    cursor = await db.execute(
+        f"""SELECT fn.food_item_id, n.name, fn.amount, n.unit, fn.daily_value_pct
+            FROM meal_food_item_nutrients fn
+            JOIN nutrients n ON n.id = fn.nutrient_id
+            WHERE fn.food_item_id IN (
+                SELECT id FROM meal_food_items WHERE meal_entry_id IN ({meal_ids_sql})
+            )""",
+        params,
+    )
+    for item_id, name, amount, unit, daily_value_pct in await cursor.fetchall():
+        by_item[item_id]["nutrients"].append(
+            {"name": name, "amount": amount, "unit": unit, "daily_value_pct": daily_value_pct}
+        )
+    return by_meal
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_day(day: str) -> int:
+    """Days since 1970-01-01 of a YYYY-MM-DD date: the `day` sort key."""
+    return (datetime.fromisoformat(day[:10]) - _EPOCH).days
+
+
+def epoch_seconds(moment: datetime | str) -> int | None:
+    """
+    Unix time of a timestamp: the `ts` sort key. Naive times count as UTC,
+    as in SQLite; unparseable text gives None.
+    """
+    if isinstance(moment, str):
         try:
-            await db.execute("""
-                DELETE FROM sleep_sessions WHERE id NOT IN (
-                    SELECT MIN(id) FROM sleep_sessions GROUP BY date, start_time
-                )
-            """)
-            await db.execute(
-                "CREATE UNIQUE INDEX IF NOT EXISTS idx_sleep_unique ON sleep_sessions(date, start_time)"
-            )
-        except Exception:
-            pass  # already migrated
+            moment = datetime.fromisoformat(moment)
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
 
-        await db.commit()
+
+def _since_day(days: int) -> int:
+    """The `day` key N days before today (UTC), like date('now', '-N days')."""
+    return (datetime.now(timezone.utc).replace(tzinfo=None) - _EPOCH).days - days
 
 
-async def store_sync(payload: HealthSyncPayload) -> int:
-    """Store a sync payload and update derived tables. Returns sync_log id."""
-    async with aiosqlite.connect(DB_PATH) as db:
+# Sort keys are internal; API rows keep the original column set
+_SORT_KEYS = ("day", "ts")
+
+
+def _api_row(row: aiosqlite.Row) -> dict:
+    data = dict(row)
+    for key in _SORT_KEYS:
+        data.pop(key, None)
+    return data
+
+
+@timed_query
+async def store_sync(payload: HealthSyncPayload, raw: bytes | str | None = None) -> int:
+    """
+    Store a sync payload and update derived tables. Returns sync_log id.
+    `raw` is the JSON the payload was validated from, logged as received;
+    without it the payload is serialized.
+    """
+    async with connect() as db:
         # Store raw payload
         cursor = await db.execute(
             "INSERT INTO sync_log (device_id, synced_at, period_from, period_to, payload_json) VALUES (?, ?, ?, ?, ?)",
@@ -156,7 +870,7 @@ async def store_sync(payload: HealthSyncPayload) -> int:
                 payload.synced_at.isoformat(),
                 payload.period_from.isoformat(),
                 payload.period_to.isoformat(),
-                payload.model_dump_json(),
+                raw.decode() if isinstance(raw, bytes) else raw or payload.model_dump_json(),
             ),
         )
         sync_id = cursor.lastrowid
@@ -265,19 +979,22 @@ async def store_sync(payload: HealthSyncPayload) -> int:
             w_date = w.start.strftime("%Y-%m-%d")
             await db.execute(
                 """INSERT INTO workouts (date, workout_type, start_time, end_time, duration_min,
-                   distance_km, active_calories, avg_hr, max_hr, elevation_gain_m)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                   distance_km, active_calories, avg_hr, max_hr, elevation_gain_m, day, ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                 (w_date, w.workout_type, w.start.isoformat(), w.end.isoformat(),
-                 w.duration_min, w.distance_km, w.active_calories, w.avg_hr, w.max_hr, w.elevation_gain_m),
+                 w.duration_min, w.distance_km, w.active_calories, w.avg_hr, w.max_hr, w.elevation_gain_m,
+                 epoch_day(w_date), epoch_seconds(w.start)),
             )
 
         # Store mood entries
         for m in payload.mood:
             m_date = m.timestamp.strftime("%Y-%m-%d")
             await db.execute(
-                "INSERT INTO mood_entries (date, kind, timestamp, valence, labels, associations) VALUES (?, ?, ?, ?, ?, ?)",
+                """INSERT INTO mood_entries (date, kind, timestamp, valence, labels, associations, day, ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
                 (m_date, m.kind, m.timestamp.isoformat(), m.valence,
-                 json.dumps(m.labels), json.dumps(m.associations)),
+                 json.dumps(m.labels), json.dumps(m.associations),
+                 epoch_day(m_date), epoch_seconds(m.timestamp)),
             )
 
         # Store sleep sessions (deduplicate by date + start_time)
@@ -287,23 +1004,35 @@ async def store_sync(payload: HealthSyncPayload) -> int:
             s_date = s.end.strftime("%Y-%m-%d")
             await db.execute(
                 """INSERT INTO sleep_sessions (date, start_time, end_time, total_duration_min,
-                   in_bed_duration_min, stages_json) VALUES (?, ?, ?, ?, ?, ?)
+                   in_bed_duration_min, stages_json, day, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                    ON CONFLICT(date, start_time) DO UPDATE SET
                      end_time = excluded.end_time,
                      total_duration_min = excluded.total_duration_min,
                      in_bed_duration_min = excluded.in_bed_duration_min,
                      stages_json = excluded.stages_json""",
                 (s_date, s.start.isoformat(), s.end.isoformat(), s.total_duration_min,
-                 s.in_bed_duration_min, json.dumps([st.model_dump(mode="json") for st in s.stages])),
+                 s.in_bed_duration_min, json.dumps([st.model_dump(mode="json") for st in s.stages]),
+                 epoch_day(s_date), epoch_seconds(s.start)),
             )
 
-        await db.commit()
+        tables = {"daily_summary"}
+        dates = {date_str}
+        for table, records, day_of in (
+            ("workouts", payload.workouts, lambda w: w.start),
+            ("mood_entries", payload.mood, lambda m: m.timestamp),
+            ("sleep_sessions", payload.sleep, lambda s: s.end),
+        ):
+            if records:
+                tables.add(table)
+                dates.update(day_of(r).strftime("%Y-%m-%d") for r in records)
+        await _commit_change(db, "sync", tables, dates)
         return sync_id
 
 
+@timed_query
 async def get_daily_summaries(days: int = 7) -> list[dict]:
     """Get the last N days of daily summaries."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM daily_summary ORDER BY date DESC LIMIT ?", (days,)
@@ -312,50 +1041,230 @@ async def get_daily_summaries(days: int = 7) -> list[dict]:
         return [dict(row) for row in rows]
 
 
+@timed_query
 async def get_latest_summary() -> dict | None:
     """Get the most recent daily summary."""
     rows = await get_daily_summaries(1)
     return rows[0] if rows else None
 
 
+# Range reads over the last N days, newest first. Each walks the (ts) index of
+# its table from the lower bound, so neither a table scan nor a sort is needed;
+# `day` then applies the exact calendar-date cut (see _since_params).
+_WORKOUTS_SINCE = "SELECT * FROM workouts WHERE ts >= ? AND day >= ? ORDER BY ts DESC"
+_MOOD_SINCE = "SELECT * FROM mood_entries WHERE ts >= ? AND day >= ? ORDER BY ts DESC"
+_SLEEP_SINCE = "SELECT * FROM sleep_sessions WHERE ts >= ? AND day >= ? ORDER BY ts DESC"
+_MEALS_SINCE = """
+    SELECT id, date, timestamp, description, total_calories,
+           total_protein_g, total_carbs_g, total_fat_g
+    FROM meal_entries
+    WHERE ts >= ? AND day >= ?
+    ORDER BY ts DESC
+"""
+_MEAL_IDS_SINCE = "SELECT id FROM meal_entries WHERE day >= ?"
+
+# `date` is the device's local date (for sleep, of the end), so a row on the
+# first day may start up to a timezone offset plus a night's sleep earlier
+_TS_SLACK_SECONDS = 2 * 86400
+
+
+def _since_params(days: int) -> tuple[int, int]:
+    """(ts, day) lower bounds for the *_SINCE reads of the last N days."""
+    since = _since_day(days)
+    return since * 86400 - _TS_SLACK_SECONDS, since
+
+
+# Checked by `manage.py check-plans`
+RANGE_QUERIES = {
+    "get_workouts": _WORKOUTS_SINCE,
+    "get_mood_entries": _MOOD_SINCE,
+    "get_sleep_sessions": _SLEEP_SINCE,
+    "get_meal_history": _MEALS_SINCE,
+    "get_meal_history (food items)": _MEAL_IDS_SINCE,
+}
+
+
+@timed_query
 async def get_workouts(days: int = 7) -> list[dict]:
     """Get workouts from the last N days."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM workouts WHERE date >= date('now', ?) ORDER BY start_time DESC",
-            (f"-{days} days",),
-        )
+        cursor = await db.execute(_WORKOUTS_SINCE, _since_params(days))
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        return [_api_row(row) for row in rows]
 
 
+@timed_query
 async def get_mood_entries(days: int = 7) -> list[dict]:
     """Get mood entries from the last N days."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM mood_entries WHERE date >= date('now', ?) ORDER BY timestamp DESC",
-            (f"-{days} days",),
-        )
+        cursor = await db.execute(_MOOD_SINCE, _since_params(days))
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        return [_api_row(row) for row in rows]
 
 
+@timed_query
 async def get_sleep_sessions(days: int = 7) -> list[dict]:
     """Get sleep sessions from the last N days."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
+        cursor = await db.execute(_SLEEP_SINCE, _since_params(days))
+        rows = await cursor.fetchall()
+        return [_api_row(row) for row in rows]
+
+
+# ── Change feed ──────────────────────────────────────────────────────
+
+async def _commit_change(db: aiosqlite.Connection, kind: str, tables: set[str], dates: set[str]) -> None:
+    """
+    Record a change event with the write in progress, rebuild the widget
+    document if the write touched today, commit, and wake the tenant's
+    /api/events streams. An empty `dates` means any date.
+    """
+    today = date_type.today().isoformat()
+    widget = await _store_widget(db, today) if not dates or today in dates else None
+    now = int(time.time())
+    await db.execute(
+        "DELETE FROM change_events WHERE created_at < ?", (int(now - EVENTS_RETENTION_HOURS * 3600),)
+    )
+    await db.execute(
+        "INSERT INTO change_events (created_at, kind, tables, dates) VALUES (?, ?, ?, ?)",
+        (now, kind, json.dumps(sorted(tables)), json.dumps(sorted(dates))),
+    )
+    await db.commit()
+    if widget is not None:
+        WIDGETS.put(active_tenant(), widget)
+    CHANGES.notify(active_tenant())
+
+
+@timed_query
+async def change_event_bounds() -> tuple[int | None, int]:
+    """(oldest kept event id or None, last event id ever recorded or 0)."""
+    async with connect(read_only=True) as db:
         cursor = await db.execute(
-            "SELECT * FROM sleep_sessions WHERE date >= date('now', ?) ORDER BY start_time DESC",
-            (f"-{days} days",),
+            """SELECT (SELECT min(id) FROM change_events),
+                      (SELECT seq FROM sqlite_sequence WHERE name = 'change_events')"""
         )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        oldest, latest = await cursor.fetchone()
+        return oldest, latest or 0
+
+
+@timed_query
+async def get_change_events(after_id: int, limit: int = 500) -> list[dict]:
+    """Change events with ids above `after_id`, oldest first."""
+    async with connect(read_only=True) as db:
+        cursor = await db.execute(
+            "SELECT id, created_at, kind, tables, dates FROM change_events WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        )
+        return [
+            {
+                "id": event_id,
+                "at": datetime.fromtimestamp(created_at, timezone.utc).isoformat(),
+                "kind": kind,
+                "tables": json.loads(tables),
+                "dates": json.loads(dates),
+            }
+            for event_id, created_at, kind, tables, dates in await cursor.fetchall()
+        ]
+
+
+# ── Widget ───────────────────────────────────────────────────────────
+
+async def _store_widget(db: aiosqlite.Connection, day: str) -> WidgetDocument:
+    """Build the widget document for `day` and store it in the caller's transaction."""
+    cursor = await db.execute(
+        """SELECT steps, active_calories, exercise_minutes, body_battery, sleep_duration_min
+           FROM daily_summary WHERE date = ?""",
+        (day,),
+    )
+    steps, active_calories, exercise_min, body_battery, sleep_min = await cursor.fetchone() or (None,) * 5
+    cursor = await db.execute(
+        """SELECT meal_count, total_calories, total_protein_g, total_carbs_g, total_fat_g
+           FROM daily_nutrition WHERE date = ?""",
+        (day,),
+    )
+    meals, calories, protein_g, carbs_g, fat_g = await cursor.fetchone() or (0, 0, 0, 0, 0)
+
+    def r(value: float | None) -> float | None:
+        return None if value is None else round(value, 1)
+
+    body = json.dumps({
+        "date": day,
+        "steps": steps,
+        "active_calories": r(active_calories),
+        "exercise_min": r(exercise_min),
+        "body_battery": body_battery,
+        "sleep_min": r(sleep_min),
+        "meals": meals,
+        "calories": r(calories),
+        "protein_g": r(protein_g),
+        "carbs_g": r(carbs_g),
+        "fat_g": r(fat_g),
+    }, separators=(",", ":")).encode()
+    doc = WidgetDocument.from_body(day, body)
+    await db.execute(
+        """INSERT INTO widget_state (id, date, etag, body) VALUES (1, ?, ?, ?)
+           ON CONFLICT(id) DO UPDATE SET date = excluded.date, etag = excluded.etag, body = excluded.body""",
+        (doc.date, doc.etag, body.decode()),
+    )
+    return doc
+
+
+@timed_query
+async def get_widget(day: str) -> WidgetDocument:
+    """
+    The stored widget document, rebuilt first if it is for another day.
+    Also refreshes the in-memory copy; that happens under the connection
+    lock, so it cannot overwrite a newer document from a write.
+    """
+    async with connect() as db:
+        cursor = await db.execute("SELECT date, etag, body FROM widget_state WHERE id = 1")
+        row = await cursor.fetchone()
+        if row is not None and row[0] == day:
+            doc = WidgetDocument(row[0], row[1], row[2].encode())
+        else:
+            doc = await _store_widget(db, day)
+            await db.commit()
+        WIDGETS.put(active_tenant(), doc)
+        return doc
 
 
 # ── Nutrition ────────────────────────────────────────────────────────
 
+# Tables a meal change touches, as announced on the change feed
+_MEAL_TABLES = {"meal_entries", "daily_nutrition"}
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different analysis request."""
+
+
+def _idempotency_cutoff() -> int:
+    return int(time.time() - IDEMPOTENCY_KEY_TTL_HOURS * 3600)
+
+
+@timed_query
+async def get_idempotent_meal(key: str, fingerprint: str) -> int | None:
+    """
+    Meal id stored under an unexpired idempotency key, or None. Raises
+    IdempotencyConflict if the key was used for a different request.
+    """
+    async with connect(read_only=True) as db:
+        cursor = await db.execute(
+            "SELECT fingerprint, meal_id FROM idempotency_keys WHERE key = ? AND created_at >= ?",
+            (key, _idempotency_cutoff()),
+        )
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    if row[0] != fingerprint:
+        raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+    return row[1]
+
+
+@timed_query
 async def store_meal_entry(
     date: str,
     timestamp: str,
@@ -367,32 +1276,45 @@ async def store_meal_entry(
     total_fat_g: float | None,
     nutrients: list[dict],
     image_path: str | None = None,
-    food_items_json: str | None = None,
-) -> int:
-    """Store a meal entry and its nutrients. Returns the meal entry id."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    food_items: list[FoodItem] | None = None,
+    idempotency_key: str | None = None,
+    fingerprint: str = "",
+) -> tuple[int, list[int]]:
+    """
+    Store a meal entry with its nutrients and food items. Returns the meal
+    entry id and the food items' ids, in order. With `idempotency_key`, the
+    key is recorded for the meal in the same transaction; IdempotencyConflict
+    if it is already taken.
+    """
+    async with connect() as db:
         cursor = await db.execute(
             """INSERT INTO meal_entries
                (date, timestamp, description, image_path, analysis_json,
-                total_calories, total_protein_g, total_carbs_g, total_fat_g,
-                food_items_json)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                total_calories, total_protein_g, total_carbs_g, total_fat_g, day, ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (date, timestamp, description, image_path, analysis_json,
              total_calories, total_protein_g, total_carbs_g, total_fat_g,
-             food_items_json),
+             epoch_day(date), epoch_seconds(timestamp)),
         )
         meal_id = cursor.lastrowid
 
-        for n in nutrients:
-            await db.execute(
-                "INSERT INTO meal_nutrients (meal_entry_id, nutrient_name, amount, unit) VALUES (?, ?, ?, ?)",
-                (meal_id, n["name"], n["amount"], n["unit"]),
-            )
-
-        await db.commit()
-        return meal_id
+        await _insert_meal_nutrients(db, meal_id, nutrients)
+        item_ids = await _insert_food_items(db, meal_id, food_items or [])
+        await _refresh_daily_nutrition(db, date)
+        if idempotency_key:
+            await db.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (_idempotency_cutoff(),))
+            try:
+                await db.execute(
+                    "INSERT INTO idempotency_keys (key, fingerprint, meal_id, created_at) VALUES (?, ?, ?, ?)",
+                    (idempotency_key, fingerprint, meal_id, int(time.time())),
+                )
+            except sqlite3.IntegrityError:
+                raise IdempotencyConflict("Idempotency-Key was already used for another meal") from None
+        await _commit_change(db, "meal_created", _MEAL_TABLES, {date})
+        return meal_id, item_ids
 
 
+@timed_query
 async def update_meal_entry(
     meal_id: int,
     description: str | None,
@@ -400,52 +1322,59 @@ async def update_meal_entry(
     total_protein_g: float,
     total_carbs_g: float,
     total_fat_g: float,
-    food_items_json: str | None = None,
+    food_items: list[FoodItem] | None = None,
     nutrients: list[dict] | None = None,
 ) -> bool:
-    """Update a meal entry's totals and optionally its food items/nutrients."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id FROM meal_entries WHERE id = ?", (meal_id,))
-        if not await cursor.fetchone():
+    """Update a meal entry's totals and optionally replace its food items/nutrients."""
+    async with connect() as db:
+        cursor = await db.execute("SELECT date FROM meal_entries WHERE id = ?", (meal_id,))
+        row = await cursor.fetchone()
+        if not row:
             return False
 
         await db.execute(
             """UPDATE meal_entries
                SET total_calories = ?, total_protein_g = ?, total_carbs_g = ?, total_fat_g = ?,
-                   description = COALESCE(?, description),
-                   food_items_json = COALESCE(?, food_items_json)
+                   description = COALESCE(?, description)
                WHERE id = ?""",
             (total_calories, total_protein_g, total_carbs_g, total_fat_g,
-             description, food_items_json, meal_id),
+             description, meal_id),
         )
 
+        if food_items is not None:
+            await _delete_food_items(db, meal_id)
+            await _insert_food_items(db, meal_id, food_items)
+
         if nutrients is not None:
             await db.execute("DELETE FROM meal_nutrients WHERE meal_entry_id = ?", (meal_id,))
-            for n in nutrients:
-                await db.execute(
-                    "INSERT INTO meal_nutrients (meal_entry_id, nutrient_name, amount, unit) VALUES (?, ?, ?, ?)",
-                    (meal_id, n["name"], n["amount"], n["unit"]),
-                )
+            await _insert_meal_nutrients(db, meal_id, nutrients)
 
-        await db.commit()
+        await _refresh_daily_nutrition(db, row[0])
+        await _commit_change(db, "meal_updated", _MEAL_TABLES, {row[0]})
         return True
 
 
+@timed_query
 async def delete_meal_entry(meal_id: int) -> bool:
     """Delete a meal entry and its nutrients."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id FROM meal_entries WHERE id = ?", (meal_id,))
-        if not await cursor.fetchone():
+    async with connect() as db:
+        cursor = await db.execute("SELECT date FROM meal_entries WHERE id = ?", (meal_id,))
+        row = await cursor.fetchone()
+        if not row:
             return False
         await db.execute("DELETE FROM meal_nutrients WHERE meal_entry_id = ?", (meal_id,))
+        await _delete_food_items(db, meal_id)
+        await db.execute("DELETE FROM idempotency_keys WHERE meal_id = ?", (meal_id,))
         await db.execute("DELETE FROM meal_entries WHERE id = ?", (meal_id,))
-        await db.commit()
+        await _refresh_daily_nutrition(db, row[0])
+        await _commit_change(db, "meal_deleted", _MEAL_TABLES, {row[0]})
         return True
 
 
+@timed_query
 async def get_meal_entry(meal_id: int) -> dict | None:
     """Get a single meal entry with its nutrients."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM meal_entries WHERE id = ?", (meal_id,)
@@ -453,54 +1382,103 @@ async def get_meal_entry(meal_id: int) -> dict | None:
         row = await cursor.fetchone()
         if not row:
             return None
-        meal = dict(row)
+        meal = _api_row(row)
 
         cursor2 = await db.execute(
-            "SELECT nutrient_name, amount, unit FROM meal_nutrients WHERE meal_entry_id = ?",
+            """SELECT n.name AS nutrient_name, mn.amount, n.unit
+               FROM meal_nutrients mn JOIN nutrients n ON n.id = mn.nutrient_id
+               WHERE mn.meal_entry_id = ?""",
             (meal_id,),
         )
         nutrients = await cursor2.fetchall()
         meal["nutrients"] = [dict(n) for n in nutrients]
+        meal["food_items"] = (await _load_food_items(db, "?", (meal_id,))).get(meal_id, [])
         return meal
 
 
-async def get_meal_history(days: int = 7) -> list[dict]:
-    """Get meal entries shaped as NutritionAnalysisResult for iOS."""
-    async with aiosqlite.connect(DB_PATH) as db:
+@timed_query
+async def update_meal_food_item(meal_id: int, item_id: int, item: FoodItem) -> bool:
+    """
+    Replace one food item of a meal. The meal's totals and the nutrients its
+    items report are recomputed from the items in the same transaction.
+    """
+    async with connect() as db:
+        cursor = await db.execute(
+            """SELECT me.date FROM meal_food_items fi JOIN meal_entries me ON me.id = fi.meal_entry_id
+               WHERE fi.id = ? AND fi.meal_entry_id = ?""",
+            (item_id, meal_id),
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return False
+        date = row[0]
+        reported = await _item_nutrient_ids(db, meal_id)
+
+        await db.execute(
+            f"""UPDATE meal_food_items SET {", ".join(f + " = ?" for f in _FOOD_ITEM_FIELDS)}
+                WHERE id = ?""",
+            (*(getattr(item, f) for f in _FOOD_ITEM_FIELDS), item_id),
+        )
+        await db.execute("DELETE FROM meal_food_item_nutrients WHERE food_item_id = ?", (item_id,))
+        await _insert_food_item_nutrients(db, item_id, item)
+        await _recompute_meal_from_items(db, meal_id, reported)
+
+        await _refresh_daily_nutrition(db, date)
+        await _commit_change(db, "meal_updated", _MEAL_TABLES, {date})
+        return True
+
+
+@timed_query
+async def get_food_aggregates(days: int = 30, query: str | None = None, limit: int = 50) -> list[dict]:
+    """Totals per food name over the last N days, largest calorie share first."""
+    where = "WHERE me.day >= ?"
+    params: list = [_since_day(days)]
+    if query:
+        where += " AND fi.name LIKE ? ESCAPE '\\'"
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{escaped}%")
+    async with connect(read_only=True) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
-            """SELECT id, date, timestamp, description, total_calories,
-                      total_protein_g, total_carbs_g, total_fat_g,
-                      food_items_json, analysis_json
-               FROM meal_entries
-               WHERE date >= date('now', ?)
-               ORDER BY timestamp DESC""",
-            (f"-{days} days",),
+            f"""SELECT fi.name AS name,
+                       COUNT(*) AS item_count,
+                       COUNT(DISTINCT fi.meal_entry_id) AS meal_count,
+                       SUM(fi.calories) AS total_calories,
+                       SUM(fi.protein_g) AS total_protein_g,
+                       SUM(fi.carbs_g) AS total_carbs_g,
+                       SUM(fi.fat_g) AS total_fat_g,
+                       SUM(fi.fiber_g) AS total_fiber_g,
+                       SUM(fi.sugar_g) AS total_sugar_g,
+                       SUM(fi.sodium_mg) AS total_sodium_mg,
+                       MAX(me.date) AS last_eaten
+                FROM meal_food_items fi
+                JOIN meal_entries me ON me.id = fi.meal_entry_id
+                {where}
+                GROUP BY fi.name COLLATE NOCASE
+                ORDER BY total_calories DESC
+                LIMIT ?""",
+            (*params, limit),
         )
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+@timed_query
+async def get_meal_history(days: int = 7) -> list[dict]:
+    """Get meal entries shaped as NutritionAnalysisResult for iOS."""
+    async with connect(read_only=True) as db:
+        db.row_factory = aiosqlite.Row
+        ts_since, since = _since_params(days)
+        cursor = await db.execute(_MEALS_SINCE, (ts_since, since))
         rows = await cursor.fetchall()
+        food_items = await _load_food_items(db, _MEAL_IDS_SINCE, (since,))
 
         results = []
-        for row in rows:
-            r = dict(row)
-            # Parse food items from stored JSON or fall back to analysis_json
-            food_items = []
-            if r.get("food_items_json"):
-                try:
-                    food_items = json.loads(r["food_items_json"])
-                except (json.JSONDecodeError, TypeError):
-                    pass
-            elif r.get("analysis_json"):
-                try:
-                    analysis = json.loads(r["analysis_json"])
-                    food_items = analysis.get("food_items", [])
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
+        for r in rows:
             results.append({
                 "meal_id": r["id"],
                 "timestamp": r["timestamp"],
                 "description": r["description"],
-                "food_items": food_items,
+                "food_items": food_items.get(r["id"], []),
                 "totals": {
                     "calories": r["total_calories"] or 0,
                     "protein_g": r["total_protein_g"] or 0,
@@ -512,34 +1490,246 @@ async def get_meal_history(days: int = 7) -> list[dict]:
         return results
 
 
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+@timed_query
+async def search_meals(text: str, limit: int = 20, offset: int = 0) -> tuple[int, list[dict]]:
+    """
+    Full-text search over meal descriptions and food item names, best match
+    first. Returns the total number of matches and the requested page.
+    """
+    query = _fts_query(text)
+    if not query:
+        return 0, []
+    async with connect(read_only=True) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("SELECT COUNT(*) FROM meal_search WHERE meal_search MATCH ?", (query,))
+        total = (await cursor.fetchone())[0]
+        cursor = await db.execute(
+            """SELECT me.id AS meal_id, me.date, me.timestamp, me.description,
+                      s.foods, me.total_calories, me.total_protein_g,
+                      me.total_carbs_g, me.total_fat_g,
+                      snippet(meal_search, -1, '[', ']', '…', 12) AS snippet
+               FROM meal_search s
+               JOIN meal_entries me ON me.id = s.rowid
+               WHERE meal_search MATCH ?
+               ORDER BY s.rank, me.id DESC
+               LIMIT ? OFFSET ?""",
+            (query, limit, offset),
+        )
+        return total, [dict(row) for row in await cursor.fetchall()]
+
+
+@timed_query
 async def get_daily_nutrition_summary(date: str) -> dict:
     """Get aggregated nutrition totals for a specific date."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with connect(read_only=True) as db:
         cursor = await db.execute(
-            """SELECT
-                 COUNT(*) AS meal_count,
-                 COALESCE(SUM(total_calories), 0) AS total_calories,
-                 COALESCE(SUM(total_protein_g), 0) AS total_protein_g,
-                 COALESCE(SUM(total_carbs_g), 0) AS total_carbs_g,
-                 COALESCE(SUM(total_fat_g), 0) AS total_fat_g
-               FROM meal_entries
-               WHERE date = ?""",
+            """SELECT meal_count, total_calories, total_protein_g, total_carbs_g,
+                      total_fat_g, nutrients_json
+               FROM daily_nutrition WHERE date = ?""",
             (date,),
         )
         row = await cursor.fetchone()
-        summary = dict(row) if row else {}
+        if not row:
+            return {
+                "meal_count": 0,
+                "total_calories": 0,
+                "total_protein_g": 0,
+                "total_carbs_g": 0,
+                "total_fat_g": 0,
+                "nutrients": [],
+                "date": date,
+            }
+        return {
+            "meal_count": row[0],
+            "total_calories": row[1],
+            "total_protein_g": row[2],
+            "total_carbs_g": row[3],
+            "total_fat_g": row[4],
+            "nutrients": json.loads(row[5]),
+            "date": date,
+        }
 
-        # Also get per-nutrient totals
-        cursor2 = await db.execute(
-            """SELECT mn.nutrient_name, SUM(mn.amount) AS total_amount, mn.unit
-               FROM meal_nutrients mn
-               JOIN meal_entries me ON mn.meal_entry_id = me.id
-               WHERE me.date = ?
-               GROUP BY mn.nutrient_name, mn.unit""",
-            (date,),
+
+# Tables restore_rows() fills; derived tables are rebuilt from them
+RESTORE_TABLES = ("sync_log", "daily_summary", "workouts", "mood_entries", "sleep_sessions", "meal_entries")
+
+
+class DatabaseNotEmpty(ValueError):
+    """A restore was attempted into a database that already holds data."""
+
+
+@timed_query
+async def restore_rows(records: AsyncIterator[tuple[str, dict]], batch_size: int = 500) -> dict[str, int]:
+    """
+    Insert backed-up rows (table, {column: value}) into the current tenant's
+    database, keeping their ids, in a single transaction. Meal rows may carry
+    "nutrients" and "food_items" lists. Raises ValueError if the database
+    names an unknown table or column, DatabaseNotEmpty if there is data already.
+    """
+    async with connect() as db:
+        columns: dict[str, set[str]] = {}
+        for table in RESTORE_TABLES:
+            cursor = await db.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+            if (await cursor.fetchone())[0]:
+                raise DatabaseNotEmpty(f"Refusing to restore into a database that already has {table} rows")
+            cursor = await db.execute("SELECT name FROM pragma_table_info(?)", (table,))
+            columns[table] = {r[0] for r in await cursor.fetchall()}
+
+        counts = dict.fromkeys(RESTORE_TABLES, 0)
+        pending: list[tuple] = []
+        pending_sql = None
+
+        async def flush() -> None:
+            nonlocal pending_sql
+            if pending:
+                await db.executemany(pending_sql, pending)
+                pending.clear()
+            pending_sql = None
+
+        async for table, row in records:
+            if table not in columns:
+                raise ValueError(f"Unknown table {table}")
+            nutrients = row.pop("nutrients", None) if table == "meal_entries" else None
+            food_items = row.pop("food_items", None) if table == "meal_entries" else None
+            unknown = set(row) - columns[table]
+            if unknown:
+                raise ValueError(f"Unknown {table} column(s): {', '.join(sorted(unknown))}")
+
+            sql = f"INSERT INTO {table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})"
+            if table == "meal_entries":
+                await flush()
+                await db.execute(sql, tuple(row.values()))
+                await _insert_meal_nutrients(db, row["id"], nutrients or [])
+                await _insert_food_items(db, row["id"], [FoodItem.model_validate(i) for i in food_items or []])
+            else:
+                if sql != pending_sql or len(pending) >= batch_size:
+                    await flush()
+                    pending_sql = sql
+                pending.append(tuple(row.values()))
+            counts[table] += 1
+
+        await flush()
+        await _backfill_sort_keys(db)
+        await _rebuild_daily_nutrition(db)
+        await _commit_change(db, "restore", {t for t, n in counts.items() if n}, set())
+        return counts
+
+
+async def explain_range_queries() -> dict[str, list[str]]:
+    """EXPLAIN QUERY PLAN of each RANGE_QUERIES statement on the current tenant's database."""
+    plans = {}
+    async with connect(read_only=True) as db:
+        for name, sql in RANGE_QUERIES.items():
+            cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", (0,) * sql.count("?"))
+            plans[name] = plan_lines(await cursor.fetchall())
+    return plans
+
+
+@timed_query
+async def get_nutrition_summary_range(date_from: str, date_to: str, bucket: str = "day") -> list[dict]:
+    """
+    Aggregate meals between two dates (inclusive) into day or ISO week
+    (Monday start) buckets. Reads the daily_nutrition rows of the range in
+    one pass and sums them into buckets here. Empty buckets are omitted.
+    """
+    async with connect(read_only=True) as db:
+        cursor = await db.execute(
+            """SELECT date, meal_count, total_calories, total_protein_g, total_carbs_g,
+                      total_fat_g, nutrients_json
+               FROM daily_nutrition WHERE date BETWEEN ? AND ? ORDER BY date""",
+            (date_from, date_to),
         )
-        nutrient_rows = await cursor2.fetchall()
-        summary["nutrients"] = [dict(n) for n in nutrient_rows]
-        summary["date"] = date
-        return summary
+        rows = await cursor.fetchall()
+
+    buckets: dict[str, dict] = {}
+    nutrients: dict[str, dict[tuple[str, str], float]] = {}
+    for day, meal_count, calories, protein, carbs, fat, nutrients_json in rows:
+        start = day
+        if bucket == "week":
+            d = date_type.fromisoformat(day)
+            start = date_type.fromordinal(d.toordinal() - d.weekday()).isoformat()
+        entry = buckets.get(start)
+        if entry is None:
+            entry = buckets[start] = {
+                "start": start, "meal_count": 0, "total_calories": 0, "total_protein_g": 0,
+                "total_carbs_g": 0, "total_fat_g": 0,
+            }
+            nutrients[start] = {}
+        entry["meal_count"] += meal_count
+        entry["total_calories"] += calories
+        entry["total_protein_g"] += protein
+        entry["total_carbs_g"] += carbs
+        entry["total_fat_g"] += fat
+        totals = nutrients[start]
+        for n in json.loads(nutrients_json):
+            key = (n["nutrient_name"], n["unit"])
+            totals[key] = totals.get(key, 0) + n["total_amount"]
+
+    return [
+        {
+            **entry,
+            "nutrients": [
+                {"nutrient_name": name, "total_amount": amount, "unit": unit}
+                for (name, unit), amount in nutrients[start].items()
+            ],
+        }
+        for start, entry in buckets.items()
+    ]
+
+
+# Aggregates meals (and their per-nutrient totals) into daily_nutrition rows
+_DAILY_NUTRITION_INSERT = """
+    INSERT INTO daily_nutrition (
+        date, meal_count, total_calories, total_protein_g, total_carbs_g,
+        total_fat_g, nutrients_json, updated_at
+    )
+    SELECT
+        me.date,
+        COUNT(*),
+        COALESCE(SUM(me.total_calories), 0),
+        COALESCE(SUM(me.total_protein_g), 0),
+        COALESCE(SUM(me.total_carbs_g), 0),
+        COALESCE(SUM(me.total_fat_g), 0),
+        (SELECT COALESCE(json_group_array(json_object(
+                    'nutrient_name', n.nutrient_name,
+                    'total_amount', n.total_amount,
+                    'unit', n.unit)), '[]')
+         FROM (SELECT nd.name AS nutrient_name, t.total_amount, nd.unit
+               FROM (SELECT mn.nutrient_id, SUM(mn.amount) AS total_amount
+                     FROM meal_nutrients mn
+                     JOIN meal_entries m2 ON mn.meal_entry_id = m2.id
+                     WHERE m2.date = me.date
+                     GROUP BY mn.nutrient_id) t
+               JOIN nutrients nd ON nd.id = t.nutrient_id
+               ORDER BY nd.id) n),
+        datetime('now')
+    FROM meal_entries me
+    {where}
+    GROUP BY me.date
+"""
+
+
+async def _refresh_daily_nutrition(db: aiosqlite.Connection, date: str) -> None:
+    """Recompute one day's daily_nutrition row inside the caller's transaction."""
+    await db.execute("DELETE FROM daily_nutrition WHERE date = ?", (date,))
+    await db.execute(_DAILY_NUTRITION_INSERT.format(where="WHERE me.date = ?"), (date,))
+
+
+async def _rebuild_daily_nutrition(db: aiosqlite.Connection) -> None:
+    await db.execute("DELETE FROM daily_nutrition")
+    await db.execute(_DAILY_NUTRITION_INSERT.format(where=""))
+
+
+@timed_query
+async def rebuild_daily_nutrition() -> int:
+    """Recompute daily_nutrition from all meals. Returns the number of days."""
+    async with connect() as db:
+        await _rebuild_daily_nutrition(db)
+        await db.commit()
+        cursor = await db.execute("SELECT COUNT(*) FROM daily_nutrition")
+        return (await cursor.fetchone())[0]
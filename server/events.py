@@ -0,0 +1,74 @@
+"""
+Change feed for consumers such as the OpenClaw agent.
+
+Writes that change health or nutrition data record a row in the tenant's
+change_events table inside their own transaction (see database.py), so the
+feed never announces data that was rolled back and never misses data that
+was committed. Those rows are the feed: /api/events streams them as
+Server-Sent Events and resumes from Last-Event-ID. This module wakes the
+streams when new rows are committed and formats the events.
+
+Wake-ups are in-process; streams also re-read the table on every keepalive,
+so changes made by other processes show up within one keepalive interval.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+# Comment line that keeps proxies and clients from timing out idle streams
+KEEPALIVE = b": keepalive\n\n"
+# Sent first: how long clients wait before reconnecting (ms)
+RETRY = b"retry: 3000\n\n"
+
+
+class ChangeNotifier:
+    """Per-tenant wake-ups for streams waiting on new change events."""
+
+    def __init__(self):
+        self._events: dict[str, asyncio.Event] = {}
+
+    def waiter(self, tenant: str) -> asyncio.Event:
+        """
+        Event set by the next notify() for `tenant`. Take it before reading
+        the table, so a commit in between is not missed.
+        """
+        event = self._events.get(tenant)
+        if event is None:
+            event = self._events[tenant] = asyncio.Event()
+        return event
+
+    def notify(self, tenant: str) -> None:
+        """Wake every stream of `tenant`; called after a change is committed."""
+        event = self._events.pop(tenant, None)
+        if event is not None:
+            event.set()
+
+
+CHANGES = ChangeNotifier()
+
+
+async def wait_for_change(waiter: asyncio.Event, timeout: float) -> bool:
+    """True if `waiter` was set within `timeout` seconds."""
+    try:
+        await asyncio.wait_for(waiter.wait(), timeout)
+        return True
+    except TimeoutError:
+        return False
+
+
+def format_event(event: dict) -> bytes:
+    """One change event in SSE framing; its id is what clients resume from."""
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: change\ndata: {data}\n\n".encode()
+
+
+def format_reset(latest_id: int) -> bytes:
+    """
+    Tells a resuming client that events since its Last-Event-ID are no longer
+    kept, so it should reload everything it needs; the feed continues from
+    `latest_id`.
+    """
+    data = json.dumps({"id": latest_id, "reason": "history_expired"}, separators=(",", ":"))
+    return f"id: {latest_id}\nevent: reset\ndata: {data}\n\n".encode()
@@ -0,0 +1,182 @@
+"""
+Columnar export of health tables for notebooks (pandas, polars, DuckDB).
+
+Rows are read from a read-only SQLite connection in fixed-size batches and
+encoded as Parquet row groups or Arrow IPC record batches as they go, so an
+export of any size is streamed in constant memory. The whole export is one
+SELECT, i.e. one consistent snapshot under WAL, and never blocks ingest.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from config import EXPORT_BATCH_ROWS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # export endpoints answer 501
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TABLES = ("daily_summary", "workouts", "sleep_sessions", "mood_entries", "meal_entries")
+
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def export_available() -> bool:
+    return pa is not None
+
+
+class ExportError(ValueError):
+    """The export request names an unknown table or column."""
+
+
+@dataclass
+class ExportPlan:
+    db_path: Path
+    table: str
+    columns: dict[str, str]  # name -> SQLite declared type
+    date_from: str | None = None
+    date_to: str | None = None
+    batch_rows: int = EXPORT_BATCH_ROWS
+    schema: "pa.Schema" = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.schema = pa.schema([(name, _arrow_type(decl)) for name, decl in self.columns.items()])
+
+    def query(self) -> tuple[str, list]:
+        where, params = [], []
+        if self.date_from:
+            where.append("date >= ?")
+            params.append(self.date_from)
+        if self.date_to:
+            where.append("date <= ?")
+            params.append(self.date_to)
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + " ORDER BY date, id", params
+
+
+def _arrow_type(decl: str):
+    return {"INTEGER": pa.int64(), "REAL": pa.float64()}.get(decl.upper(), pa.string())
+
+
+def _coerce(value, arrow_type):
+    """`value` as the column's Arrow type, or None if it has no such reading."""
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        return value.decode(errors="replace") if isinstance(value, bytes) else str(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if pa.types.is_integer(arrow_type):
+        return int(number) if number.is_integer() else None
+    return number
+
+
+def _column(values: tuple, f: "pa.Field") -> "pa.Array":
+    """
+    Arrow array for one column of a batch. SQLite does not enforce declared
+    types, so a batch holding a stray value ("12 steps" in an INTEGER column)
+    is converted value by value instead of failing the stream mid-response.
+    """
+    try:
+        return pa.array(values, type=f.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        logger.warning("Export column %s holds values that are not %s; converting them", f.name, f.type)
+        return pa.array([_coerce(v, f.type) for v in values], type=f.type)
+
+
+def plan_export(
+    db_path: Path,
+    table: str,
+    table_info: list[tuple[str, str]],
+    columns: list[str] | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> ExportPlan:
+    """
+    Validate an export of `table` (whose (name, declared type) pairs are
+    `table_info`) projected to `columns`. Raises ExportError.
+    """
+    if table not in EXPORT_TABLES:
+        raise ExportError(f"Unknown table '{table}', expected one of: {', '.join(EXPORT_TABLES)}")
+    available = dict(table_info)
+    if columns:
+        unknown = [c for c in columns if c not in available]
+        if unknown:
+            raise ExportError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+        available = {c: available[c] for c in dict.fromkeys(columns)}
+    return ExportPlan(db_path, table, available, date_from, date_to, batch_rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _batches(plan: ExportPlan) -> Iterator["pa.RecordBatch"]:
+    sql, params = plan.query()
+    # Starlette pulls each chunk on a worker thread, not necessarily the same one
+    db = sqlite3.connect(f"file:{plan.db_path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        cursor = db.execute(sql, params)
+        while rows := cursor.fetchmany(plan.batch_rows):
+            columns = list(zip(*rows))
+            yield pa.record_batch(
+                [_column(values, f) for values, f in zip(columns, plan.schema)],
+                schema=plan.schema,
+            )
+    finally:
+        db.close()
+
+
+def iter_export(plan: ExportPlan, fmt: str) -> Iterator[bytes]:
+    """Encode the export as a Parquet file or an Arrow IPC stream, one batch at a time."""
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, plan.schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, plan.schema)
+    try:
+        for batch in _batches(plan):
+            writer.write_batch(batch)
+            if chunk := sink.drain():
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,441 @@
+"""
+Local food-composition lookup for HealthClaw.
+
+Simple text meals ("2 eggs and toast") are resolved against a bundled
+nutrient table (data/foods.csv, values per 100 g approximated from USDA
+FoodData Central) instead of calling the agent. Extra foods can be imported
+by pointing HEALTHCLAW_FOOD_DB at a CSV with the same columns.
+
+Lookups go through an in-memory index of normalized aliases plus a trigram
+inverted index for fuzzy matches. A fuzzy match only counts when the food's
+name has the same words as the phrase, in the same order (or the spelling
+is nearly identical), so "apple pie" never becomes an apple and "chocolate
+milk" never becomes a chocolate bar; anything the parser or matcher is
+unsure about is left for the agent.
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from config import FOOD_DB_EXTRA
+from models import FoodItem, NutrientDetail, NutritionTotals
+
+BUNDLED_FOOD_DB = Path(__file__).parent / "data" / "foods.csv"
+
+# CSV column -> (display name, unit, HealthKit identifier, FDA daily value)
+NUTRIENT_COLUMNS: dict[str, tuple[str, str, str, float | None]] = {
+    "kcal": ("Energy", "kcal", "dietaryEnergyConsumed", None),
+    "protein_g": ("Protein", "g", "dietaryProtein", 50),
+    "carbs_g": ("Carbohydrates", "g", "dietaryCarbohydrates", 275),
+    "fat_g": ("Fat Total", "g", "dietaryFatTotal", 78),
+    "sat_fat_g": ("Saturated Fat", "g", "dietaryFatSaturated", 20),
+    "fiber_g": ("Fiber", "g", "dietaryFiber", 28),
+    "sugar_g": ("Sugar", "g", "dietarySugar", None),
+    "sodium_mg": ("Sodium", "mg", "dietarySodium", 2300),
+    "cholesterol_mg": ("Cholesterol", "mg", "dietaryCholesterol", 300),
+    "calcium_mg": ("Calcium", "mg", "dietaryCalcium", 1300),
+    "iron_mg": ("Iron", "mg", "dietaryIron", 18),
+    "potassium_mg": ("Potassium", "mg", "dietaryPotassium", 4700),
+    "vitamin_c_mg": ("Vitamin C", "mg", "dietaryVitaminC", 90),
+    # Optional: the bundled table leaves these out; an imported CSV may fill them
+    "vitamin_d_iu": ("Vitamin D", "IU", "dietaryVitaminD", 800),
+    "magnesium_mg": ("Magnesium", "mg", "dietaryMagnesium", 420),
+    "vitamin_a_iu": ("Vitamin A", "IU", "dietaryVitaminA", 5000),
+    "vitamin_b6_mg": ("Vitamin B6", "mg", "dietaryVitaminB6", 1.7),
+    "vitamin_b12_mcg": ("Vitamin B12", "mcg", "dietaryVitaminB12", 2.4),
+    "folate_mcg": ("Folate", "mcg", "dietaryFolate", 400),
+    "zinc_mg": ("Zinc", "mg", "dietaryZinc", 11),
+}
+# Columns every food table has; a blank value there means zero
+_REQUIRED_COLUMNS = (
+    "kcal", "protein_g", "carbs_g", "fat_g", "sat_fat_g", "fiber_g", "sugar_g", "sodium_mg",
+    "cholesterol_mg", "calcium_mg", "iron_mg", "potassium_mg", "vitamin_c_mg",
+)
+
+# Columns that already have a dedicated FoodItem field
+_MACRO_COLUMNS = {"kcal", "protein_g", "carbs_g", "fat_g", "fiber_g", "sugar_g", "sodium_mg"}
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "dozen": 12, "half": 0.5, "quarter": 0.25, "couple": 2,
+    "few": 3, "some": 1,
+}
+_FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3}
+
+# Unit word -> grams per unit
+_MASS_UNITS = {
+    "g": 1.0, "gr": 1.0, "gram": 1.0, "grams": 1.0,
+    "kg": 1000.0, "kilo": 1000.0, "kilos": 1000.0,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35,
+    "lb": 453.6, "lbs": 453.6, "pound": 453.6, "pounds": 453.6,
+    # Volumes are treated as water-dense, close enough for drinks and sauces
+    "ml": 1.0, "milliliter": 1.0, "milliliters": 1.0, "millilitre": 1.0, "millilitres": 1.0,
+    "l": 1000.0, "liter": 1000.0, "liters": 1000.0, "litre": 1000.0, "litres": 1000.0,
+    "handful": 30.0, "handfuls": 30.0,
+}
+# Volume units relative to one cup, converted with the food's cup_grams
+_CUP_UNITS = {
+    "cup": 1.0, "cups": 1.0,
+    "tbsp": 1 / 16, "tablespoon": 1 / 16, "tablespoons": 1 / 16,
+    "tsp": 1 / 48, "teaspoon": 1 / 48, "teaspoons": 1 / 48,
+}
+# Units that mean "one of the food's default portion"
+_COUNT_UNITS = {
+    "slice", "slices", "piece", "pieces", "serving", "servings", "portion",
+    "portions", "glass", "glasses", "bowl", "bowls", "plate", "plates",
+    "scoop", "scoops", "can", "cans", "bottle", "bottles", "bar", "bars",
+    "square", "squares", "fillet", "fillets", "shot", "shots", "container",
+    "containers", "strip", "strips", "wedge", "wedges", "box", "boxes",
+}
+
+# Descriptors that rarely change the nutrient profile enough to matter. Words
+# that also start dish names ("grilled cheese", "hot chocolate", "cold cuts")
+# are left out; stripping them would turn the dish into its main ingredient.
+_DESCRIPTORS = {
+    "fresh", "raw", "cooked", "plain", "sliced", "chopped", "diced", "large",
+    "small", "medium", "big", "homemade", "organic", "baked", "roasted",
+    "steamed", "boiled", "toasted", "warm", "of", "some", "little", "bit",
+    "my", "the",
+}
+# Foods the table portions by the slice or wedge. Without a unit, "half a
+# pizza" means half of the whole thing, which the table has no weight for.
+_WHOLE_DISHES = {"pizza", "pie", "cake", "quiche", "loaf", "watermelon", "melon"}
+
+# Captured, so analyze_locally can tell "with" add-ins from listed items
+_SEPARATORS = re.compile(r"(,|;|\+|&|\n|\band\b|\bwith\b|\bplus\b)", re.IGNORECASE)
+_QUANTITY = re.compile(
+    r"^\s*(?P<num>\d+\s+\d+/\d+|\d+/\d+|\d+(?:[.,]\d+)?|[½¼¾⅓⅔])\s*(?P<frac>[½¼¾⅓⅔])?"
+)
+_WORD = re.compile(r"[a-z]+")
+
+MAX_SEGMENTS = 8
+# Heavier single items are more likely a typo or a joke than a meal
+MAX_ITEM_GRAMS = 2000.0
+# Trigram similarity at which a fuzzy match is taken even if words differ (typos)
+NEAR_EXACT_SCORE = 0.9
+
+
+@dataclass(frozen=True)
+class Food:
+    name: str
+    aliases: tuple[str, ...]
+    unit: str
+    unit_grams: float
+    cup_grams: float | None
+    # Only the nutrients the table knows for this food
+    per_100g: dict[str, float]
+
+
+@dataclass
+class LocalAnalysis:
+    """A meal resolved from the local table, shaped like the agent result."""
+
+    description: str
+    food_items: list[FoodItem]
+    totals: NutritionTotals
+    healthkit_samples: list[dict[str, Any]]
+    confidence: float
+    matches: list[dict[str, Any]] = field(default_factory=list)
+    # HealthKit identifiers the table has no values for (the agent would report them)
+    missing_nutrients: list[str] = field(default_factory=list)
+
+
+def normalize(text: str) -> str:
+    """Lowercase and keep only word characters, single-spaced."""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def _singular_forms(phrase: str) -> list[str]:
+    """Candidate singular spellings of the last word of a phrase."""
+    head, _, last = phrase.rpartition(" ")
+    prefix = f"{head} " if head else ""
+    forms = [phrase]
+    if last.endswith("ies") and len(last) > 4:
+        forms += [prefix + last[:-3] + "y", prefix + last[:-1]]
+    elif last.endswith("es") and len(last) > 3:
+        forms += [prefix + last[:-2], prefix + last[:-1]]
+    elif last.endswith("s") and not last.endswith("ss") and len(last) > 2:
+        forms.append(prefix + last[:-1])
+    return forms
+
+
+def _word_forms(phrase: str) -> set[str]:
+    """Every word of a phrase plus its singular spellings."""
+    return {form for word in phrase.split() for form in _singular_forms(word)}
+
+
+def _trigrams(phrase: str) -> set[str]:
+    # Over the whole phrase, so the grams spanning a word break keep word order
+    padded = f"  {phrase} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _same_words(words: list[str], alias_words: list[str]) -> bool:
+    """Whether two phrases have the same words in the same order, plurals folded."""
+    return len(words) == len(alias_words) and all(
+        not set(_singular_forms(word)).isdisjoint(_singular_forms(alias_word))
+        for word, alias_word in zip(words, alias_words)
+    )
+
+
+class FoodIndex:
+    """Exact alias map plus a trigram inverted index over all aliases."""
+
+    def __init__(self, foods: list[Food]):
+        self.foods = foods
+        self._exact: dict[str, Food] = {}
+        self._alias_foods: list[Food] = []
+        self._alias_grams: list[set[str]] = []
+        self._alias_words: list[list[str]] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+
+        for food in foods:
+            for alias in (food.name, *food.aliases):
+                key = normalize(alias)
+                if not key or key in self._exact:
+                    continue
+                self._exact[key] = food
+                alias_id = len(self._alias_foods)
+                grams = _trigrams(key)
+                self._alias_foods.append(food)
+                self._alias_grams.append(grams)
+                self._alias_words.append(key.split())
+                for gram in grams:
+                    self._postings[gram].append(alias_id)
+
+    def lookup(self, phrase: str) -> tuple[Food | None, float]:
+        """
+        Best matching food for a normalized phrase and a 0..1 confidence.
+        Fuzzy candidates must have the same words as the phrase in the same
+        order (descriptors aside, plurals folded) unless they score
+        NEAR_EXACT_SCORE or more, so a longer alias that merely contains the
+        phrase ("cream" in "ice cream") is never taken.
+        """
+        stripped = " ".join(w for w in phrase.split() if w not in _DESCRIPTORS)
+        for candidate in (phrase, stripped):
+            for form in _singular_forms(candidate) if candidate else ():
+                if form in self._exact:
+                    return self._exact[form], 1.0
+
+        query = _trigrams(stripped or phrase)
+        if not query:
+            return None, 0.0
+        words = (stripped or phrase).split()
+        overlap: dict[int, int] = defaultdict(int)
+        for gram in query:
+            for alias_id in self._postings.get(gram, ()):
+                overlap[alias_id] += 1
+        best_food, best_score = None, 0.0
+        for alias_id, common in overlap.items():
+            score = common / (len(query) + len(self._alias_grams[alias_id]) - common)
+            if score <= best_score:
+                continue
+            if score >= NEAR_EXACT_SCORE or _same_words(words, self._alias_words[alias_id]):
+                best_food, best_score = self._alias_foods[alias_id], score
+        return best_food, best_score
+
+
+def load_foods(path: Path) -> list[Food]:
+    """Read a food-composition CSV (values per 100 g)."""
+    foods = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            foods.append(Food(
+                name=row["name"],
+                aliases=tuple(a for a in row["aliases"].split("|") if a),
+                unit=row["unit"],
+                unit_grams=float(row["unit_grams"]),
+                cup_grams=float(row["cup_grams"]) if row.get("cup_grams") else None,
+                per_100g={
+                    col: float(row.get(col) or 0)
+                    for col in NUTRIENT_COLUMNS
+                    if col in _REQUIRED_COLUMNS or row.get(col)
+                },
+            ))
+    return foods
+
+
+@lru_cache(maxsize=1)
+def get_food_index() -> FoodIndex:
+    """Build the index once per process; imported foods take precedence."""
+    foods = []
+    if FOOD_DB_EXTRA:
+        foods += load_foods(Path(FOOD_DB_EXTRA))
+    foods += load_foods(BUNDLED_FOOD_DB)
+    return FoodIndex(foods)
+
+
+def _parse_number(raw: str) -> float:
+    raw = raw.strip()
+    if raw in _FRACTIONS:
+        return _FRACTIONS[raw]
+    if " " in raw:
+        whole, frac = raw.split()
+        return float(whole) + _parse_number(frac)
+    if "/" in raw:
+        num, den = raw.split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    return float(raw.replace(",", "."))
+
+
+def parse_portion(segment: str) -> tuple[float | None, str | None, str]:
+    """
+    Split "2 slices of toast" into (2.0, "slices", "toast"). The quantity is
+    None when the segment gives none (callers default it to one unit).
+    """
+    text = segment.strip().lower()
+    quantity = None
+    m = _QUANTITY.match(text)
+    if m:
+        quantity = _parse_number(m.group("num"))
+        if m.group("frac"):
+            quantity += _FRACTIONS[m.group("frac")]
+        text = text[m.end():]
+
+    words = _WORD.findall(text)
+    # Number words, e.g. "half an avocado", "a couple of eggs"
+    while words and words[0] in _NUMBER_WORDS and quantity is None:
+        quantity = _NUMBER_WORDS[words.pop(0)]
+        while words and words[0] in ("a", "an", "of"):
+            words.pop(0)
+
+    unit = None
+    if words and (words[0] in _MASS_UNITS or words[0] in _CUP_UNITS or words[0] in _COUNT_UNITS):
+        unit = words.pop(0)
+    while words and words[0] == "of":
+        words.pop(0)
+    return quantity, unit, " ".join(words)
+
+
+def _grams_for(food: Food, quantity: float, unit: str | None) -> float | None:
+    if unit is None or unit in _COUNT_UNITS:
+        return quantity * food.unit_grams
+    if unit in _MASS_UNITS:
+        return quantity * _MASS_UNITS[unit]
+    if unit in _CUP_UNITS:
+        if food.cup_grams is None:
+            return None
+        return quantity * _CUP_UNITS[unit] * food.cup_grams
+    return None
+
+
+def _pluralize(word: str) -> str:
+    if word.endswith("y") and word[-2:-1] not in ("a", "e", "o", "u"):
+        return word[:-1] + "ies"
+    if word.endswith(("s", "ch", "sh")):
+        return word + "es"
+    return word + "s"
+
+
+def _format_quantity(quantity: float) -> str:
+    return f"{quantity:g}" if quantity != int(quantity) else str(int(quantity))
+
+
+def analyze_locally(text: str, min_confidence: float) -> LocalAnalysis | None:
+    """
+    Resolve a text meal from the local table. Returns None when any part of
+    the meal can't be parsed or matched with at least `min_confidence`, for
+    unquantified add-ins ("coffee with milk"), whose amount is unknown, and
+    for whole dishes or implausible amounts the table can't weigh.
+    """
+    pieces = _SEPARATORS.split(text)
+    segments = [
+        (s, pieces[i - 1].strip().lower() if i else None)
+        for i, s in enumerate(pieces)
+        if i % 2 == 0 and s and s.strip()
+    ]
+    if not segments or len(segments) > MAX_SEGMENTS:
+        return None
+
+    index = get_food_index()
+    items: list[FoodItem] = []
+    matches: list[dict[str, Any]] = []
+    totals = defaultdict(float)
+    known = set(NUTRIENT_COLUMNS)
+    confidence = 1.0
+
+    for segment, joined_by in segments:
+        quantity, unit, phrase = parse_portion(segment)
+        phrase = normalize(phrase)
+        if quantity is None:
+            if joined_by == "with":
+                return None
+            quantity = 1.0
+        if not phrase or quantity <= 0:
+            return None
+        if unit is None and _word_forms(phrase.split()[-1]) & _WHOLE_DISHES:
+            return None
+        food, score = index.lookup(phrase)
+        if food is None or score < min_confidence:
+            return None
+        grams = _grams_for(food, quantity, unit)
+        if grams is None or grams > MAX_ITEM_GRAMS:
+            return None
+        confidence = min(confidence, score)
+
+        factor = grams / 100.0
+        amounts = {col: round(val * factor, 2) for col, val in food.per_100g.items()}
+        for col, amount in amounts.items():
+            totals[col] += amount
+        known &= amounts.keys()
+
+        if unit in _MASS_UNITS:
+            portion = f"{_format_quantity(quantity)} {unit}"
+        else:
+            unit_label = unit or food.unit
+            if unit is None and quantity > 1:
+                unit_label = _pluralize(unit_label)
+            portion = f"{_format_quantity(quantity)} {unit_label} ({grams:.0f} g)"
+        items.append(FoodItem(
+            name=food.name,
+            portion=portion,
+            calories=amounts["kcal"],
+            protein_g=amounts["protein_g"],
+            carbs_g=amounts["carbs_g"],
+            fat_g=amounts["fat_g"],
+            fiber_g=amounts["fiber_g"],
+            sugar_g=amounts["sugar_g"],
+            sodium_mg=amounts["sodium_mg"],
+            nutrients=[
+                NutrientDetail(
+                    name=name,
+                    amount=amounts[col],
+                    unit=nutrient_unit,
+                    daily_value_pct=round(100 * amounts[col] / dv, 1) if dv else None,
+                )
+                for col, (name, nutrient_unit, _, dv) in NUTRIENT_COLUMNS.items()
+                if col not in _MACRO_COLUMNS and col in amounts
+            ],
+        ))
+        matches.append({"input": segment.strip(), "food": food.name, "grams": round(grams, 1), "score": round(score, 3)})
+
+    return LocalAnalysis(
+        description=text.strip(),
+        food_items=items,
+        totals=NutritionTotals(
+            calories=round(totals["kcal"], 1),
+            protein_g=round(totals["protein_g"], 1),
+            carbs_g=round(totals["carbs_g"], 1),
+            fat_g=round(totals["fat_g"], 1),
+            fiber_g=round(totals["fiber_g"], 1),
+            sugar_g=round(totals["sugar_g"], 1),
+            sodium_mg=round(totals["sodium_mg"], 1),
+        ),
+        # A meal total is only written for nutrients known for every item
+        healthkit_samples=[
+            {"identifier": ident, "value": round(totals[col], 2), "unit": unit}
+            for col, (_, unit, ident, _) in NUTRIENT_COLUMNS.items()
+            if col in known
+        ],
+        confidence=confidence,
+        matches=matches,
+        missing_nutrients=[ident for col, (_, _, ident, _) in NUTRIENT_COLUMNS.items() if col not in known],
+    )
@@ -1,27 +1,54 @@
 """HealthClaw API server."""
 
+import logging
 from contextlib import asynccontextmanager
-from datetime import date as date_type
-from fastapi import FastAPI, Header, HTTPException, Query
-from fastapi.responses import JSONResponse
-
-from config import API_KEY
+from datetime import date as date_type, timedelta
+from typing import AsyncIterator
+from pydantic import ValidationError
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from admission import AGENT_BREAKER, ANALYZE_RATE_LIMITER, Rejected
+from agent import AgentError, AgentTimeout
+from analytics import get_backend as get_analytics_backend
+from config import EVENTS_KEEPALIVE_SECONDS, LOCAL_NUTRITION, LOG_LEVEL
 from database import (
+    connect,
+    change_event_bounds,
+    get_change_events,
     init_db,
+    start_pool,
+    close_pool,
     store_sync,
     get_daily_summaries,
     get_latest_summary,
     get_workouts,
     get_mood_entries,
     get_sleep_sessions,
+    get_food_aggregates,
+    get_widget,
+    DatabaseNotEmpty,
+    IdempotencyConflict,
+    restore_rows,
     get_meal_entry,
     get_meal_history,
     get_daily_nutrition_summary,
+    get_nutrition_summary_range,
+    search_meals,
     update_meal_entry,
+    update_meal_food_item,
     delete_meal_entry,
 )
+from backup import BACKUP_TABLES, iter_csv, iter_ndjson, parse_ndjson
+from export import EXPORT_TABLES, MEDIA_TYPES, ExportError, export_available, iter_export, plan_export
+from events import CHANGES, KEEPALIVE, RETRY, format_event, format_reset, wait_for_change
+from fooddb import get_food_index
+import metrics
+from querylog import SLOW_QUERIES
 from models import (
     DailyNutritionSummary,
+    FoodItem,
     HealthSyncPayload,
     MealUpdateRequest,
     NutritionAnalysisRequest,
@@ -29,13 +56,26 @@ from models import (
     NutritionHistoryEntry,
     NutrientSummaryItem,
 )
-from nutrition import analyze_nutrition
+from nutrition import analyze_nutrition, shutdown_image_pool
+from tenants import DEFAULT_TENANT, active_tenant, current_tenant, db_path_for, tenant_for_key
+from uploads import UploadError, UploadTooLarge, spool_multipart
+from widget import WIDGETS, etag_matches
+
+# Longest range (in days, both ends included) accepted by /api/nutrition/summary/range
+MAX_SUMMARY_RANGE_DAYS = 731
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    await init_db(DEFAULT_TENANT)
+    start_pool()
+    if LOCAL_NUTRITION:
+        get_food_index()  # build the lookup index before the first request
     yield
+    await close_pool()
+    shutdown_image_pool()
 
 
 app = FastAPI(
@@ -44,22 +84,80 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan,
 )
+app.add_middleware(metrics.MetricsMiddleware, routes=app.router.routes)
 
 
-def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != API_KEY:
+def verify_api_key(x_api_key: str = Header(...)) -> str:
+    """Resolve the API key's tenant and make it current for this request."""
+    tenant = tenant_for_key(x_api_key)
+    if tenant is None:
         raise HTTPException(status_code=401, detail="Invalid API key")
+    current_tenant.set(tenant)
+    return tenant
 
 
 # ── Sync endpoint (iOS app pushes here) ──────────────────────────────
 
-@app.post("/api/health/sync")
+# The sync body is validated straight from the raw bytes, so it is declared
+# to OpenAPI by hand; its models go into the document's components
+_SYNC_SCHEMA = HealthSyncPayload.model_json_schema(ref_template="#/components/schemas/{model}")
+_SYNC_SCHEMAS = {**_SYNC_SCHEMA.pop("$defs", {}), "HealthSyncPayload": _SYNC_SCHEMA}
+
+
+def _openapi() -> dict:
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(_SYNC_SCHEMAS)
+    return app.openapi_schema
+
+
+app.openapi = _openapi
+
+
+@app.post(
+    "/api/health/sync",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/HealthSyncPayload"}}},
+    }},
+)
 async def sync_health_data(
-    payload: HealthSyncPayload,
+    request: Request,
     x_api_key: str = Header(...),
 ):
+    """
+    Store a sync from the iOS app. The body is validated from its raw bytes,
+    which are kept as-is in sync_log instead of being re-serialized.
+    """
     verify_api_key(x_api_key)
-    sync_id = await store_sync(payload)
+    body = await request.body()
+    try:
+        payload = HealthSyncPayload.model_validate_json(body)
+    except ValidationError as e:
+        # Same 422 shape FastAPI gives for a declared body parameter. Raw bytes
+        # (e.g. the whole body of a json_invalid error) are decoded for the response,
+        # which otherwise fails to encode bodies that are not UTF-8.
+        raise RequestValidationError(
+            [
+                {
+                    **err,
+                    "loc": ("body", *err["loc"]),
+                    "input": err["input"].decode(errors="replace") if isinstance(err["input"], bytes) else err["input"],
+                }
+                for err in e.errors(include_url=False)
+            ],
+            body=body.decode(errors="replace"),
+        )
+    metrics.SYNC_PAYLOAD_BYTES.observe(len(body))
+    for kind, count in (
+        ("sleep", len(payload.sleep)),
+        ("sleep_stages", sum(len(s.stages) for s in payload.sleep)),
+        ("workouts", len(payload.workouts)),
+        ("mood", len(payload.mood)),
+        ("mindfulness", len(payload.mindfulness)),
+    ):
+        metrics.SYNC_RECORDS.labels(kind).observe(count)
+    sync_id = await store_sync(payload, raw=body)
     return {"status": "ok", "sync_id": sync_id}
 
 
@@ -114,32 +212,179 @@ async def list_sleep(
     return {"days": days, "sleep": sessions}
 
 
+@app.get("/api/widget")
+async def widget(
+    x_api_key: str = Header(...),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Today's headline numbers for the iOS widget as a small fixed-shape
+    document, precomputed on write. Send If-None-Match to get a 304 when
+    nothing changed.
+    """
+    tenant = verify_api_key(x_api_key)
+    today = date_type.today().isoformat()
+    doc = WIDGETS.get(tenant, today) or await get_widget(today)
+    headers = {"ETag": doc.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag_matches(if_none_match, doc.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=doc.body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/health/ping")
 async def ping():
-    """Health check — no auth required."""
-    return {"status": "ok"}
+    """Health check — no auth required. Includes the nutrition agent's circuit breaker state."""
+    return {"status": "ok", "agent": AGENT_BREAKER.status()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape target — no auth required; exposes only timings and counts."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ── Change feed ───────────────────────────────────────────────────────
+
+async def _event_stream(tenant: str, after: int | None) -> AsyncIterator[bytes]:
+    current_tenant.set(tenant)
+    oldest, latest = await change_event_bounds()
+    yield RETRY
+    if after is None:
+        after = latest  # new clients get changes from now on
+    elif after > latest or (after < latest and (oldest is None or after < oldest - 1)):
+        yield format_reset(latest)  # unknown id, or the events after it were pruned
+        after = latest
+    while True:
+        waiter = CHANGES.waiter(tenant)
+        events = await get_change_events(after)
+        for event in events:
+            yield format_event(event)
+        if events:
+            after = events[-1]["id"]
+            continue
+        if not await wait_for_change(waiter, EVENTS_KEEPALIVE_SECONDS):
+            yield KEEPALIVE
+
+
+@app.get("/api/events")
+async def change_events(
+    x_api_key: str = Header(...),
+    last_event_id: str | None = Header(default=None),
+):
+    """
+    Server-Sent Events stream of data changes: one `change` event per committed
+    sync or meal edit, with the tables and dates it touched. Reconnect with
+    Last-Event-ID to resume; a `reset` event means the missed events are gone.
+    """
+    tenant = verify_api_key(x_api_key)
+    try:
+        after = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event id")
+    return StreamingResponse(
+        _event_stream(tenant, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ── Nutrition endpoints ───────────────────────────────────────────────
 
+def _rejected(e: Rejected) -> HTTPException:
+    """429/503 for a request shed by admission control."""
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": e.retry_after_header})
+
+
+def _agent_failed(e: AgentError) -> HTTPException:
+    """504 when the agent ran out of time, 502 when it failed."""
+    return HTTPException(status_code=504 if isinstance(e, AgentTimeout) else 502, detail=str(e))
+
+
+_IDEMPOTENCY_KEY = Header(
+    default=None,
+    max_length=255,
+    description="Repeats of a request with the same key return the meal stored the first time",
+)
+
+
 @app.post("/api/nutrition/analyze", response_model=NutritionAnalysisResponse)
 async def nutrition_analyze(
     request: NutritionAnalysisRequest,
     x_api_key: str = Header(...),
+    idempotency_key: str | None = _IDEMPOTENCY_KEY,
 ):
     """Analyze food from text (and optional image) using Claude. Stores the meal."""
     verify_api_key(x_api_key)
     try:
+        ANALYZE_RATE_LIMITER.check(x_api_key)
         result = await analyze_nutrition(
             text=request.text,
             image_base64=request.image_base64,
             image_mime_type=request.image_mime_type,
+            idempotency_key=idempotency_key,
         )
         return result
+    except Rejected as e:
+        raise _rejected(e)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AgentError as e:
+        raise _agent_failed(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Nutrition analysis failed: {e}")
 
 
+@app.post("/api/nutrition/analyze/upload", response_model=NutritionAnalysisResponse)
+async def nutrition_analyze_upload(
+    request: Request,
+    x_api_key: str = Header(...),
+    idempotency_key: str | None = _IDEMPOTENCY_KEY,
+):
+    """
+    Analyze a food photo sent as multipart/form-data (`image` file plus optional
+    `text` field). The photo is streamed to tmpfs instead of being base64-encoded.
+    """
+    verify_api_key(x_api_key)
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+    try:
+        ANALYZE_RATE_LIMITER.check(x_api_key)  # before the photo is read
+    except Rejected as e:
+        raise _rejected(e)
+
+    try:
+        upload = await spool_multipart(content_type, request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if not upload.file_path:
+            raise HTTPException(status_code=400, detail="Missing 'image' file part")
+        result = await analyze_nutrition(
+            text=upload.fields.get("text", ""),
+            image_path=upload.file_path,
+            idempotency_key=idempotency_key,
+        )
+        return result
+    except HTTPException:
+        raise
+    except Rejected as e:
+        raise _rejected(e)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AgentError as e:
+        raise _agent_failed(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Nutrition analysis failed: {e}")
+    finally:
+        upload.cleanup()
+
+
 @app.get("/api/nutrition/history")
 async def nutrition_history(
     days: int = Query(default=7, ge=1, le=90),
@@ -169,6 +414,89 @@ async def nutrition_summary(
     return summary
 
 
+@app.get("/api/nutrition/summary/range")
+async def nutrition_summary_range(
+    date_from: str = Query(default=None, alias="from", description="Start date (YYYY-MM-DD), defaults to 6 days before `to`"),
+    date_to: str = Query(default=None, alias="to", description="End date (YYYY-MM-DD), defaults to today"),
+    bucket: str = Query(default="day", pattern="^(day|week)$"),
+    x_api_key: str = Header(...),
+):
+    """
+    Return nutrition totals per day or ISO week (Monday start) for a date range,
+    with one aligned series per nutrient. Empty buckets are filled with zeros.
+    """
+    verify_api_key(x_api_key)
+    try:
+        end = date_type.fromisoformat(date_to) if date_to else date_type.today()
+        start = date_type.fromisoformat(date_from) if date_from else end - timedelta(days=6)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (end - start).days + 1 > MAX_SUMMARY_RANGE_DAYS:  # both ends count
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_SUMMARY_RANGE_DAYS} days")
+
+    rows = {r["start"]: r for r in await get_nutrition_summary_range(start.isoformat(), end.isoformat(), bucket)}
+
+    step = timedelta(days=7 if bucket == "week" else 1)
+    cursor = start - timedelta(days=start.weekday()) if bucket == "week" else start
+    buckets = []
+    series: dict[tuple[str, str], list[float]] = {}
+    while cursor <= end:
+        key = cursor.isoformat()
+        row = rows.get(key, {})
+        index = len(buckets)
+        buckets.append({
+            "start": key,
+            "meal_count": row.get("meal_count", 0),
+            "total_calories": row.get("total_calories", 0),
+            "total_protein_g": row.get("total_protein_g", 0),
+            "total_carbs_g": row.get("total_carbs_g", 0),
+            "total_fat_g": row.get("total_fat_g", 0),
+        })
+        for n in row.get("nutrients", []):
+            values = series.setdefault((n["nutrient_name"], n["unit"]), [])
+            values.extend([0] * (index - len(values)))
+            values.append(n["total_amount"])
+        cursor += step
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket": bucket,
+        "buckets": buckets,
+        "nutrients": [
+            {"nutrient_name": name, "unit": unit, "values": values + [0] * (len(buckets) - len(values))}
+            for (name, unit), values in sorted(series.items())
+        ],
+    }
+
+
+@app.get("/api/nutrition/foods")
+async def nutrition_foods(
+    days: int = Query(default=30, ge=1, le=366),
+    q: str = Query(default=None, description="Only foods whose name contains this text"),
+    limit: int = Query(default=50, ge=1, le=500),
+    x_api_key: str = Header(...),
+):
+    """Return per-food totals (e.g. protein from chicken this month)."""
+    verify_api_key(x_api_key)
+    return await get_food_aggregates(days, q, limit)
+
+
+@app.get("/api/nutrition/search")
+async def nutrition_search(
+    q: str = Query(..., min_length=1, description="Words to find in meal descriptions and food names"),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    x_api_key: str = Header(...),
+):
+    """Search past meals, best match first."""
+    verify_api_key(x_api_key)
+    total, results = await search_meals(q, limit, offset)
+    return {"query": q, "total": total, "limit": limit, "offset": offset, "results": results}
+
+
 @app.get("/api/nutrition/meals/{meal_id}")
 async def nutrition_meal_detail(
     meal_id: int,
@@ -190,9 +518,6 @@ async def nutrition_meal_update(
 ):
     """Update a meal's totals and food items."""
     verify_api_key(x_api_key)
-    import json
-
-    food_items_json = json.dumps([item.model_dump() for item in request.food_items])
     nutrients = []
     for item in request.food_items:
         nutrients.append({"name": "Energy", "amount": item.calories, "unit": "kcal"})
@@ -207,7 +532,7 @@ async def nutrition_meal_update(
         total_protein_g=request.totals.protein_g,
         total_carbs_g=request.totals.carbs_g,
         total_fat_g=request.totals.fat_g,
-        food_items_json=food_items_json,
+        food_items=request.food_items,
         nutrients=nutrients,
     )
     if not ok:
@@ -215,6 +540,21 @@ async def nutrition_meal_update(
     return {"status": "ok"}
 
 
+@app.put("/api/nutrition/meals/{meal_id}/items/{item_id}")
+async def nutrition_meal_item_update(
+    meal_id: int,
+    item_id: int,
+    item: FoodItem,
+    x_api_key: str = Header(...),
+):
+    """Replace a single food item; the meal's totals follow the change."""
+    verify_api_key(x_api_key)
+    ok = await update_meal_food_item(meal_id, item_id, item)
+    if not ok:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    return {"status": "ok"}
+
+
 @app.delete("/api/nutrition/meals/{meal_id}")
 async def nutrition_meal_delete(
     meal_id: int,
@@ -228,6 +568,204 @@ async def nutrition_meal_delete(
     return {"status": "ok"}
 
 
+# ── Analytics (long-range scans, DuckDB when available) ─────────────
+
+def _analytics_range(date_from: str | None, date_to: str | None) -> tuple[str, str]:
+    """Validate optional from/to dates; missing bounds cover all history."""
+    try:
+        start = date_type.fromisoformat(date_from).isoformat() if date_from else "0000-01-01"
+        end = date_type.fromisoformat(date_to).isoformat() if date_to else "9999-12-31"
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    return start, end
+
+
+def _analytics_backend(engine: str | None):
+    try:
+        return get_analytics_backend(engine)
+    except LookupError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@app.get("/api/analytics/averages")
+async def analytics_averages(
+    date_from: str = Query(default=None, alias="from"),
+    date_to: str = Query(default=None, alias="to"),
+    period: str = Query(default="month", pattern="^(month|year)$"),
+    engine: str = Query(default=None, pattern="^(sqlite|duckdb)$", description="Override the configured backend"),
+    x_api_key: str = Header(...),
+):
+    """Average of every daily summary metric per month or year."""
+    verify_api_key(x_api_key)
+    start, end = _analytics_range(date_from, date_to)
+    backend = _analytics_backend(engine)
+    rows, snapshot_at = await backend.averages(start, end, period)
+    return {"engine": backend.name, "snapshot_at": snapshot_at, "period": period, "rows": rows}
+
+
+@app.get("/api/analytics/workouts")
+async def analytics_workouts(
+    date_from: str = Query(default=None, alias="from"),
+    date_to: str = Query(default=None, alias="to"),
+    period: str = Query(default="month", pattern="^(month|year)$"),
+    engine: str = Query(default=None, pattern="^(sqlite|duckdb)$", description="Override the configured backend"),
+    x_api_key: str = Header(...),
+):
+    """Workout sessions, minutes, distance and calories per type and period."""
+    verify_api_key(x_api_key)
+    start, end = _analytics_range(date_from, date_to)
+    backend = _analytics_backend(engine)
+    rows, snapshot_at = await backend.workouts(start, end, period)
+    return {"engine": backend.name, "snapshot_at": snapshot_at, "period": period, "rows": rows}
+
+
+@app.get("/api/analytics/correlations")
+async def analytics_correlations(
+    date_from: str = Query(default=None, alias="from"),
+    date_to: str = Query(default=None, alias="to"),
+    lag_days: int = Query(default=0, ge=0, le=7, description="Compare y this many days after x (1 = next night)"),
+    engine: str = Query(default=None, pattern="^(sqlite|duckdb)$", description="Override the configured backend"),
+    x_api_key: str = Header(...),
+):
+    """Pearson correlations between daily metrics (e.g. workout minutes vs. deep sleep)."""
+    verify_api_key(x_api_key)
+    start, end = _analytics_range(date_from, date_to)
+    backend = _analytics_backend(engine)
+    rows, snapshot_at = await backend.correlations(start, end, lag_days)
+    return {"engine": backend.name, "snapshot_at": snapshot_at, "lag_days": lag_days, "rows": rows}
+
+
+# ── Columnar export (Parquet / Arrow IPC) ───────────────────────────
+
+async def _export_response(
+    table: str, fmt: str, columns: str | None, date_from: str | None, date_to: str | None
+) -> StreamingResponse:
+    if not export_available():
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table, expected one of: {', '.join(EXPORT_TABLES)}")
+    try:
+        start = date_type.fromisoformat(date_from).isoformat() if date_from else None
+        end = date_type.fromisoformat(date_to).isoformat() if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+
+    async with connect(read_only=True) as db:
+        cursor = await db.execute("SELECT name, type FROM pragma_table_info(?)", (table,))
+        table_info = await cursor.fetchall()
+    try:
+        plan = plan_export(
+            db_path_for(active_tenant()),
+            table,
+            table_info,
+            columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+            date_from=start,
+            date_to=end,
+        )
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        iter_export(plan, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+    )
+
+
+@app.get("/api/export/{table}.parquet")
+async def export_parquet(
+    table: str,
+    columns: str = Query(default=None, description="Comma-separated columns to include (default: all)"),
+    date_from: str = Query(default=None, alias="from"),
+    date_to: str = Query(default=None, alias="to"),
+    x_api_key: str = Header(...),
+):
+    """Stream a table as a Parquet file, one row group per batch."""
+    verify_api_key(x_api_key)
+    return await _export_response(table, "parquet", columns, date_from, date_to)
+
+
+@app.get("/api/export/{table}.arrow")
+async def export_arrow(
+    table: str,
+    columns: str = Query(default=None, description="Comma-separated columns to include (default: all)"),
+    date_from: str = Query(default=None, alias="from"),
+    date_to: str = Query(default=None, alias="to"),
+    x_api_key: str = Header(...),
+):
+    """Stream a table in the Arrow IPC streaming format."""
+    verify_api_key(x_api_key)
+    return await _export_response(table, "arrow", columns, date_from, date_to)
+
+
+# ── Admin ─────────────────────────────────────────────────────────────
+
+@app.get("/api/admin/slow-queries")
+async def admin_slow_queries(
+    limit: int = Query(default=50, ge=1, le=1000),
+    x_api_key: str = Header(...),
+):
+    """Recent statements over the slow-query threshold for this tenant, newest first."""
+    tenant = verify_api_key(x_api_key)
+    if SLOW_QUERIES is None:
+        raise HTTPException(status_code=404, detail="Slow-query log is disabled (HEALTHCLAW_SLOW_QUERY_MS < 0)")
+    return {
+        "threshold_ms": SLOW_QUERIES.threshold_ms,
+        "queries": SLOW_QUERIES.recent(tenant, limit),
+    }
+
+
+# ── Backup / restore (NDJSON, CSV) ──────────────────────────────────
+
+@app.get("/api/backup.ndjson")
+async def backup_ndjson(
+    tables: str = Query(default=None, description="Comma-separated tables (default: all)"),
+    x_api_key: str = Header(...),
+):
+    """Stream a consistent NDJSON backup of the health tables."""
+    verify_api_key(x_api_key)
+    selected = tuple(t.strip() for t in tables.split(",") if t.strip()) if tables else BACKUP_TABLES
+    unknown = [t for t in selected if t not in BACKUP_TABLES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown table(s): {', '.join(unknown)}")
+    async with connect(read_only=True):
+        pass  # create the schema before the read-only snapshot opens it
+    return StreamingResponse(
+        iter_ndjson(db_path_for(active_tenant()), selected),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="healthclaw-backup.ndjson"'},
+    )
+
+
+@app.get("/api/backup/{table}.csv")
+async def backup_csv(table: str, x_api_key: str = Header(...)):
+    """Stream one table as CSV."""
+    verify_api_key(x_api_key)
+    if table not in BACKUP_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table, expected one of: {', '.join(BACKUP_TABLES)}")
+    async with connect(read_only=True):
+        pass
+    return StreamingResponse(
+        iter_csv(db_path_for(active_tenant()), table),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{table}.csv"'},
+    )
+
+
+@app.post("/api/restore")
+async def restore(request: Request, x_api_key: str = Header(...)):
+    """Restore an NDJSON backup (streamed request body) into an empty database."""
+    verify_api_key(x_api_key)
+    try:
+        counts = await restore_rows(parse_ndjson(request.stream()))
+    except DatabaseNotEmpty as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:  # BackupError, unknown columns, invalid food items
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "restored": counts}
+
+
 if __name__ == "__main__":
     import uvicorn
     from config import HOST, PORT
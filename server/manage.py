@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+HealthClaw maintenance commands.
+
+    python manage.py [--tenant ID] rebuild-daily-nutrition
+    python manage.py [--tenant ID] backup [--output FILE] [--table T ...] [--format ndjson|csv]
+    python manage.py [--tenant ID] restore FILE
+    python manage.py [--tenant ID] check-plans
+"""
+
+import argparse
+import asyncio
+import sys
+
+from backup import BACKUP_TABLES, iter_csv, iter_ndjson, parse_ndjson
+from database import close_pool, explain_range_queries, init_db, rebuild_daily_nutrition, restore_rows
+from querylog import is_full_scan
+from tenants import DEFAULT_TENANT, active_tenant, db_path_for, use_tenant
+
+_READ_CHUNK = 64 * 1024
+
+
+async def _rebuild_daily_nutrition(args: argparse.Namespace) -> None:
+    days = await rebuild_daily_nutrition()
+    print(f"Rebuilt daily nutrition totals for {days} days")
+
+
+async def _backup(args: argparse.Namespace) -> None:
+    path = db_path_for(active_tenant())
+    if args.format == "csv":
+        if len(args.table or ()) != 1:
+            raise SystemExit("CSV backups take exactly one --table")
+        chunks = iter_csv(path, args.table[0])
+    else:
+        chunks = iter_ndjson(path, tuple(args.table or BACKUP_TABLES))
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+async def _restore(args: argparse.Namespace) -> None:
+    source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+
+    async def chunks():
+        while chunk := source.read(_READ_CHUNK):
+            yield chunk
+
+    try:
+        counts = await restore_rows(parse_ndjson(chunks()))
+    except ValueError as e:
+        raise SystemExit(f"Restore failed: {e}")
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+
+
+async def _check_plans(args: argparse.Namespace) -> None:
+    failed = []
+    for name, plan in (await explain_range_queries()).items():
+        problems = [
+            line.strip() for line in plan
+            if line.strip().startswith("USE TEMP B-TREE") or is_full_scan(line.strip())
+        ]
+        print(f"{'FAIL' if problems else 'ok  '} {name}")
+        for line in plan:
+            print(f"       {line}")
+        if problems:
+            failed.append(name)
+    if failed:
+        raise SystemExit(f"Range queries without an index for filter and sort: {', '.join(failed)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HealthClaw maintenance commands")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant database to operate on")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser(
+        "rebuild-daily-nutrition",
+        help="Recompute the daily_nutrition table from meal_entries/meal_nutrients",
+    ).set_defaults(func=_rebuild_daily_nutrition)
+
+    backup = sub.add_parser("backup", help="Dump the tenant database as NDJSON (or one table as CSV)")
+    backup.add_argument("--output", "-o", default="-", help="Output file (default: stdout)")
+    backup.add_argument("--table", action="append", choices=BACKUP_TABLES, help="Table to include (repeatable)")
+    backup.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    backup.set_defaults(func=_backup)
+
+    restore = sub.add_parser("restore", help="Load an NDJSON backup into an empty tenant database")
+    restore.add_argument("file", help="Backup file, or - for stdin")
+    restore.set_defaults(func=_restore)
+
+    sub.add_parser(
+        "check-plans",
+        help="Check that date-range reads use an index for both filter and sort (exits 1 if not)",
+    ).set_defaults(func=_check_plans)
+
+    args = parser.parse_args()
+
+    async def run() -> None:
+        with use_tenant(args.tenant):
+            try:
+                await init_db()
+                await args.func(args)
+            finally:
+                await close_pool()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Prometheus metrics for HealthClaw.
+
+A small in-process registry rendered in the Prometheus text format at
+/metrics. Hot paths bind their label values once (metric.labels(...)), so
+observing is a bucket bisect and a few increments under a lock. Labels are
+kept to bounded sets (route templates, function names, exit codes), never
+tenants or ids.
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        # label values (in label_names order) -> child holding that series
+        self._children: dict[tuple, Any] = {}
+        _REGISTRY.append(self)
+
+    def labels(self, *values: Any):
+        """The series for these label values; bind it once for hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(
+                ((tuple(map(str, values)), child) for values, child in self._children.items()),
+                key=lambda pair: pair[0],
+            )
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.label_names, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, label_names: tuple, values: tuple) -> list[str]:
+        return [f"{name}{_format_labels(label_names, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name: str, label_names: tuple, values: tuple) -> list[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(label_names, values, le)} {cumulative}")
+        labels = _format_labels(label_names, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = ()):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labels)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── Metrics ───────────────────────────────────────────────────────────
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "healthclaw_http_request_duration_seconds",
+    "HTTP request latency by route template, until the response body is sent.",
+    ("method", "route", "status"),
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+DB_QUERY_SECONDS = Histogram(
+    "healthclaw_db_query_duration_seconds",
+    "Time spent in each database.py function, including waiting for the tenant connection.",
+    ("function",),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+DB_QUERY_ERRORS = Counter(
+    "healthclaw_db_query_errors_total",
+    "database.py calls that raised.",
+    ("function",),
+)
+DB_SLOW_QUERIES = Counter(
+    "healthclaw_db_slow_queries_total",
+    "Statements over the slow-query threshold, by calling function.",
+    ("caller",),
+)
+AGENT_CALL_SECONDS = Histogram(
+    "healthclaw_agent_call_duration_seconds",
+    "Duration of nutrition agent calls.",
+    ("outcome",),
+    (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 150),
+)
+AGENT_ADMISSION_SECONDS = Histogram(
+    "healthclaw_agent_admission_seconds",
+    "Time admitted nutrition analyses waited for a free agent slot.",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+AGENT_REJECTIONS = Counter(
+    "healthclaw_agent_rejections_total",
+    "Nutrition analyses turned away by admission control.",
+    ("reason",),
+)
+ANALYSES_COALESCED = Counter(
+    "healthclaw_nutrition_coalesced_total",
+    "Nutrition analyses that joined an identical in-flight request instead of starting their own.",
+    ("kind",),
+)
+AGENT_HEDGES = Counter(
+    "healthclaw_agent_hedges_total",
+    "Hedged second agent attempts, by which attempt answered (primary, hedge or none), or skipped for want of a slot.",
+    ("winner",),
+)
+AGENT_BREAKER_TRANSITIONS = Counter(
+    "healthclaw_agent_breaker_transitions_total",
+    "Agent circuit breaker state changes, by new state.",
+    ("state",),
+)
+AGENT_EXIT_CODES = Counter(
+    "healthclaw_agent_exit_codes_total",
+    "Nutrition agent process exit codes.",
+    ("code",),
+)
+AGENT_TIMEOUTS = Counter(
+    "healthclaw_agent_timeouts_total",
+    "Nutrition analyses whose agent calls were killed for exceeding the time budget.",
+)
+SYNC_PAYLOAD_BYTES = Histogram(
+    "healthclaw_sync_payload_bytes",
+    "Size of /api/health/sync request bodies.",
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+SYNC_RECORDS = Histogram(
+    "healthclaw_sync_records",
+    "Child records per sync payload, by kind.",
+    ("kind",),
+    (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+
+
+# ── Instrumentation helpers ───────────────────────────────────────────
+
+def timed_query(func: Callable) -> Callable:
+    """Record the duration (and failures) of an async database function."""
+    seconds = DB_QUERY_SECONDS.labels(func.__name__)
+    errors = DB_QUERY_ERRORS.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+# Anything else a client sends as the method is labelled "other"
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request, labelled by the matched route's
+    path template (e.g. /api/nutrition/meals/{meal_id}) so ids never become
+    label values, and by method, with made-up methods folded into "other".
+    Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app, routes: list):
+        self.app = app
+        self.routes = routes  # the router's live list; later routes show up too
+        self._paths: dict[Any, str] = {}
+
+    def _route_path(self, endpoint: Any) -> str:
+        path = self._paths.get(endpoint)
+        if path is None:
+            path = next((r.path for r in self.routes if getattr(r, "endpoint", None) is endpoint), "unmatched")
+            self._paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router writes the matched endpoint into the shared scope
+            endpoint = scope.get("endpoint")
+            route = self._route_path(endpoint) if endpoint is not None else "unmatched"
+            method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+            HTTP_REQUEST_SECONDS.labels(method, route, status).observe(time.perf_counter() - started)
@@ -0,0 +1,133 @@
+"""
+Schema migrations for HealthClaw databases.
+
+A database's schema version is its PRAGMA user_version. Migrations are
+numbered steps applied in order, each exactly once: a step and the bump of
+user_version commit in the same transaction, so an interrupted upgrade
+resumes at the step that failed. Steps must also be safe on databases that
+predate this framework (version 0 with some tables already present), so they
+check what exists instead of relying on failing statements.
+
+Steps that copy a lot of rows can do the copy in a `backfill` first: many
+short transactions of bounded size, each leaving the database resumable from
+where it stopped, so no single transaction (or WAL) grows with the data and
+an interrupted copy continues rather than starting over.
+
+Once a database is current, opening it costs a single PRAGMA read.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Sequence
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    One schema step. `apply` runs inside the migration's transaction and
+    must not commit, roll back or use executescript() (which commits).
+
+    `backfill`, if given, runs before `apply` and is called repeatedly, each
+    call in its own transaction under the same rules, until it returns
+    False. Each call should do a bounded amount of work and leave a marker
+    (e.g. rows still to copy) that the next call picks up from.
+    """
+
+    version: int
+    name: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+    backfill: Callable[[aiosqlite.Connection], Awaitable[bool]] | None = None
+
+
+async def schema_version(db: aiosqlite.Connection) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+
+async def table_exists(db: aiosqlite.Connection, name: str) -> bool:
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return await cursor.fetchone() is not None
+
+
+async def column_exists(db: aiosqlite.Connection, table: str, column: str) -> bool:
+    cursor = await db.execute("SELECT 1 FROM pragma_table_info(?) WHERE name = ?", (table, column))
+    return await cursor.fetchone() is not None
+
+
+async def migrate(db: aiosqlite.Connection, migrations: Sequence[Migration]) -> int:
+    """
+    Apply the migrations newer than the database's version. Returns the
+    number applied. Raises RuntimeError for a database written by a newer
+    schema than `migrations` knows about.
+    """
+    latest = migrations[-1].version if migrations else 0
+    version = await schema_version(db)
+    if version == latest:
+        return 0
+    if version > latest:
+        raise RuntimeError(f"Database schema version {version} is newer than this server's ({latest})")
+
+    applied = 0
+    started = time.perf_counter()
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        if db.in_transaction:
+            await db.commit()
+        step_started = time.perf_counter()
+        if migration.backfill is not None:
+            batches = await _backfill(db, migration, version)
+            if batches:
+                logger.info("Migration %d (%s) backfilled in %d batches",
+                            migration.version, migration.name, batches)
+        # IMMEDIATE takes the write lock up front, so a second process opening
+        # the same file waits here and then sees the step already applied
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            if await schema_version(db) >= migration.version:
+                await db.rollback()
+                continue
+            await migration.apply(db)
+            await db.execute(f"PRAGMA user_version = {int(migration.version)}")
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            logger.exception("Migration %d (%s) failed; database left at version %d",
+                             migration.version, migration.name, version)
+            raise
+        version = migration.version
+        applied += 1
+        logger.info("Applied migration %d (%s) in %.1f ms",
+                    migration.version, migration.name, (time.perf_counter() - step_started) * 1000)
+    if applied:
+        logger.info("Migrated database to schema version %d in %.1f ms",
+                    version, (time.perf_counter() - started) * 1000)
+    return applied
+
+
+async def _backfill(db: aiosqlite.Connection, migration: Migration, version: int) -> int:
+    """Run `migration.backfill` until it reports it is done. Returns the batches run."""
+    batches = 0
+    while True:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            if await schema_version(db) >= migration.version:
+                await db.rollback()  # another process finished the step
+                return batches
+            more = await migration.backfill(db)
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            logger.exception("Backfill of migration %d (%s) failed; database left at version %d",
+                             migration.version, migration.name, version)
+            raise
+        batches += 1
+        if not more:
+            return batches
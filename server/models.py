@@ -117,6 +117,7 @@ class NutrientDetail(BaseModel):
 
 
 class FoodItem(BaseModel):
+    item_id: Optional[int] = None  # set once stored in meal_food_items
     name: str
     portion: str
     calories: float
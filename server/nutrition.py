@@ -1,36 +1,96 @@
 """
 Nutrition analyzer for HealthClaw.
 
-Routes food analysis requests through the OpenClaw gateway using
-the sessions_send RPC, which gives us full LLM access including vision.
+Routes food analysis requests to the nutrition agent (see agent.py), which
+gives us full LLM access including vision, unless the local food table can
+answer them.
+
+Retries and double taps often resend a meal while its first analysis is
+still running. Identical requests in flight (same tenant, same normalized
+text and photo bytes) share one agent call, though each still stores its own
+meal. Requests sent with an idempotency key share the whole analysis, and a
+later retry with the key gets the stored meal back instead of a new one.
 """
 
 from __future__ import annotations
 
 import asyncio
 import base64
+import binascii
+import hashlib
 import json
+import logging
 import os
-import subprocess
-import tempfile
+import shutil
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from typing import Any
 
-from database import store_meal_entry
-from models import (
-    FoodItem,
-    NutrientDetail,
-    NutritionAnalysisResponse,
-    NutritionTotals,
-)
-
-# Full path to openclaw CLI
-OPENCLAW_BIN = os.getenv("OPENCLAW_BIN", "/home/lars/.npm-global/bin/openclaw")
-GATEWAY_TOKEN = os.getenv(
-    "OPENCLAW_GATEWAY_TOKEN",
-    "f8ac08ae67eb64d576d08214be062d2fc74c31849e8463cb",
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # preprocessing is skipped without Pillow
+    Image = ImageOps = None
+
+from config import (
+    AGENT_TIMEOUT,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_EDGE,
+    IMAGE_WORKERS,
+    LOCAL_NUTRITION,
+    LOCAL_NUTRITION_MIN_CONFIDENCE,
+    UPLOAD_DIR,
 )
+from admission import AGENT_BREAKER, AGENT_SLOTS
+from agent import get_agent
+from agent_output import parse_agent_output
+from database import get_idempotent_meal, get_meal_entry, store_meal_entry
+from fooddb import analyze_locally
+from metrics import ANALYSES_COALESCED
+from models import FoodItem, NutritionAnalysisResponse, NutritionTotals
+from singleflight import SingleFlight
+from tenants import active_tenant
+from uploads import UploadError
+
+# Base64 characters decoded per write when spooling legacy uploads (multiple of 4)
+_B64_CHUNK = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+# HealthKit sample identifier -> (nutrient name, unit) stored in meal_nutrients
+HK_NUTRIENTS = {
+    "dietaryEnergyConsumed": ("Energy", "kcal"),
+    "dietaryProtein": ("Protein", "g"),
+    "dietaryCarbohydrates": ("Carbohydrates", "g"),
+    "dietaryFatTotal": ("Fat Total", "g"),
+    "dietaryFatSaturated": ("Saturated Fat", "g"),
+    "dietaryFiber": ("Fiber", "g"),
+    "dietarySugar": ("Sugar", "g"),
+    "dietarySodium": ("Sodium", "mg"),
+    "dietaryCholesterol": ("Cholesterol", "mg"),
+    "dietaryCalcium": ("Calcium", "mg"),
+    "dietaryIron": ("Iron", "mg"),
+    "dietaryVitaminC": ("Vitamin C", "mg"),
+    "dietaryVitaminD": ("Vitamin D", "IU"),
+    "dietaryPotassium": ("Potassium", "mg"),
+    "dietaryMagnesium": ("Magnesium", "mg"),
+    "dietaryVitaminA": ("Vitamin A", "IU"),
+    "dietaryVitaminB6": ("Vitamin B6", "mg"),
+    "dietaryVitaminB12": ("Vitamin B12", "mcg"),
+    "dietaryFolate": ("Folate", "mcg"),
+    "dietaryZinc": ("Zinc", "mg"),
+}
+_HK_IDENTIFIERS = {name: ident for ident, (name, _) in HK_NUTRIENTS.items()}
+
+
+# Lazily created pool for image decode/resize work (CPU bound, holds the GIL)
+_image_pool: ProcessPoolExecutor | None = None
+
+# In-flight agent calls by (tenant, fingerprint), and whole analyses by
+# (tenant, idempotency key, fingerprint)
+_agent_calls = SingleFlight("agent_call")
+_keyed_analyses = SingleFlight("idempotency_key")
 
 ANALYSIS_PROMPT_TEMPLATE = """\
 You are a nutritionist AI. Analyze the following food description and return ONLY a JSON object — no markdown, no explanation, just raw JSON.
@@ -92,243 +152,351 @@ Return this exact JSON structure (fill in real values):
 Use your best nutritional knowledge to estimate values. Be realistic and accurate."""
 
 
-async def _call_agent(prompt: str, image_base64: str | None = None, image_mime_type: str | None = None) -> str:
+async def _call_agent(prompt: str, image_path: str | None = None, deadline: float | None = None) -> str:
+    """Get the agent's reply to `prompt` (and the food photo, if any) from the configured backend."""
+    return await get_agent().complete(prompt, image_path, deadline)
+
+
+def _spool_base64(image_base64: str, image_mime_type: str | None = None) -> str:
     """
-    Call an OpenClaw agent via CLI to get an LLM response.
-    For images: saves to a temp file and instructs the agent to use the image tool.
-    Runs in a thread pool to avoid blocking the async event loop.
+    Decode a base64 image into UPLOAD_DIR in chunks (legacy JSON upload path).
+    Returns the file path; the caller is responsible for deleting it.
+    UploadError if the data is not valid base64. Blocking; run it in a thread.
     """
-    def _run():
-        session_id = f"nutrition-{uuid.uuid4().hex[:8]}"
-        temp_image_path = None
+    ext = "png" if image_mime_type and "png" in image_mime_type else "jpg"
+    path = os.path.join(UPLOAD_DIR, f"healthclaw-food-{uuid.uuid4().hex[:8]}.{ext}")
+    # Chunks must stay 4-aligned, so strip line breaks some encoders insert
+    encoded = image_base64
+    if "\n" in encoded or "\r" in encoded or " " in encoded:
+        encoded = "".join(encoded.split())
+    try:
+        with open(path, "wb") as f:
+            for i in range(0, len(encoded), _B64_CHUNK):
+                f.write(base64.b64decode(encoded[i : i + _B64_CHUNK]))
+    except binascii.Error as e:
+        os.unlink(path)
+        raise UploadError(f"image_base64 is not valid base64: {e}") from e
+    return path
 
-        try:
-            # If image provided, save to temp file for the agent to read
-            if image_base64:
-                ext = "jpg"
-                if image_mime_type and "png" in image_mime_type:
-                    ext = "png"
-                temp_image_path = f"/tmp/healthclaw-food-{session_id}.{ext}"
-                with open(temp_image_path, "wb") as f:
-                    f.write(base64.b64decode(image_base64))
-
-                # Prepend image analysis instruction
-                prompt_with_image = (
-                    f"First, use the image tool to analyze the food photo at {temp_image_path}. "
-                    f"Then respond to this request:\n\n{prompt}"
-                )
-            else:
-                prompt_with_image = prompt
-
-            env = os.environ.copy()
-            env["OPENCLAW_GATEWAY_TOKEN"] = GATEWAY_TOKEN
-            env["PATH"] = "/home/lars/.npm-global/bin:" + env.get("PATH", "")
-
-            result = subprocess.run(
-                [
-                    OPENCLAW_BIN, "agent",
-                    "--session-id", session_id,
-                    "--json",
-                    "-m", prompt_with_image,
-                    "--timeout", "120",
-                ],
-                capture_output=True,
-                text=True,
-                env=env,
-                timeout=150,
-            )
 
-            if result.returncode != 0:
-                raise RuntimeError(f"Agent call failed (code {result.returncode}): {result.stderr[:500]}")
-
-            output = result.stdout.strip()
-            try:
-                data = json.loads(output)
-                result_obj = data.get("result", data)
-                payloads = result_obj.get("payloads", [])
-                if payloads:
-                    return payloads[0].get("text", output)
-                payloads = data.get("payloads", [])
-                if payloads:
-                    return payloads[0].get("text", output)
-                return output
-            except json.JSONDecodeError:
-                return output
-        finally:
-            # Clean up temp image
-            if temp_image_path and os.path.exists(temp_image_path):
-                os.unlink(temp_image_path)
+def _shrink_image(src: str, dst: str, max_edge: int, quality: int) -> tuple[int, int, tuple, tuple]:
+    """
+    Decode `src`, apply EXIF orientation, fit it within `max_edge` and write it
+    to `dst` as a JPEG without metadata. Runs inside the image process pool.
+    Returns (src_bytes, dst_bytes, src_size, dst_size).
+    """
+    with Image.open(src) as img:
+        src_size = img.size
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+        img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        # No exif= argument, so EXIF (including GPS) is dropped
+        img.save(dst, "JPEG", quality=quality)
+        dst_size = img.size
+    return os.path.getsize(src), os.path.getsize(dst), src_size, dst_size
+
+
+async def _preprocess_image(image_path: str) -> str:
+    """
+    Downscale and recompress a food photo before it goes to the vision model.
+    Returns the path of the new file, or `image_path` itself if preprocessing
+    is disabled or the image can't be decoded.
+    """
+    global _image_pool
+    if Image is None or IMAGE_MAX_EDGE <= 0:
+        return image_path
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+    dst = os.path.join(UPLOAD_DIR, f"healthclaw-food-{uuid.uuid4().hex[:8]}-prep.jpg")
+    loop = asyncio.get_running_loop()
+    try:
+        src_bytes, dst_bytes, src_size, dst_size = await loop.run_in_executor(
+            _image_pool, _shrink_image, image_path, dst, IMAGE_MAX_EDGE, IMAGE_JPEG_QUALITY,
+        )
+    except Exception as e:
+        logger.warning("Image preprocessing failed, sending original: %s", e)
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return image_path
+
+    logger.info(
+        "Preprocessed food photo %dx%d -> %dx%d, %d -> %d bytes (%.0f%% smaller)",
+        src_size[0], src_size[1], dst_size[0], dst_size[1], src_bytes, dst_bytes,
+        100 * (1 - dst_bytes / src_bytes) if src_bytes else 0,
+    )
+    return dst
+
+
+def shutdown_image_pool() -> None:
+    """Stop the image worker processes (called on server shutdown)."""
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _run)
 
+def _hash_request(text: str, image_path: str | None) -> str:
+    digest = hashlib.sha256(" ".join(text.split()).casefold().encode())
+    if image_path:
+        digest.update(b"\0")
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
 
-def _extract_json(text: str) -> dict:
-    """Extract JSON object from agent response text."""
-    text = text.strip()
 
-    # Try direct parse first
+async def request_fingerprint(text: str, image_path: str | None = None) -> str:
+    """
+    Hash of what the analysis depends on: the text with case and whitespace
+    normalized, and the photo's bytes.
+    """
+    if image_path:
+        return await asyncio.to_thread(_hash_request, text or "", image_path)
+    return _hash_request(text or "", None)
+
+
+def _hold_image(image_path: str, dst: str) -> None:
+    """
+    Link (or copy) a caller's photo to `dst`, a path owned by a shared
+    analysis, so it survives the request that started it going away.
+    Blocking; run it in a thread.
+    """
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Try to find JSON block between ```json ... ``` or { ... }
-    if "```json" in text:
-        start = text.index("```json") + 7
-        end = text.index("```", start)
-        try:
-            return json.loads(text[start:end].strip())
-        except (json.JSONDecodeError, ValueError):
-            pass
+        os.link(image_path, dst)
+    except OSError:
+        shutil.copyfile(image_path, dst)
 
-    if "```" in text:
-        start = text.index("```") + 3
-        end = text.index("```", start)
-        try:
-            return json.loads(text[start:end].strip())
-        except (json.JSONDecodeError, ValueError):
-            pass
-
-    # Find the outermost { ... }
-    brace_start = text.find("{")
-    brace_end = text.rfind("}")
-    if brace_start != -1 and brace_end != -1:
-        try:
-            return json.loads(text[brace_start : brace_end + 1])
-        except json.JSONDecodeError:
-            pass
 
-    raise ValueError(f"Could not extract JSON from agent response: {text[:300]}")
+async def _run_shared(flight: SingleFlight, key: tuple, image_path: str | None, work) -> Any:
+    """
+    Result of `flight.run(key, ...)` where the shared call is `work(path)`.
+    With a photo, `path` is a copy held before handing off, so the call never
+    reads a file the starting request may already have deleted; it is removed
+    when the call ends, or right away if another call for `key` was running.
+    """
+    if not image_path:
+        return await flight.run(key, lambda: work(None))
+    held = os.path.join(UPLOAD_DIR, f"healthclaw-food-{uuid.uuid4().hex[:8]}-shared{os.path.splitext(image_path)[1]}")
+    started = False
+
+    def start():
+        nonlocal started
+        started = True
+        return _owning_image(held, work(held))
+
+    try:
+        await asyncio.to_thread(_hold_image, image_path, held)
+        return await flight.run(key, start)
+    finally:
+        if not started and os.path.exists(held):
+            os.unlink(held)
+
+
+async def _owning_image(image_path: str | None, coro):
+    """Await `coro`, then delete `image_path`."""
+    try:
+        return await coro
+    finally:
+        if image_path and os.path.exists(image_path):
+            os.unlink(image_path)
 
 
 async def analyze_nutrition(
     text: str,
     image_base64: str | None = None,
     image_mime_type: str | None = None,
+    image_path: str | None = None,
+    idempotency_key: str | None = None,
 ) -> NutritionAnalysisResponse:
     """
     Analyze food from text description (and optional image) using Claude.
+    The image is either an already spooled file (`image_path`, owned by the
+    caller) or legacy base64 data, which is spooled here and removed after.
     Stores the result in the database and returns a structured response.
+    With `idempotency_key`, repeats of the request return the same meal;
+    IdempotencyConflict if the key was used for a different request.
     """
+    if image_base64 and not image_path:
+        spooled_path = await asyncio.to_thread(_spool_base64, image_base64, image_mime_type)
+        try:
+            return await analyze_nutrition(text, image_path=spooled_path, idempotency_key=idempotency_key)
+        finally:
+            if os.path.exists(spooled_path):
+                os.unlink(spooled_path)
+
+    fingerprint = await request_fingerprint(text, image_path)
+    if not idempotency_key:
+        return await _analyze(text, image_path, fingerprint)
+
+    return await _run_shared(
+        _keyed_analyses, (active_tenant(), idempotency_key, fingerprint), image_path,
+        lambda held: _analyze_once(text, held, fingerprint, idempotency_key),
+    )
+
+
+async def _analyze_once(text: str, image_path: str | None, fingerprint: str, key: str) -> NutritionAnalysisResponse:
+    """Analyze and store under `key`, unless a meal is already stored under it."""
+    meal_id = await get_idempotent_meal(key, fingerprint)
+    if meal_id is not None:
+        stored = await _stored_response(meal_id)
+        if stored is not None:
+            ANALYSES_COALESCED.labels("replayed").inc()
+            return stored
+    return await _analyze(text, image_path, fingerprint, key)
+
+
+async def _analyze(
+    text: str,
+    image_path: str | None,
+    fingerprint: str,
+    idempotency_key: str | None = None,
+) -> NutritionAnalysisResponse:
     now = datetime.now(timezone.utc)
-    date_str = now.strftime("%Y-%m-%d")
-    timestamp_str = now.isoformat()
+    stored_as = {"idempotency_key": idempotency_key, "fingerprint": fingerprint}
+
+    # Simple text meals can be answered from the local food table
+    if not image_path and LOCAL_NUTRITION:
+        started = time.perf_counter()
+        local = analyze_locally(text, LOCAL_NUTRITION_MIN_CONFIDENCE)
+        if local is not None:
+            logger.info(
+                "Resolved meal locally in %.1f ms (confidence %.2f)",
+                (time.perf_counter() - started) * 1000, local.confidence,
+            )
+            return await _store_analysis(
+                now=now,
+                description=local.description,
+                food_items=local.food_items,
+                totals=local.totals,
+                healthkit_samples=local.healthkit_samples,
+                analysis_json=json.dumps({
+                    "source": "local",
+                    "confidence": local.confidence,
+                    "matches": local.matches,
+                    "missing_nutrients": local.missing_nutrients,
+                }),
+                **stored_as,
+            )
 
     # Build the analysis prompt
     prompt = ANALYSIS_PROMPT_TEMPLATE.format(description=text)
 
     # If an image was provided, adjust the description
-    if image_base64:
+    if image_path:
         if text and text.strip():
             description = f"{text} (also see the attached food photo for details)"
         else:
             description = "See the attached food photo. Identify all visible food items and estimate portions."
         prompt = ANALYSIS_PROMPT_TEMPLATE.format(description=description)
 
-    # Call agent (handles both text-only and image analysis)
-    raw_response = await _call_agent(prompt, image_base64, image_mime_type)
-
-    # Parse the structured JSON
-    data = _extract_json(raw_response)
-
-    # Build food items
-    food_items: list[FoodItem] = []
-    for item in data.get("food_items", []):
-        nutrients = [
-            NutrientDetail(
-                name=n.get("name", ""),
-                amount=float(n.get("amount", 0)),
-                unit=n.get("unit", ""),
-                daily_value_pct=n.get("daily_value_pct"),
-            )
-            for n in item.get("nutrients", [])
-        ]
-        food_items.append(
-            FoodItem(
-                name=item.get("name", "Unknown"),
-                portion=item.get("portion", ""),
-                calories=float(item.get("calories", 0)),
-                protein_g=float(item.get("protein_g", 0)),
-                carbs_g=float(item.get("carbs_g", 0)),
-                fat_g=float(item.get("fat_g", 0)),
-                fiber_g=float(item.get("fiber_g", 0)),
-                sugar_g=float(item.get("sugar_g", 0)),
-                sodium_mg=float(item.get("sodium_mg", 0)),
-                nutrients=nutrients,
-            )
-        )
+    raw_response = await _run_shared(
+        _agent_calls, (active_tenant(), fingerprint), image_path, lambda held: _agent_analysis(prompt, held),
+    )
 
-    # Build totals
-    totals_raw = data.get("totals", {})
-    totals = NutritionTotals(
-        calories=float(totals_raw.get("calories", 0)),
-        protein_g=float(totals_raw.get("protein_g", 0)),
-        carbs_g=float(totals_raw.get("carbs_g", 0)),
-        fat_g=float(totals_raw.get("fat_g", 0)),
-        fiber_g=float(totals_raw.get("fiber_g", 0)),
-        sugar_g=float(totals_raw.get("sugar_g", 0)),
-        sodium_mg=float(totals_raw.get("sodium_mg", 0)),
+    # Parse and validate the structured JSON in one pass
+    result = parse_agent_output(raw_response)
+
+    return await _store_analysis(
+        now=now,
+        description=result.description or text,
+        food_items=result.food_items,
+        totals=result.totals,
+        healthkit_samples=[sample.model_dump() for sample in result.healthkit_samples],
+        analysis_json=raw_response,
+        **stored_as,
     )
 
-    healthkit_samples: list[dict[str, Any]] = data.get("healthkit_samples", [])
-    description = data.get("description", text)
 
+async def _agent_analysis(prompt: str, image_path: str | None) -> str:
+    """Raw agent reply for `prompt` and the photo at `image_path`, if any."""
+    AGENT_BREAKER.check()  # fail fast rather than queue for a slot while the agent is down
+    # The time budget starts at admission, so queueing and preprocessing count against it
+    deadline = asyncio.get_running_loop().time() + AGENT_TIMEOUT
+    # The slot covers preprocessing too, so photos are not resized for calls that get shed
+    async with AGENT_SLOTS.slot():
+        agent_image_path = await _preprocess_image(image_path) if image_path else None
+        try:
+            return await _call_agent(prompt, agent_image_path, deadline)
+        finally:
+            if agent_image_path and agent_image_path != image_path and os.path.exists(agent_image_path):
+                os.unlink(agent_image_path)
+
+
+async def _stored_response(meal_id: int) -> NutritionAnalysisResponse | None:
+    """The analysis response for a stored meal, as it is now; None if it was deleted."""
+    meal = await get_meal_entry(meal_id)
+    if meal is None:
+        return None
+    food_items = [FoodItem.model_validate(item) for item in meal["food_items"]]
+    return NutritionAnalysisResponse(
+        meal_id=meal_id,
+        timestamp=meal["timestamp"],
+        description=meal["description"],
+        food_items=food_items,
+        totals=NutritionTotals(
+            calories=meal["total_calories"] or 0,
+            protein_g=meal["total_protein_g"] or 0,
+            carbs_g=meal["total_carbs_g"] or 0,
+            fat_g=meal["total_fat_g"] or 0,
+            fiber_g=sum(item.fiber_g for item in food_items),
+            sugar_g=sum(item.sugar_g for item in food_items),
+            sodium_mg=sum(item.sodium_mg for item in food_items),
+        ),
+        healthkit_samples=[
+            {"identifier": _HK_IDENTIFIERS[n["nutrient_name"]], "value": n["amount"], "unit": n["unit"]}
+            for n in meal["nutrients"]
+            if n["nutrient_name"] in _HK_IDENTIFIERS
+        ],
+    )
+
+
+async def _store_analysis(
+    now: datetime,
+    description: str,
+    food_items: list[FoodItem],
+    totals: NutritionTotals,
+    healthkit_samples: list[dict[str, Any]],
+    analysis_json: str,
+    idempotency_key: str | None = None,
+    fingerprint: str = "",
+) -> NutritionAnalysisResponse:
+    """Persist an analyzed meal and build the API response."""
     # Flatten all nutrients for DB storage
     all_nutrients: list[dict] = []
-    hk_name_map = {
-        "dietaryEnergyConsumed": ("Energy", "kcal"),
-        "dietaryProtein": ("Protein", "g"),
-        "dietaryCarbohydrates": ("Carbohydrates", "g"),
-        "dietaryFatTotal": ("Fat Total", "g"),
-        "dietaryFatSaturated": ("Saturated Fat", "g"),
-        "dietaryFiber": ("Fiber", "g"),
-        "dietarySugar": ("Sugar", "g"),
-        "dietarySodium": ("Sodium", "mg"),
-        "dietaryCholesterol": ("Cholesterol", "mg"),
-        "dietaryCalcium": ("Calcium", "mg"),
-        "dietaryIron": ("Iron", "mg"),
-        "dietaryVitaminC": ("Vitamin C", "mg"),
-        "dietaryVitaminD": ("Vitamin D", "IU"),
-        "dietaryPotassium": ("Potassium", "mg"),
-        "dietaryMagnesium": ("Magnesium", "mg"),
-        "dietaryVitaminA": ("Vitamin A", "IU"),
-        "dietaryVitaminB6": ("Vitamin B6", "mg"),
-        "dietaryVitaminB12": ("Vitamin B12", "mcg"),
-        "dietaryFolate": ("Folate", "mcg"),
-        "dietaryZinc": ("Zinc", "mg"),
-    }
-
     for sample in healthkit_samples:
         ident = sample.get("identifier", "")
-        if ident in hk_name_map:
-            name, unit = hk_name_map[ident]
+        if ident in HK_NUTRIENTS:
+            name, unit = HK_NUTRIENTS[ident]
             all_nutrients.append({
                 "name": name,
                 "amount": float(sample.get("value", 0)),
                 "unit": unit,
             })
 
-    # Store in DB
-    food_items_json_str = json.dumps(data.get("food_items", []))
-    meal_id = await store_meal_entry(
-        date=date_str,
-        timestamp=timestamp_str,
+    meal_id, item_ids = await store_meal_entry(
+        date=now.strftime("%Y-%m-%d"),
+        timestamp=now.isoformat(),
         description=description,
-        analysis_json=raw_response,
+        analysis_json=analysis_json,
         total_calories=totals.calories,
         total_protein_g=totals.protein_g,
         total_carbs_g=totals.carbs_g,
         total_fat_g=totals.fat_g,
         nutrients=all_nutrients,
-        food_items_json=food_items_json_str,
+        food_items=food_items,
+        idempotency_key=idempotency_key,
+        fingerprint=fingerprint,
     )
 
     return NutritionAnalysisResponse(
         meal_id=meal_id,
         timestamp=now,
         description=description,
-        food_items=food_items,
+        food_items=[item.model_copy(update={"item_id": i}) for item, i in zip(food_items, item_ids)],
         totals=totals,
         healthkit_samples=healthkit_samples,
     )
@@ -0,0 +1,203 @@
+"""
+Slow-query log for HealthClaw.
+
+Pooled connections are wrapped so every statement is timed, from execute()
+through its last fetch. A statement that crosses SLOW_QUERY_MS is recorded in
+a ring buffer together with the shapes of its bound parameters (types and
+lengths, never values) and its EXPLAIN QUERY PLAN, captured on the same
+connection at that moment. /api/admin/slow-queries serves the buffer.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+import aiosqlite
+
+from config import SLOW_QUERY_LOG_SIZE, SLOW_QUERY_MS
+from metrics import DB_SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+
+def _shape(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shapes(params: Any) -> Any:
+    """Types (and lengths for text/blobs) of bound parameters."""
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {k: _shape(v) for k, v in params.items()}
+    return [_shape(v) for v in params]
+
+
+def plan_lines(rows: list) -> list[str]:
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as an indented tree."""
+    depth: dict[int, int] = {0: -1}
+    lines = []
+    for row in rows:
+        node, parent, detail = row[0], row[1], row[3]
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t USING INDEX ..." walks an index and virtual tables (FTS) plan their own lookups
+    return (
+        detail.startswith("SCAN ")
+        and " USING " not in detail
+        and "VIRTUAL TABLE" not in detail
+        and detail != "SCAN CONSTANT ROW"
+    )
+
+
+class SlowQueryLog:
+    """Ring buffer of the most recent slow statements, across tenants."""
+
+    def __init__(self, threshold_ms: float, size: int):
+        self.threshold = threshold_ms / 1000
+        self.threshold_ms = threshold_ms
+        self.entries: deque[dict] = deque(maxlen=size)
+
+    async def record(
+        self, db: aiosqlite.Connection, tenant: str, caller: str,
+        sql: str, params: Any, shapes: Any, seconds: float,
+    ) -> dict:
+        try:
+            cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())
+            plan = plan_lines(await cursor.fetchall())
+        except sqlite3.Error as e:
+            plan = [f"unavailable: {e}"]
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "tenant": tenant,
+            "caller": caller,
+            "duration_ms": round(seconds * 1000, 2),
+            "sql": " ".join(sql.split()),
+            "params": shapes,
+            "plan": plan,
+            # Table scans without an index are what usually makes a query slow
+            "full_scans": [line.strip() for line in plan if is_full_scan(line.strip())],
+        }
+        self.entries.append(entry)
+        DB_SLOW_QUERIES.labels(caller).inc()
+        logger.warning("Slow query in %s (%.1f ms): %s", caller, entry["duration_ms"], entry["sql"][:200])
+        return entry
+
+    def recent(self, tenant: str | None = None, limit: int | None = None) -> list[dict]:
+        """Newest first, optionally only one tenant's."""
+        entries = [e for e in reversed(self.entries) if tenant is None or e["tenant"] == tenant]
+        return entries[:limit] if limit is not None else entries
+
+
+class _TimedCursor:
+    """Cursor wrapper that keeps adding fetch time to its statement's total."""
+
+    __slots__ = ("_cursor", "_statement")
+
+    def __init__(self, cursor: aiosqlite.Cursor, statement: "_Statement"):
+        self._cursor = cursor
+        self._statement = statement
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    async def fetchone(self):
+        started = time.perf_counter()
+        row = await self._cursor.fetchone()
+        await self._statement.add(time.perf_counter() - started)
+        return row
+
+    async def fetchmany(self, size: int | None = None):
+        started = time.perf_counter()
+        rows = await (self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+        await self._statement.add(time.perf_counter() - started)
+        return rows
+
+    async def fetchall(self):
+        started = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        await self._statement.add(time.perf_counter() - started)
+        return rows
+
+
+class _Statement:
+    __slots__ = ("conn", "caller", "sql", "params", "shapes", "seconds", "entry")
+
+    def __init__(self, conn: "InstrumentedConnection", caller: str, sql: str, params: Any, shapes: Any = None):
+        self.conn = conn
+        self.caller = caller
+        self.sql = sql
+        self.params = params
+        self.shapes = shapes
+        self.seconds = 0.0
+        self.entry: dict | None = None
+
+    async def add(self, seconds: float) -> None:
+        self.seconds += seconds
+        if self.entry is not None:
+            self.entry["duration_ms"] = round(self.seconds * 1000, 2)
+        elif self.seconds >= self.conn._log.threshold:
+            shapes = self.shapes if self.shapes is not None else param_shapes(self.params)
+            self.entry = await self.conn._log.record(
+                self.conn._db, self.conn._tenant, self.caller, self.sql, self.params, shapes, self.seconds
+            )
+
+
+class InstrumentedConnection:
+    """aiosqlite connection wrapper timing execute()/executemany() and their fetches."""
+
+    __slots__ = ("_db", "_tenant", "_log")
+
+    def __init__(self, db: aiosqlite.Connection, tenant: str, log: SlowQueryLog):
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_tenant", tenant)
+        object.__setattr__(self, "_log", log)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._db, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._db, name, value)  # row_factory and friends belong to the real connection
+
+    async def execute(self, sql: str, parameters: Any = None) -> _TimedCursor:
+        statement = _Statement(self, sys._getframe(1).f_code.co_name, sql, parameters)
+        started = time.perf_counter()
+        cursor = await self._db.execute(sql, parameters)
+        await statement.add(time.perf_counter() - started)
+        return _TimedCursor(cursor, statement)
+
+    async def executemany(self, sql: str, parameters: Iterable[Any]) -> aiosqlite.Cursor:
+        rows = parameters if isinstance(parameters, (list, tuple)) else list(parameters)
+        first = rows[0] if rows else None
+        statement = _Statement(
+            self, sys._getframe(1).f_code.co_name, sql, first,
+            {"rows": len(rows), "first": param_shapes(first)},
+        )
+        started = time.perf_counter()
+        cursor = await self._db.executemany(sql, rows)
+        await statement.add(time.perf_counter() - started)
+        return cursor
+
+
+SLOW_QUERIES = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE) if SLOW_QUERY_MS >= 0 else None
+
+
+def instrument(db: aiosqlite.Connection, tenant: str) -> aiosqlite.Connection:
+    """Wrap a pooled connection for the slow-query log (as-is when it is disabled)."""
+    if SLOW_QUERIES is None:
+        return db
+    return InstrumentedConnection(db, tenant, SLOW_QUERIES)
@@ -0,0 +1,45 @@
+"""
+Request coalescing: concurrent calls with the same key share one execution.
+
+The first caller for a key starts the work as a task; callers arriving while
+it runs await that same task instead of starting their own. The key is
+forgotten as soon as the task finishes, so nothing is cached afterwards.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from metrics import ANALYSES_COALESCED
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, start: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of the in-flight call for `key`, calling `start()` to begin one
+        if there is none. The shared task keeps running if a caller is
+        cancelled, so the others still get their result.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(start())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            ANALYSES_COALESCED.labels(self.name).inc()
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so callers that left don't trigger "never retrieved" warnings
@@ -0,0 +1,94 @@
+"""
+Tenant resolution for HealthClaw.
+
+Every API key belongs to one tenant and every tenant keeps its data in its
+own SQLite file. The legacy HEALTHCLAW_API_KEY maps to the "default" tenant
+stored at DB_PATH, so single-user installs keep working unchanged.
+
+Tenants file (HEALTHCLAW_TENANTS_FILE):
+
+    {"<api key>": "alice", "<another key>": "bob"}
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+from config import API_KEY, DB_PATH, TENANT_DB_DIR, TENANTS_FILE
+
+DEFAULT_TENANT = "default"
+
+# Tenant ids become file names, so keep them to a safe alphabet
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Tenant of the request being served; set by main.verify_api_key or use_tenant.
+# No default: code outside both must name its tenant, not fall into "default".
+current_tenant: ContextVar[str] = ContextVar("healthclaw_tenant")
+
+
+class TenantError(ValueError):
+    """Invalid tenant id or tenants file, or no tenant set."""
+
+
+def active_tenant() -> str:
+    """The current tenant; raises TenantError when none is set."""
+    try:
+        return current_tenant.get()
+    except LookupError:
+        raise TenantError("No tenant set; run this under use_tenant() or an authenticated request") from None
+
+
+@lru_cache(maxsize=1)
+def api_keys() -> dict[str, str]:
+    """API key -> tenant id, loaded once from the environment and TENANTS_FILE."""
+    keys: dict[str, str] = {}
+    # With a tenants file the built-in default key only counts if set explicitly
+    if not TENANTS_FILE or "HEALTHCLAW_API_KEY" in os.environ:
+        keys[API_KEY] = DEFAULT_TENANT
+    if TENANTS_FILE:
+        with open(TENANTS_FILE) as f:
+            mapping = json.load(f)
+        if not isinstance(mapping, dict):
+            raise TenantError(f"{TENANTS_FILE} must contain a JSON object of api key -> tenant id")
+        for key, tenant in mapping.items():
+            validate_tenant(tenant)
+            keys[key] = tenant
+    return keys
+
+
+def tenant_for_key(api_key: str) -> str | None:
+    return api_keys().get(api_key)
+
+
+def known_tenants() -> list[str]:
+    return sorted(set(api_keys().values()))
+
+
+def validate_tenant(tenant: str) -> str:
+    if not isinstance(tenant, str) or not _TENANT_ID.match(tenant):
+        raise TenantError(f"Invalid tenant id: {tenant!r}")
+    return tenant
+
+
+def db_path_for(tenant: str) -> Path:
+    """SQLite file holding `tenant`'s data."""
+    if tenant == DEFAULT_TENANT:
+        return DB_PATH
+    return TENANT_DB_DIR / f"{validate_tenant(tenant)}.db"
+
+
+@contextmanager
+def use_tenant(tenant: str) -> Iterator[None]:
+    """Run a block (e.g. a maintenance command) against `tenant`'s database."""
+    token = current_tenant.set(validate_tenant(tenant))
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
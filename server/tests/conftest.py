@@ -0,0 +1,62 @@
+"""
+Shared fixtures. Settings are read when config is imported, so the scratch
+environment is set up here, before any server module is loaded.
+"""
+
+import os
+import tempfile
+import uuid
+
+_SCRATCH = tempfile.mkdtemp(prefix="healthclaw-tests-")
+os.environ.update({
+    "HEALTHCLAW_DB": os.path.join(_SCRATCH, "default.db"),
+    "HEALTHCLAW_TENANT_DB_DIR": os.path.join(_SCRATCH, "tenants"),
+    "HEALTHCLAW_ANALYTICS_DIR": os.path.join(_SCRATCH, "analytics"),
+    "HEALTHCLAW_UPLOAD_DIR": _SCRATCH,
+    "HEALTHCLAW_API_KEY": "test",
+    "HEALTHCLAW_AGENT_BACKEND": "simulated",
+    "HEALTHCLAW_SIM_AGENT_LATENCY_MS": "0",
+    "HEALTHCLAW_SIM_AGENT_JITTER_MS": "0",
+    "HEALTHCLAW_ANALYTICS_BACKEND": "sqlite",
+    "HEALTHCLAW_LOG_LEVEL": "ERROR",
+})
+os.environ.pop("HEALTHCLAW_TENANTS_FILE", None)
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+import tenants  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def tenant(monkeypatch):
+    """
+    A fresh tenant (and so a fresh database) made current for the test. Open
+    connections are closed afterwards; their threads would keep the test
+    process alive.
+    """
+    from database import close_pool
+
+    name = f"t{uuid.uuid4().hex[:12]}"
+    monkeypatch.setitem(tenants.api_keys(), f"key-{name}", name)
+    with tenants.use_tenant(name):
+        yield name
+    await close_pool()
+
+
+@pytest.fixture
+async def client(tenant):
+    """HTTP client for the app, authenticated as `tenant`."""
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test", headers={"X-API-Key": f"key-{tenant}"},
+        ) as c:
+            yield c
@@ -0,0 +1,122 @@
+import asyncio
+import types
+
+import pytest
+
+import admission
+import main
+import nutrition
+from admission import ConcurrencyLimiter, Overloaded, RateLimited, RateLimiter, TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    # Only admission's view of time; the event loop keeps the real clock
+    monkeypatch.setattr(admission, "time", types.SimpleNamespace(monotonic=c.monotonic, perf_counter=c.monotonic))
+    return c
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=0.5, burst=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == pytest.approx(2.0)
+    clock.now += 1
+    assert bucket.take() == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.take() == 0
+    clock.now += 60
+    assert [bucket.take() == 0 for _ in range(3)] == [True, True, False]  # refills up to the burst only
+
+
+def test_rate_limiter_is_per_key(clock):
+    limiter = RateLimiter(per_minute=6, burst=1, max_keys=2)
+    limiter.check("a")
+    limiter.check("b")
+    with pytest.raises(RateLimited) as rejected:
+        limiter.check("a")
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after == pytest.approx(10)
+    assert rejected.value.retry_after_header == "10"
+
+    limiter.check("c")  # drops "b", the least recently used key
+    limiter.check("b")  # a dropped key starts with a full bucket
+
+
+def test_zero_rate_is_unlimited():
+    limiter = RateLimiter(per_minute=0, burst=1)
+    for _ in range(100):
+        limiter.check("a")
+
+
+async def test_waiters_get_slots_in_order():
+    limiter = ConcurrencyLimiter(limit=1, queue_size=2, timeout=1)
+    order = []
+
+    async def use(name: str) -> None:
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async with limiter.slot():
+        tasks = [asyncio.create_task(use(n)) for n in ("first", "second")]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+        with pytest.raises(Overloaded, match="capacity"):
+            async with limiter.slot():
+                pass
+    await asyncio.gather(*tasks)
+    assert order == ["first", "second"]
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+async def test_queue_wait_times_out():
+    limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=0.02)
+    async with limiter.slot():
+        with pytest.raises(Overloaded, match="Timed out") as rejected:
+            async with limiter.slot():
+                pass
+    assert rejected.value.retry_after > 0
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=1)
+
+    async def wait() -> None:
+        async with limiter.slot():
+            pass
+
+    async with limiter.slot():
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.waiting == 0
+    assert limiter.active == 0
+
+
+async def test_rejections_are_429_and_503_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(main, "ANALYZE_RATE_LIMITER", RateLimiter(per_minute=1, burst=1))
+    slots = ConcurrencyLimiter(limit=1, queue_size=0, timeout=1)
+    monkeypatch.setattr(nutrition, "AGENT_SLOTS", slots)
+    meal = {"text": "grandma's mystery stew"}
+
+    async with slots.slot():  # the agent is busy and nothing may queue
+        shed = await client.post("/api/nutrition/analyze", json=meal)
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= 1
+
+    limited = await client.post("/api/nutrition/analyze", json=meal)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 59
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import agent
+from admission import CircuitBreaker, CircuitOpen, ConcurrencyLimiter
+from agent import AgentBackend, AgentError, AgentTimeout
+
+pytestmark = pytest.mark.anyio
+
+
+class ScriptedBackend(AgentBackend):
+    """Attempt n sleeps delays[n] and then answers f"reply {n}", or fails when that delay is None."""
+
+    def __init__(self, delays: list[float | None], hedge_after: float | None = 0.05):
+        super().__init__()
+        self.delays = delays
+        self.hedge_after = hedge_after
+        self.started = 0
+        self.cancelled = 0
+        self.deadlines = []
+
+    def hedge_delay(self) -> float | None:
+        return self.hedge_after
+
+    async def attempt(self, prompt: str, image_path: str | None, deadline: float) -> str:
+        n = self.started
+        self.deadlines.append(deadline)
+        self.started += 1
+        delay = self.delays[n]
+        try:
+            await asyncio.sleep(delay or 0)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if delay is None:
+            raise AgentError(f"attempt {n} failed")
+        return f"reply {n}"
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    limiter = ConcurrencyLimiter(2, 0, 1)
+    monkeypatch.setattr(agent, "AGENT_SLOTS", limiter)
+    return limiter
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker(2, 0.05)
+    monkeypatch.setattr(agent, "AGENT_BREAKER", b)
+    return b
+
+
+async def test_breaker_opens_probes_and_closes():
+    b = CircuitBreaker(2, 0.05)
+    b.record_failure()
+    assert b.state == "closed"
+    b.record_failure()
+    assert b.state == "open"
+    with pytest.raises(CircuitOpen):
+        b.check()
+
+    await asyncio.sleep(0.06)
+    assert b.state == "half_open"
+    async with b.call():
+        # One probe at a time
+        with pytest.raises(CircuitOpen):
+            async with b.call():
+                pass
+        b.record_failure()
+    assert b.state == "open"
+
+    await asyncio.sleep(0.06)
+    async with b.call():
+        b.record_success()
+    assert b.status() == {"state": "closed", "consecutive_failures": 0, "retry_after_seconds": 0.0}
+
+
+async def test_slow_primary_is_hedged_and_killed(slots, breaker):
+    backend = ScriptedBackend([1.0, 0.0])
+    async with slots.slot():  # the primary's slot, as nutrition._agent_analysis holds it
+        assert await backend.complete("prompt") == "reply 1"
+        assert slots.active == 1
+    assert (backend.started, backend.cancelled) == (2, 1)
+    assert slots.active == 0
+    assert breaker.consecutive_failures == 0
+
+
+async def test_hedge_shares_the_primary_deadline(slots, breaker):
+    backend = ScriptedBackend([1.0, 0.0])
+    deadline = asyncio.get_running_loop().time() + 5
+    async with slots.slot():
+        assert await backend.complete("prompt", deadline=deadline) == "reply 1"
+    assert backend.deadlines == [deadline, deadline]
+
+
+@pytest.mark.parametrize("left, expected", [(150.5, 120), (100.5, 80), (20.5, 16), (0.5, 1), (-1, 1)])
+async def test_cli_timeout_leaves_a_margin(left, expected):
+    assert agent._cli_timeout(asyncio.get_running_loop().time() + left) == expected
+
+
+async def test_cli_gets_the_time_left(monkeypatch, tmp_path):
+    cli = tmp_path / "openclaw"
+    cli.write_text('#!/bin/sh\necho "$@"\n')
+    cli.chmod(0o755)
+    monkeypatch.setattr(agent, "OPENCLAW_BIN", str(cli))
+    reply = await agent.OpenClawBackend().attempt("prompt", None, asyncio.get_running_loop().time() + 60.5)
+    assert reply.split("--timeout ")[1] == "48"
+
+
+async def test_hedge_is_skipped_without_a_free_slot(slots, breaker):
+    backend = ScriptedBackend([0.1])
+    async with slots.slot(), slots.slot():
+        assert await backend.complete("prompt") == "reply 0"
+    assert backend.started == 1
+
+
+async def test_hedge_slot_is_released_when_both_attempts_fail(slots, breaker):
+    backend = ScriptedBackend([None, None], hedge_after=0)
+    async with slots.slot():
+        with pytest.raises(AgentError, match="attempt 1 failed"):
+            await backend.complete("prompt")
+    assert slots.active == 0
+    assert breaker.consecutive_failures == 1
+
+
+async def test_budget_counts_from_admission(slots, breaker):
+    backend = ScriptedBackend([0.0])
+    deadline = asyncio.get_running_loop().time() - 1  # spent waiting for a slot
+    with pytest.raises(AgentTimeout):
+        await backend.complete("prompt", deadline=deadline)
+    assert backend.started == 0
+    assert breaker.consecutive_failures == 0  # not held against the agent
+
+    started = time.monotonic()
+    backend = ScriptedBackend([1.0], hedge_after=None)
+    with pytest.raises(AgentTimeout):
+        await backend.complete("prompt", deadline=asyncio.get_running_loop().time() + 0.05)
+    assert time.monotonic() - started < 0.5
+    assert breaker.consecutive_failures == 1
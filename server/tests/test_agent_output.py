@@ -0,0 +1,80 @@
+import pytest
+
+from agent_output import AgentOutputError, _to_number, find_json_span, parse_agent_output, repair_json
+
+MEAL = '{"description": "Toast", "food_items": [{"name": "Toast", "calories": 80}], "totals": {"calories": 80}}'
+
+
+@pytest.mark.parametrize("value, expected", [
+    (12, 12),
+    ("12 g", 12.0),
+    ("~150 kcal", 150.0),
+    ("1,200", 1200.0),
+    ("2,5 mg", 2.5),
+    ("-3", -3.0),
+    (".5 cup", 0.5),
+    (None, 0.0),
+    ("", 0.0),
+    ("trace", 0.0),
+])
+def test_llm_numbers_are_coerced(value, expected):
+    assert _to_number(value) == expected
+
+
+@pytest.mark.parametrize("text, span", [
+    ('{"a": 1}', '{"a": 1}'),
+    ('Here you go: {"a": {"b": 2}} Enjoy! {"c": 3}', '{"a": {"b": 2}}'),
+    ('{"a": "} not a brace {"} trailing', '{"a": "} not a brace {"}'),
+    ('{"a": "quote \\" and }"}', '{"a": "quote \\" and }"}'),
+    ('{"a": {"b": 1} ... }', '{"a": {"b": 1} ... }'),  # truncated objects run to the last "}"
+])
+def test_json_span(text, span):
+    start, end = find_json_span(text)
+    assert text[start:end] == span
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"a": "unterminated'])
+def test_missing_json_span_raises(text):
+    with pytest.raises(AgentOutputError):
+        find_json_span(text)
+
+
+@pytest.mark.parametrize("span, repaired", [
+    ('{"a": [1, 2,], }', '{"a": [1, 2] }'),
+    ('{"a": None, "b": True, "c": False, "d": NaN}', '{"a": null, "b": true, "c": false, "d": null}'),
+    ('{"note": "None of it, ]"}', '{"note": "None of it, ]"}'),  # strings are left alone
+])
+def test_repair_json(span, repaired):
+    assert repair_json(span) == repaired
+
+
+@pytest.mark.parametrize("text", [
+    MEAL,
+    f"Sure! Here is the analysis:\n{MEAL}\nLet me know if you need more.",
+    f"```json\n{MEAL}\n```",
+    MEAL.replace("80}]", "80,},]"),
+    f"{MEAL} and a second object {{\"x\": 1}}",
+    MEAL.replace('"calories": 80}]', '"calories": "80 kcal"}]'),
+])
+def test_agent_output_is_parsed(text):
+    result = parse_agent_output(text)
+    assert result.description == "Toast"
+    assert [(item.name, item.calories) for item in result.food_items] == [("Toast", 80.0)]
+    assert result.totals.calories == 80
+
+
+def test_missing_totals_are_summed_from_the_items():
+    result = parse_agent_output('{"food_items": [{"calories": "100 kcal"}, {"calories": 50.5}]}')
+    assert result.totals.calories == 150.5
+
+
+@pytest.mark.parametrize("text", [
+    "I couldn't identify any food in this photo.",
+    "} backwards {",
+    '{"food_items": [{"name": "Toast", "calories": 80}',
+    '{"food_items": "toast"}',
+    "{not json at all}",
+])
+def test_unusable_output_raises(text):
+    with pytest.raises(AgentOutputError):
+        parse_agent_output(text)
@@ -0,0 +1,54 @@
+import pytest
+
+from analytics import SUMMARY_METRICS, get_backend
+from bench.analytics import generate
+from database import connect
+from tenants import db_path_for
+
+pytestmark = pytest.mark.anyio
+
+duckdb = pytest.importorskip("duckdb")
+
+FROM, TO = "2000-01-01", "2100-01-01"
+
+
+def _sync(steps: int) -> dict:
+    return {
+        "device_id": "iphone",
+        "synced_at": "2026-10-18T07:00:00+00:00",
+        "period_from": "2026-10-17T07:00:00+00:00",
+        "period_to": "2026-10-18T07:00:00+00:00",
+        "activity": {"steps": steps},
+    }
+
+
+def _approx(rows: list[dict], tolerance: float) -> list[dict]:
+    return [{k: pytest.approx(v, abs=tolerance) if isinstance(v, float) else v for k, v in row.items()} for row in rows]
+
+
+async def test_duckdb_agrees_with_sqlite(tenant):
+    async with connect():  # creates the schema
+        pass
+    generate(str(db_path_for(tenant)), years=2, seed=7, metrics=SUMMARY_METRICS)
+    sqlite, duck = get_backend("sqlite"), get_backend("duckdb")
+
+    for period in ("month", "year"):
+        expected = (await sqlite.averages(FROM, TO, period))[0]
+        assert expected and (await duck.averages(FROM, TO, period))[0] == _approx(expected, 0.011)
+        expected = (await sqlite.workouts(FROM, TO, period))[0]
+        assert expected and (await duck.workouts(FROM, TO, period))[0] == _approx(expected, 0.011)
+    for lag_days in (0, 1):
+        expected = (await sqlite.correlations(FROM, TO, lag_days))[0]
+        assert any(row["r"] is not None for row in expected)
+        assert (await duck.correlations(FROM, TO, lag_days))[0] == _approx(expected, 0.002)
+
+
+async def test_snapshot_follows_a_resync_in_the_same_second(client):
+    async def steps() -> float:
+        response = await client.get("/api/analytics/averages", params={"engine": "duckdb", "from": FROM, "to": TO})
+        return response.json()["rows"][0]["steps"]
+
+    assert (await client.post("/api/health/sync", json=_sync(5000))).status_code == 200
+    assert await steps() == 5000
+    assert (await client.post("/api/health/sync", json=_sync(9000))).status_code == 200
+    assert await steps() == 9000
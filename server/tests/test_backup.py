@@ -0,0 +1,109 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import tenants
+from database import store_meal_entry
+from models import FoodItem, NutrientDetail
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+TODAY = NOW.date().isoformat()
+
+
+def _sync_payload() -> dict:
+    night = NOW - timedelta(hours=10)
+    return {
+        "device_id": "iphone",
+        "synced_at": NOW.isoformat(),
+        "period_from": (NOW - timedelta(days=1)).isoformat(),
+        "period_to": NOW.isoformat(),
+        "activity": {"steps": 8400, "active_calories": 512.5},
+        "heart": {"resting_hr": 54, "hrv_sdnn": 61.2},
+        "workouts": [{
+            "workout_type": "cycling", "start": (NOW - timedelta(hours=3)).isoformat(),
+            "end": (NOW - timedelta(hours=2)).isoformat(), "duration_min": 60, "distance_km": 24.5,
+        }],
+        "mood": [{
+            "kind": "daily_mood", "timestamp": (NOW - timedelta(hours=1)).isoformat(), "valence": 0.4,
+            "labels": ["calm"], "associations": ["fitness"],
+        }],
+        "sleep": [{
+            "start": night.isoformat(), "end": (night + timedelta(hours=7)).isoformat(), "total_duration_min": 420,
+            "stages": [{
+                "stage": "deep", "start": night.isoformat(), "end": (night + timedelta(hours=1)).isoformat(),
+                "duration_min": 60,
+            }],
+        }],
+        "body_battery": 71,
+    }
+
+
+async def _store_meal() -> int:
+    items = [
+        FoodItem(name="Oatmeal", portion="1 bowl", calories=300, protein_g=10, carbs_g=54, fat_g=5, fiber_g=8,
+                 nutrients=[NutrientDetail(name="Iron", amount=3.4, unit="mg", daily_value_pct=19)]),
+        FoodItem(name="Blueberries", portion="½ cup", calories=42, protein_g=0.5, carbs_g=11, fat_g=0.2),
+    ]
+    meal_id, _ = await store_meal_entry(
+        date=TODAY, timestamp=NOW.isoformat(), description="Oatmeal with blueberries", analysis_json="{}",
+        total_calories=342, total_protein_g=10.5, total_carbs_g=65, total_fat_g=5.2,
+        nutrients=[{"name": "Iron", "amount": 3.6, "unit": "mg"}, {"name": "Vitamin C", "amount": 4.8, "unit": "mg"}],
+        food_items=items,
+    )
+    return meal_id
+
+
+def _records(body: bytes) -> tuple[dict, list[dict]]:
+    header, *rows = (json.loads(line) for line in body.splitlines())
+    return header, rows
+
+
+async def test_backup_restores_into_an_equal_database(client, monkeypatch):
+    assert (await client.post("/api/health/sync", json=_sync_payload())).status_code == 200
+    meal_id = await _store_meal()
+    backup = await client.get("/api/backup.ndjson")
+    assert backup.status_code == 200
+    header, rows = _records(backup.content)
+    assert header["format"] == "healthclaw-backup"
+    assert {r["table"] for r in rows} == set(header["tables"])
+
+    restored = f"t{uuid.uuid4().hex[:12]}"
+    monkeypatch.setitem(tenants.api_keys(), "key-restored", restored)
+    key = {"X-API-Key": "key-restored"}
+    response = await client.post("/api/restore", content=backup.content, headers=key)
+    assert response.status_code == 200, response.text
+    assert response.json()["restored"]["meal_entries"] == 1
+
+    again = await client.get("/api/backup.ndjson", headers=key)
+    assert _records(again.content)[1] == rows
+
+    # Derived tables and sort keys are rebuilt, so reads agree as well
+    for url in (
+        "/api/health/workouts?days=7",
+        "/api/health/mood?days=7",
+        "/api/health/sleep?days=7",
+        "/api/nutrition/history?days=7",
+        f"/api/nutrition/meals/{meal_id}",
+        f"/api/nutrition/summary?date={TODAY}",
+        "/api/nutrition/search?q=blueb",
+    ):
+        original = await client.get(url)
+        assert original.status_code == 200 and original.json(), url
+        assert (await client.get(url, headers=key)).json() == original.json(), url
+
+
+async def test_restore_refuses_a_database_with_data(client):
+    await _store_meal()
+    backup = await client.get("/api/backup.ndjson")
+    response = await client.post("/api/restore", content=backup.content)
+    assert response.status_code == 409
+
+
+async def test_restore_rejects_unknown_tables(client):
+    body = b'{"format": "healthclaw-backup", "version": 1}\n{"table": "secrets", "row": {"id": 1}}\n'
+    response = await client.post("/api/restore", content=body)
+    assert response.status_code == 400
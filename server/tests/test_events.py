@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from database import connect, delete_meal_entry, store_meal_entry
+from events import KEEPALIVE, RETRY
+
+pytestmark = pytest.mark.anyio
+
+
+async def _change() -> int:
+    """Store a meal, which records one change event; returns the meal id."""
+    meal_id, _ = await store_meal_entry(
+        date="2026-10-01", timestamp="2026-10-01T12:00:00+00:00", description="soup", analysis_json="{}",
+        total_calories=200, total_protein_g=8, total_carbs_g=20, total_fat_g=9, nutrients=[],
+    )
+    return meal_id
+
+
+def _parse(chunk: bytes) -> tuple[str, int, dict]:
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return fields["event"], int(fields["id"]), json.loads(fields["data"])
+
+
+async def _next(stream) -> bytes:
+    return await asyncio.wait_for(anext(stream), timeout=2)
+
+
+@pytest.fixture
+async def streams():
+    opened = []
+
+    def open_stream(tenant: str, after: int | None):
+        stream = main._event_stream(tenant, after)
+        opened.append(stream)
+        return stream
+
+    yield open_stream
+    for stream in opened:
+        await stream.aclose()
+
+
+async def test_new_streams_get_changes_from_now_on(tenant, streams):
+    await _change()
+    stream = streams(tenant, None)
+    assert await _next(stream) == RETRY
+    pending = asyncio.ensure_future(_next(stream))
+    await asyncio.sleep(0.05)
+    assert not pending.done()  # the earlier change is not replayed
+    await _change()
+    kind, event_id, data = _parse(await pending)
+    assert (kind, event_id) == ("change", 2)
+    assert data["kind"] == "meal_created" and "meal_entries" in data["tables"] and data["dates"] == ["2026-10-01"]
+
+
+async def test_resume_after_last_event_id(tenant, streams):
+    meal_id = await _change()
+    await _change()
+    await delete_meal_entry(meal_id)
+    stream = streams(tenant, 1)
+    assert await _next(stream) == RETRY
+    events = [_parse(await _next(stream)) for _ in range(2)]
+    assert [(event_id, data["kind"]) for _, event_id, data in events] == [(2, "meal_created"), (3, "meal_deleted")]
+
+
+async def test_reset_when_missed_events_were_pruned(tenant, streams):
+    for _ in range(3):
+        await _change()
+    async with connect() as db:
+        await db.execute("DELETE FROM change_events WHERE id < 3")
+        await db.commit()
+
+    stream = streams(tenant, 2)  # nothing it missed is gone
+    assert await _next(stream) == RETRY
+    assert _parse(await _next(stream))[:2] == ("change", 3)
+
+    stream = streams(tenant, 1)  # event 2 is gone
+    assert await _next(stream) == RETRY
+    kind, event_id, data = _parse(await _next(stream))
+    assert (kind, event_id, data["reason"]) == ("reset", 3, "history_expired")
+    pending = asyncio.ensure_future(_next(stream))
+    await _change()
+    assert _parse(await pending)[:2] == ("change", 4)  # and the feed continues from there
+
+
+async def test_reset_for_an_unknown_id(tenant, streams):
+    await _change()
+    stream = streams(tenant, 99)
+    assert await _next(stream) == RETRY
+    assert _parse(await _next(stream))[:2] == ("reset", 1)
+
+
+async def test_idle_streams_get_keepalives(tenant, streams, monkeypatch):
+    monkeypatch.setattr(main, "EVENTS_KEEPALIVE_SECONDS", 0.01)
+    stream = streams(tenant, None)
+    assert await _next(stream) == RETRY
+    assert await _next(stream) == KEEPALIVE
+
+
+async def test_malformed_last_event_id_is_rejected(client):
+    response = await client.get("/api/events", headers={"Last-Event-ID": "latest"})
+    assert response.status_code == 400
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from database import connect
+
+pytestmark = pytest.mark.anyio
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+DAYS = [("2026-01-01", 4000), ("2026-01-02", 6000), ("2026-01-03", 8000)]
+
+
+async def _summaries(rows) -> None:
+    async with connect() as db:
+        await db.executemany("INSERT INTO daily_summary (date, steps) VALUES (?, ?)", rows)
+        await db.commit()
+
+
+def _table(response, fmt: str) -> "pa.Table":
+    assert response.status_code == 200, response.text
+    if fmt == "parquet":
+        return pq.read_table(io.BytesIO(response.content))
+    return pa.ipc.open_stream(response.content).read_all()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+async def test_export_round_trip(client, fmt):
+    await _summaries(DAYS)
+    table = _table(await client.get(f"/api/export/daily_summary.{fmt}"), fmt)
+    assert table.num_rows == 3
+    assert "resting_hr" in table.column_names
+    assert table.schema.field("steps").type == pa.int64()
+
+    params = {"columns": "date,steps", "from": "2026-01-02", "to": "2026-01-02"}
+    table = _table(await client.get(f"/api/export/daily_summary.{fmt}", params=params), fmt)
+    assert table.column_names == ["date", "steps"]
+    assert table.to_pylist() == [{"date": "2026-01-02", "steps": 6000}]
+
+
+async def test_unknown_column_is_a_400(client):
+    response = await client.get("/api/export/daily_summary.parquet", params={"columns": "date,password"})
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+async def test_values_that_do_not_match_the_declared_type(client, fmt):
+    # SQLite keeps whatever it is given when it can't convert to the column's type
+    await _summaries([*DAYS, ("2026-01-04", "12 steps"), ("2026-01-05", 7000.0)])
+    async with connect() as db:
+        await db.execute(
+            """INSERT INTO workouts (date, workout_type, start_time, end_time, duration_min)
+               VALUES ('2026-01-04', 42, '2026-01-04T07:00', '2026-01-04T08:00', 'an hour')"""
+        )
+        await db.commit()
+
+    summaries = _table(await client.get(f"/api/export/daily_summary.{fmt}", params={"columns": "date,steps"}), fmt)
+    assert summaries.column("steps").to_pylist() == [4000, 6000, 8000, None, 7000]
+    workout = _table(await client.get(f"/api/export/workouts.{fmt}"), fmt).to_pylist()[0]
+    assert (workout["workout_type"], workout["duration_min"]) == ("42", None)
@@ -0,0 +1,68 @@
+import pytest
+
+from fooddb import analyze_locally, get_food_index, normalize
+
+MIN_CONFIDENCE = 0.7
+
+
+@pytest.mark.parametrize("text", [
+    "apple pie",
+    "chocolate milk",
+    "half a pizza",
+    "a watermelon",
+    "100000 eggs",
+    "chocolate cake",
+    "sweet potato fries",
+    "peanut butter toast",
+    "coffee with milk",
+    "a bowl of oatmeal with banana",
+])
+def test_unsure_meals_are_left_for_the_agent(text):
+    assert analyze_locally(text, MIN_CONFIDENCE) is None
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("apple pie", None),
+    ("chocolate cake", None),
+    ("sweet potato fries", None),
+    ("sweet potatoes", "Sweet potato"),
+    ("roasted salmon", "Salmon"),
+    ("chocolate milk", None),  # not the milk chocolate bar
+    ("cream", None),  # not ice cream
+    ("salad", None),  # not a side salad of lettuce
+    ("grilled cheese", None),  # a sandwich, not a slice of cheddar
+])
+def test_fuzzy_matches_must_have_the_same_words(phrase, expected):
+    food, score = get_food_index().lookup(normalize(phrase))
+    matched = food.name if food is not None and score >= MIN_CONFIDENCE else None
+    assert matched == expected
+
+
+@pytest.mark.parametrize("text, foods", [
+    ("2 eggs", ["Egg"]),
+    ("2 scrambled eggs and toast", ["Scrambled eggs", "White bread"]),
+    ("coffee with 100 ml milk", ["Coffee", "Whole milk"]),
+    ("oatmeal with 1 banana", ["Oatmeal", "Banana"]),
+])
+def test_simple_meals_resolve_locally(text, foods):
+    local = analyze_locally(text, MIN_CONFIDENCE)
+    assert local is not None
+    assert [m["food"] for m in local.matches] == foods
+
+
+def test_milk_added_with_an_amount_is_weighed_by_that_amount():
+    local = analyze_locally("coffee with 100 ml milk", MIN_CONFIDENCE)
+    assert local.matches[1]["grams"] == 100
+
+
+def test_nutrients_missing_from_the_table_are_reported_not_zeroed():
+    local = analyze_locally("2 eggs", MIN_CONFIDENCE)
+    written = {s["identifier"] for s in local.healthkit_samples}
+    assert "dietaryProtein" in written
+    assert "dietaryVitaminD" in local.missing_nutrients
+    assert written.isdisjoint(local.missing_nutrients)
+
+
+def test_slices_of_a_whole_dish_resolve_locally():
+    local = analyze_locally("2 slices of pizza", MIN_CONFIDENCE)
+    assert local.matches[0]["grams"] == 214
@@ -0,0 +1,78 @@
+import pytest
+
+from database import get_daily_nutrition_summary, get_meal_entry, store_meal_entry, update_meal_food_item
+from models import FoodItem, NutrientDetail
+
+pytestmark = pytest.mark.anyio
+
+DATE = "2026-10-12"
+
+
+def _item(name: str, calories: float, protein: float, iron: float | None = None) -> FoodItem:
+    return FoodItem(
+        name=name, portion="1", calories=calories, protein_g=protein, carbs_g=10, fat_g=5,
+        nutrients=[NutrientDetail(name="Iron", amount=iron, unit="mg")] if iron is not None else [],
+    )
+
+
+async def _store(items: list[FoodItem]) -> tuple[int, list[int]]:
+    return await store_meal_entry(
+        date=DATE, timestamp=f"{DATE}T12:00:00+00:00", description="lunch", analysis_json="{}",
+        total_calories=sum(i.calories for i in items), total_protein_g=sum(i.protein_g for i in items),
+        total_carbs_g=10 * len(items), total_fat_g=5 * len(items),
+        nutrients=[
+            {"name": "Energy", "amount": sum(i.calories for i in items), "unit": "kcal"},
+            {"name": "Iron", "amount": 3.0, "unit": "mg"},
+            {"name": "Cholesterol", "amount": 40.0, "unit": "mg"},  # no item reports it
+        ],
+        food_items=items,
+    )
+
+
+def _nutrients(meal: dict) -> dict[str, float]:
+    return {n["nutrient_name"]: n["amount"] for n in meal["nutrients"]}
+
+
+async def test_store_returns_item_ids_without_touching_the_models(tenant):
+    items = [_item("Egg", 150, 12, iron=1.0), _item("Toast", 80, 3)]
+    meal_id, item_ids = await _store(items)
+    assert all(i.item_id is None for i in items)
+    meal = await get_meal_entry(meal_id)
+    assert [i["item_id"] for i in meal["food_items"]] == item_ids
+
+
+async def test_editing_an_item_recomputes_the_meal_from_its_items(tenant):
+    meal_id, (egg_id, toast_id) = await _store([_item("Egg", 150, 12, iron=1.0), _item("Toast", 80, 3, iron=2.0)])
+
+    assert await update_meal_food_item(meal_id, egg_id, _item("Egg white", 20, 4, iron=0.5))
+
+    meal = await get_meal_entry(meal_id)
+    assert (meal["total_calories"], meal["total_protein_g"], meal["total_carbs_g"]) == (100, 7, 20)
+    nutrients = _nutrients(meal)
+    assert nutrients["Energy"] == 100
+    assert nutrients["Protein"] == 7  # had no meal row before; now derived from the items
+    assert nutrients["Iron"] == 2.5  # micronutrients follow the items too
+    assert nutrients["Cholesterol"] == 40  # not reported by any item, left alone
+
+    day = await get_daily_nutrition_summary(DATE)
+    assert (day["meal_count"], day["total_calories"]) == (1, 100)
+
+
+async def test_dropping_a_nutrient_from_the_only_item_reporting_it_removes_it(tenant):
+    meal_id, (egg_id, _) = await _store([_item("Egg", 150, 12, iron=1.0), _item("Toast", 80, 3)])
+    assert await update_meal_food_item(meal_id, egg_id, _item("Egg", 150, 12))
+    assert "Iron" not in _nutrients(await get_meal_entry(meal_id))
+
+
+async def test_unknown_item_is_not_updated(tenant):
+    meal_id, _ = await _store([_item("Egg", 150, 12)])
+    assert not await update_meal_food_item(meal_id, 999_999, _item("Egg", 1, 1))
+
+
+async def test_analysis_response_carries_the_stored_item_ids(client):
+    response = await client.post("/api/nutrition/analyze", json={"text": "2 eggs and toast"})
+    assert response.status_code == 200
+    body = response.json()
+    meal = (await client.get(f"/api/nutrition/meals/{body['meal_id']}")).json()
+    assert [i["item_id"] for i in body["food_items"]] == [i["item_id"] for i in meal["food_items"]]
+    assert None not in [i["item_id"] for i in body["food_items"]]
@@ -0,0 +1,18 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_metrics_are_labelled_by_route_template(client):
+    assert (await client.get("/api/nutrition/meals/48213")).status_code == 404
+    assert (await client.request("BREW", "/api/nutrition/meals/48213")).status_code == 405
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE healthclaw_http_request_duration_seconds histogram" in body
+    assert 'method="GET",route="/api/nutrition/meals/{meal_id}",status="404"' in body
+    assert 'method="other",route="/api/nutrition/meals/{meal_id}",status="405"' in body
+    assert "48213" not in body
+    assert "BREW" not in body
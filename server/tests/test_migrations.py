@@ -0,0 +1,196 @@
+import sqlite3
+
+import aiosqlite
+import pytest
+
+import database
+from database import SCHEMA_MIGRATIONS, connect
+from migrations import Migration, migrate, schema_version, table_exists
+from tenants import db_path_for
+
+pytestmark = pytest.mark.anyio
+
+# Schema of databases created before the migrations framework
+LEGACY_SCHEMA = """
+    CREATE TABLE sync_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT NOT NULL, synced_at TEXT NOT NULL,
+        period_from TEXT NOT NULL, period_to TEXT NOT NULL, payload_json TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE daily_summary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL UNIQUE, steps INTEGER,
+        distance_km REAL, active_calories REAL, exercise_minutes REAL, stand_hours INTEGER,
+        flights_climbed INTEGER, resting_hr REAL, avg_hr REAL, hrv_sdnn REAL,
+        sleep_duration_min REAL, deep_sleep_min REAL, rem_sleep_min REAL, core_sleep_min REAL,
+        awake_min REAL, weight_kg REAL, body_fat_pct REAL, body_battery INTEGER,
+        mood_avg_valence REAL, workout_count INTEGER, workout_minutes REAL,
+        workout_calories REAL, mindfulness_minutes REAL, blood_oxygen_pct REAL,
+        respiratory_rate REAL, updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, workout_type TEXT NOT NULL,
+        start_time TEXT NOT NULL, end_time TEXT NOT NULL, duration_min REAL, distance_km REAL,
+        active_calories REAL, avg_hr REAL, max_hr REAL, elevation_gain_m REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE mood_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, kind TEXT NOT NULL,
+        timestamp TEXT NOT NULL, valence REAL NOT NULL, labels TEXT, associations TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE sleep_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL, total_duration_min REAL, in_bed_duration_min REAL,
+        stages_json TEXT, created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE meal_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, timestamp TEXT NOT NULL,
+        description TEXT NOT NULL, image_path TEXT, analysis_json TEXT NOT NULL,
+        total_calories REAL, total_protein_g REAL, total_carbs_g REAL, total_fat_g REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE TABLE meal_nutrients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        meal_entry_id INTEGER NOT NULL REFERENCES meal_entries(id),
+        nutrient_name TEXT NOT NULL, amount REAL NOT NULL, unit TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX idx_meal_nutrients_entry ON meal_nutrients(meal_entry_id);
+"""
+
+
+def make_legacy_db(path, meals: int = 10) -> None:
+    """A pre-migrations database with `meals` meals of three nutrient rows each."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript(LEGACY_SCHEMA)
+    for i in range(1, meals + 1):
+        date = f"2026-01-{i % 28 + 1:02d}"
+        db.execute(
+            "INSERT INTO meal_entries (id, date, timestamp, description, analysis_json, total_calories)"
+            " VALUES (?, ?, ?, ?, '{}', ?)",
+            (i, date, f"{date}T12:00:00", f"meal {i}", 100 * i),
+        )
+        db.executemany(
+            "INSERT INTO meal_nutrients (meal_entry_id, nutrient_name, amount, unit) VALUES (?, ?, ?, ?)",
+            [(i, "Iron", 1.0, "mg"), (i, "Vitamin B12 ", 2.0, "µg"), (i, "Vitamin B12", 0.5, "mcg")],
+        )
+    db.commit()
+    db.close()
+
+
+async def _meal_nutrients(db) -> list[tuple]:
+    cursor = await db.execute(
+        """SELECT mn.meal_entry_id, n.name, n.unit, mn.amount
+           FROM meal_nutrients mn JOIN nutrients n ON n.id = mn.nutrient_id
+           ORDER BY 1, 2"""
+    )
+    return await cursor.fetchall()
+
+
+def _expected(meals: int) -> list[tuple]:
+    return [row for i in range(1, meals + 1) for row in ((i, "Iron", "mg", 1.0), (i, "Vitamin B12", "mcg", 2.5))]
+
+
+async def test_nutrient_dictionary_backfills_in_batches(tenant, monkeypatch):
+    monkeypatch.setattr(database, "_NUTRIENT_BACKFILL_ROWS", 4)  # meals straddle batches
+    make_legacy_db(db_path_for(tenant), meals=10)
+    async with connect() as db:
+        assert await _meal_nutrients(db) == _expected(10)
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'meal_nutrients_legacy'")
+        assert await cursor.fetchone() is None
+
+
+async def test_interrupted_backfill_resumes(tenant, monkeypatch):
+    monkeypatch.setattr(database, "_NUTRIENT_BACKFILL_ROWS", 4)
+    path = db_path_for(tenant)
+    make_legacy_db(path, meals=10)
+    calls = 0
+
+    async def crashing_backfill(db):
+        nonlocal calls
+        calls += 1
+        if calls == 4:
+            raise RuntimeError("power cut")
+        return await database._backfill_nutrient_dictionary(db)
+
+    crashing = [
+        Migration(m.version, m.name, m.apply, crashing_backfill) if m.version == 4 else m
+        for m in SCHEMA_MIGRATIONS
+    ]
+    async with aiosqlite.connect(path) as db:
+        with pytest.raises(RuntimeError):
+            await migrate(db, crashing)
+        assert await schema_version(db) == 3
+        cursor = await db.execute("SELECT COUNT(*) FROM meal_nutrients_legacy")
+        assert (await cursor.fetchone())[0] == 30 - 2 * 4  # two batches were committed
+
+    async with connect() as db:
+        assert await schema_version(db) == SCHEMA_MIGRATIONS[-1].version
+        assert await _meal_nutrients(db) == _expected(10)
+
+
+async def _schema(db) -> dict[str, set[str]]:
+    """Columns of every table and the names of the explicitly created indexes and triggers."""
+    cursor = await db.execute(
+        "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE 'meal_search_%'"
+    )
+    schema = {}
+    for kind, name in await cursor.fetchall():
+        if kind == "table":
+            cursor = await db.execute("SELECT name FROM pragma_table_info(?)", (name,))
+            schema[name] = {row[0] for row in await cursor.fetchall()}
+        else:
+            schema.setdefault(kind, set()).add(name)
+    return schema
+
+
+async def test_pre_series_database_upgrades_to_the_current_schema(tenant):
+    path = db_path_for(tenant)
+    make_legacy_db(path, meals=3)
+    legacy = sqlite3.connect(path)
+    sleep = ("2026-01-02", "2026-01-01T23:00:00+00:00", "2026-01-02T07:00:00+00:00", 480)
+    legacy.executemany(
+        "INSERT INTO sleep_sessions (date, start_time, end_time, total_duration_min) VALUES (?, ?, ?, ?)",
+        [sleep, sleep],  # re-synced before sessions were unique
+    )
+    legacy.execute(
+        "INSERT INTO workouts (date, workout_type, start_time, end_time, duration_min)"
+        " VALUES ('2026-01-02', 'run', '2026-01-02T08:00:00+00:00', '2026-01-02T08:30:00+00:00', 30)"
+    )
+    legacy.commit()
+    legacy.close()
+
+    async with connect() as db:
+        assert await schema_version(db) == SCHEMA_MIGRATIONS[-1].version
+        upgraded = await _schema(db)
+        upgraded["index"].remove("idx_sleep_unique")  # fresh tables declare UNIQUE(date, start_time) inline
+        cursor = await db.execute("SELECT COUNT(*) FROM sleep_sessions")
+        assert (await cursor.fetchone())[0] == 1
+        cursor = await db.execute("SELECT day, ts FROM workouts")
+        assert await cursor.fetchone() == (20455, 1767340800)  # 2026-01-02, 08:00 UTC
+        cursor = await db.execute("SELECT rowid FROM meal_search WHERE meal_search MATCH 'meal AND 2'")
+        assert [row[0] for row in await cursor.fetchall()] == [2]
+        cursor = await db.execute("SELECT SUM(total_calories), SUM(meal_count) FROM daily_nutrition")
+        assert await cursor.fetchone() == (600, 3)
+
+    async with connect(f"{tenant}fresh") as db:
+        assert upgraded == await _schema(db)
+
+
+async def test_current_database_is_not_migrated_again(tenant):
+    async with connect() as db:
+        assert await migrate(db, SCHEMA_MIGRATIONS) == 0
+
+
+async def test_failed_step_leaves_the_previous_version(tenant):
+    async def broken(db):
+        await db.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("bad step")
+
+    steps = (*SCHEMA_MIGRATIONS, Migration(SCHEMA_MIGRATIONS[-1].version + 1, "broken", broken))
+    async with connect() as db:
+        with pytest.raises(RuntimeError, match="bad step"):
+            await migrate(db, steps)
+        assert await schema_version(db) == SCHEMA_MIGRATIONS[-1].version
+        assert not await table_exists(db, "half_done")
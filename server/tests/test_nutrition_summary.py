@@ -0,0 +1,47 @@
+import pytest
+
+from database import get_nutrition_summary_range, store_meal_entry
+
+pytestmark = pytest.mark.anyio
+
+
+async def _meal(date: str, calories: float, nutrients: dict[str, float]) -> None:
+    await store_meal_entry(
+        date=date, timestamp=f"{date}T12:00:00+00:00", description="meal", analysis_json="{}",
+        total_calories=calories, total_protein_g=10, total_carbs_g=20, total_fat_g=5,
+        nutrients=[{"name": name, "amount": amount, "unit": "mg"} for name, amount in nutrients.items()],
+    )
+
+
+async def test_buckets_sum_macros_and_nutrients_once_per_meal(client):
+    await _meal("2026-10-12", 500, {"Iron": 2, "Calcium": 100, "Zinc": 1})  # Monday
+    await _meal("2026-10-12", 300, {"Iron": 1})
+    await _meal("2026-10-14", 200, {})
+    await _meal("2026-10-19", 400, {"Calcium": 50})  # next Monday
+    await _meal("2026-10-30", 999, {"Iron": 9})  # outside the range
+
+    days = await get_nutrition_summary_range("2026-10-12", "2026-10-19", "day")
+    assert [(d["start"], d["meal_count"], d["total_calories"], d["total_protein_g"]) for d in days] == [
+        ("2026-10-12", 2, 800, 20),
+        ("2026-10-14", 1, 200, 10),
+        ("2026-10-19", 1, 400, 10),
+    ]
+    assert sorted((n["nutrient_name"], n["total_amount"]) for n in days[0]["nutrients"]) == [
+        ("Calcium", 100), ("Iron", 3), ("Zinc", 1),
+    ]
+    assert days[1]["nutrients"] == []
+
+    weeks = await get_nutrition_summary_range("2026-10-12", "2026-10-19", "week")
+    assert [(w["start"], w["meal_count"], w["total_calories"], w["total_fat_g"]) for w in weeks] == [
+        ("2026-10-12", 3, 1000, 15),
+        ("2026-10-19", 1, 400, 5),
+    ]
+
+
+async def test_range_limit_counts_both_ends(client):
+    ok = await client.get("/api/nutrition/summary/range", params={"from": "2024-10-19", "to": "2026-10-19"})
+    assert ok.status_code == 200
+    assert len(ok.json()["buckets"]) == 731
+
+    too_long = await client.get("/api/nutrition/summary/range", params={"from": "2024-10-18", "to": "2026-10-19"})
+    assert too_long.status_code == 400
@@ -0,0 +1,31 @@
+import asyncio
+import contextvars
+import sqlite3
+
+import pytest
+
+from database import connect, get_daily_summaries
+from tenants import TenantError
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reads_run_while_a_write_is_open(tenant):
+    async with connect() as writer:
+        await writer.execute("INSERT INTO daily_summary (date, steps) VALUES (date('now'), 1000)")
+        # Used to queue behind the writer's lock; now it reads the last committed state
+        rows = await asyncio.wait_for(get_daily_summaries(7), timeout=2)
+        assert rows == []
+        await writer.commit()
+    assert [r["steps"] for r in await get_daily_summaries(7)] == [1000]
+
+
+async def test_readers_cannot_write(tenant):
+    async with connect(read_only=True) as db:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            await db.execute("INSERT INTO daily_summary (date) VALUES ('2026-10-01')")
+
+
+def test_no_tenant_is_an_error():
+    with pytest.raises(TenantError, match="No tenant set"):
+        contextvars.Context().run(connect)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import (
+    explain_range_queries, get_meal_history, get_sleep_sessions, get_workouts, init_db, store_meal_entry, store_sync,
+)
+from models import HealthSyncPayload
+from querylog import is_full_scan
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_range_reads_use_an_index_for_filter_and_sort(tenant):
+    await init_db()
+    plans = await explain_range_queries()
+    assert plans
+    for name, plan in plans.items():
+        details = [line.strip() for line in plan]
+        assert not [d for d in details if is_full_scan(d)], f"{name}: {plan}"
+        assert not [d for d in details if d.startswith("USE TEMP B-TREE")], f"{name}: {plan}"
+
+
+async def test_range_reads_are_newest_first(tenant):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    starts = [now - timedelta(hours=h) for h in (30, 2, 20)]
+    # A sleep session is dated by its end, so the later-starting nap has the earlier date
+    night = datetime.combine(now.date() - timedelta(days=2), datetime.min.time(), timezone.utc) + timedelta(hours=20)
+    sleep = [(night, night + timedelta(hours=10)), (night + timedelta(hours=1), night + timedelta(hours=2))]
+    await store_sync(HealthSyncPayload.model_validate({
+        "device_id": "test",
+        "synced_at": now.isoformat(),
+        "period_from": (now - timedelta(days=2)).isoformat(),
+        "period_to": now.isoformat(),
+        "workouts": [
+            {"workout_type": "run", "start": s.isoformat(), "end": (s + timedelta(minutes=30)).isoformat(),
+             "duration_min": 30}
+            for s in starts
+        ],
+        "sleep": [
+            {"start": start.isoformat(), "end": end.isoformat(), "total_duration_min": (end - start).seconds / 60}
+            for start, end in sleep
+        ],
+    }))
+    for s in starts:
+        await store_meal_entry(
+            date=s.date().isoformat(), timestamp=s.isoformat(), description="meal", analysis_json="{}",
+            total_calories=100, total_protein_g=1, total_carbs_g=1, total_fat_g=1, nutrients=[],
+        )
+
+    expected = sorted((s.isoformat() for s in starts), reverse=True)
+    assert [w["start_time"] for w in await get_workouts(7)] == expected
+    assert [m["timestamp"] for m in await get_meal_history(7)] == expected
+    assert [s["start_time"] for s in await get_sleep_sessions(7)] == [
+        sleep[1][0].isoformat(), sleep[0][0].isoformat(),
+    ]
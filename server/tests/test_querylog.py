@@ -0,0 +1,64 @@
+import pytest
+
+from database import connect
+from querylog import SLOW_QUERIES, is_full_scan, param_shapes, plan_lines
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def log_everything(monkeypatch):
+    if SLOW_QUERIES is None:
+        pytest.skip("slow-query log disabled")
+    monkeypatch.setattr(SLOW_QUERIES, "threshold", 0.0)
+    monkeypatch.setattr(SLOW_QUERIES, "threshold_ms", 0.0)
+    return SLOW_QUERIES
+
+
+def test_plan_rows_become_an_indented_tree():
+    rows = [(2, 0, 0, "SCAN a"), (5, 0, 0, "CORRELATED SCALAR SUBQUERY 1"), (9, 5, 0, "SEARCH b USING INDEX i (x=?)")]
+    assert plan_lines(rows) == ["SCAN a", "CORRELATED SCALAR SUBQUERY 1", "  SEARCH b USING INDEX i (x=?)"]
+
+
+@pytest.mark.parametrize("detail, full", [
+    ("SCAN meal_entries", True),
+    ("SCAN meal_entries USING INDEX idx_meal_ts", False),
+    ("SEARCH meal_entries USING INTEGER PRIMARY KEY (rowid=?)", False),
+    ("SCAN meal_search VIRTUAL TABLE INDEX 0:M1", False),
+    ("SCAN CONSTANT ROW", False),
+])
+def test_full_scans(detail, full):
+    assert is_full_scan(detail) is full
+
+
+def test_parameters_are_logged_by_shape_only():
+    assert param_shapes(("secret", 3, None, b"\0\1")) == ["str[6]", "int", "null", "bytes[2]"]
+    assert param_shapes({"q": "secret"}) == {"q": "str[6]"}
+
+
+async def _meals_described_like(pattern: str) -> list:
+    async with connect(read_only=True) as db:
+        cursor = await db.execute("SELECT id FROM meal_entries WHERE description LIKE ?", (pattern,))
+        return await cursor.fetchall()
+
+
+async def test_slow_statement_is_logged_with_its_plan(tenant, log_everything):
+    await _meals_described_like("%soup%")
+    entry = next(e for e in log_everything.recent(tenant) if "LIKE" in e["sql"])
+    assert entry["caller"] == "_meals_described_like"
+    assert entry["sql"] == "SELECT id FROM meal_entries WHERE description LIKE ?"
+    assert entry["params"] == ["str[6]"]
+    assert entry["duration_ms"] >= 0
+    assert entry["plan"] == ["SCAN meal_entries"]
+    assert entry["full_scans"] == ["SCAN meal_entries"]
+
+
+async def test_admin_endpoint_serves_the_tenants_entries(client, tenant, log_everything):
+    await _meals_described_like("%stew%")
+    response = await client.get("/api/admin/slow-queries", params={"limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["threshold_ms"] == 0
+    assert 0 < len(body["queries"]) <= 5
+    assert {q["tenant"] for q in body["queries"]} == {tenant}
+    assert any(q["caller"] == "_meals_described_like" for q in body["queries"])
@@ -0,0 +1,125 @@
+import asyncio
+import os
+
+import pytest
+
+import nutrition
+from agent import get_agent
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+MEAL = "grandma's mystery stew"
+
+
+def _shared_photos() -> set[str]:
+    return {name for name in os.listdir(nutrition.UPLOAD_DIR) if name.endswith("-shared.jpg")}
+
+
+@pytest.fixture
+def agent_calls(monkeypatch):
+    """Agent attempts made during the test; each takes long enough for requests to overlap."""
+    backend = get_agent()
+    calls = []
+    original = backend.attempt
+
+    async def attempt(prompt, image_path, deadline):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return await original(prompt, image_path, deadline)
+
+    monkeypatch.setattr(backend, "attempt", attempt)
+    return calls
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    started = 0
+
+    async def start():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return started
+
+    assert await asyncio.gather(*(flight.run("k", start) for _ in range(3))) == [1, 1, 1]
+    assert flight.in_flight == 0
+    assert await flight.run("k", start) == 2  # finished calls are not cached
+
+
+async def test_a_cancelled_caller_leaves_the_call_running():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def start():
+        await release.wait()
+        return "done"
+
+    leaver = asyncio.create_task(flight.run("k", start))
+    stayer = asyncio.create_task(flight.run("k", start))
+    await asyncio.sleep(0)
+    leaver.cancel()
+    release.set()
+    assert await stayer == "done"
+    assert leaver.cancelled()
+
+
+async def test_errors_reach_every_caller():
+    flight = SingleFlight("test")
+
+    async def start():
+        await asyncio.sleep(0.01)
+        raise ValueError("agent broke")
+
+    results = await asyncio.gather(flight.run("k", start), flight.run("k", start), return_exceptions=True)
+    assert [str(r) for r in results] == ["agent broke", "agent broke"]
+    assert flight.in_flight == 0
+
+
+async def test_identical_analyses_share_an_agent_call(client, agent_calls):
+    first, second = await asyncio.gather(
+        client.post("/api/nutrition/analyze", json={"text": MEAL}),
+        client.post("/api/nutrition/analyze", json={"text": "  Grandma's   MYSTERY stew "}),
+    )
+    assert first.status_code == second.status_code == 200
+    assert len(agent_calls) == 1
+    assert first.json()["meal_id"] != second.json()["meal_id"]  # each request still stores its meal
+
+
+async def test_idempotency_key_replays_the_first_meal(client, agent_calls):
+    key = {"Idempotency-Key": "lunch-1"}
+    concurrent = await asyncio.gather(*(
+        client.post("/api/nutrition/analyze", json={"text": MEAL}, headers=key) for _ in range(2)
+    ))
+    retry = await client.post("/api/nutrition/analyze", json={"text": MEAL}, headers=key)
+    responses = [*concurrent, retry]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.json()["meal_id"] for r in responses}) == 1
+    assert len(agent_calls) == 1
+    history = (await client.get("/api/nutrition/history?days=1")).json()
+    assert len(history) == 1
+
+
+async def test_idempotency_key_reused_for_another_meal_is_rejected(client, agent_calls):
+    key = {"Idempotency-Key": "lunch-2"}
+    assert (await client.post("/api/nutrition/analyze", json={"text": MEAL}, headers=key)).status_code == 200
+    conflict = await client.post("/api/nutrition/analyze", json={"text": "a different stew"}, headers=key)
+    assert conflict.status_code == 422
+    assert len(agent_calls) == 1
+
+
+async def test_photos_are_held_for_the_shared_call_and_released(tenant, agent_calls, monkeypatch, tmp_path):
+    def no_links(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_links)  # take the copy fallback
+    photo = tmp_path / "meal.jpg"
+    photo.write_bytes(os.urandom(4096))
+    before = _shared_photos()
+
+    results = await asyncio.gather(*(
+        nutrition.analyze_nutrition("", image_path=str(photo), idempotency_key="photo-1") for _ in range(2)
+    ))
+    assert len({r.meal_id for r in results}) == 1
+    assert len(agent_calls) == 1
+    assert _shared_photos() == before
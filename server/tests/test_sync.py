@@ -0,0 +1,39 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+PAYLOAD = {
+    "device_id": "iphone",
+    "synced_at": "2026-10-18T07:00:00+00:00",
+    "period_from": "2026-10-17T07:00:00+00:00",
+    "period_to": "2026-10-18T07:00:00+00:00",
+    "activity": {"steps": 5000},
+}
+
+
+async def _post(client, content: bytes):
+    return await client.post("/api/health/sync", content=content, headers={"Content-Type": "application/json"})
+
+
+async def test_sync_is_stored(client):
+    response = await client.post("/api/health/sync", json=PAYLOAD)
+    assert response.status_code == 200
+    assert response.json()["sync_id"] > 0
+
+
+async def test_malformed_json_is_a_422(client):
+    response = await _post(client, b'{"device_id": "iphone",')
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+
+async def test_body_that_is_not_utf8_is_a_422(client):
+    response = await _post(client, b"\xff\xfe")
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][0] == "body"
+
+
+async def test_invalid_fields_point_at_the_field(client):
+    response = await client.post("/api/health/sync", json={**PAYLOAD, "activity": {"steps": "many"}})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "activity", "steps"]
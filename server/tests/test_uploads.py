@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import uploads
+from uploads import UploadError, UploadTooLarge, spool_multipart
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "healthclawtest"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _body(photo: bytes, text: str = "lunch") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="text"\r\n\r\n'
+        f"{text}\r\n"
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="meal.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + photo + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body: bytes, size: int = 1000):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def _spooled_files() -> set[str]:
+    return {name for name in os.listdir(uploads.UPLOAD_DIR) if name.startswith("healthclaw-food-")}
+
+
+@pytest.mark.parametrize("inline", [True, False])
+async def test_spools_file_and_fields(monkeypatch, inline):
+    monkeypatch.setattr(uploads, "INLINE_WRITES", inline)
+    photo = os.urandom(50_000)
+    upload = await spool_multipart(CONTENT_TYPE, _chunks(_body(photo)))
+    try:
+        assert upload.fields == {"text": "lunch"}
+        assert upload.content_type == "image/jpeg"
+        assert upload.size == len(photo)
+        with open(upload.file_path, "rb") as f:
+            assert f.read() == photo
+    finally:
+        upload.cleanup()
+
+
+@pytest.mark.parametrize("cut", [-len(f"\r\n--{BOUNDARY}--\r\n"), -len(f"--\r\n"), -5_000])
+async def test_truncated_body_is_rejected_and_cleaned_up(cut):
+    before = _spooled_files()
+    with pytest.raises(UploadError, match="closing boundary"):
+        await spool_multipart(CONTENT_TYPE, _chunks(_body(os.urandom(20_000))[:cut]))
+    assert _spooled_files() == before
+
+
+async def test_oversized_file_is_rejected(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 10_000)
+    before = _spooled_files()
+    with pytest.raises(UploadTooLarge):
+        await spool_multipart(CONTENT_TYPE, _chunks(_body(os.urandom(20_000))))
+    assert _spooled_files() == before
+
+
+async def test_invalid_base64_photo_is_a_400(client):
+    before = _spooled_files()
+    response = await client.post(
+        "/api/nutrition/analyze", json={"text": "lunch", "image_base64": "not base64!", "image_mime_type": "image/jpeg"},
+    )
+    assert response.status_code == 400
+    assert "base64" in response.json()["detail"]
+    assert _spooled_files() == before
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+import main
+from database import get_widget, store_meal_entry
+from widget import WidgetCache, etag_matches
+
+pytestmark = pytest.mark.anyio
+
+FIELDS = {
+    "date", "steps", "active_calories", "exercise_min", "body_battery", "sleep_min",
+    "meals", "calories", "protein_g", "carbs_g", "fat_g",
+}
+
+
+async def _meal(day: str, calories: float) -> None:
+    await store_meal_entry(
+        date=day, timestamp=f"{day}T12:00:00+00:00", description="toast", analysis_json="{}",
+        total_calories=calories, total_protein_g=5, total_carbs_g=30, total_fat_g=4, nutrients=[],
+    )
+
+
+def test_if_none_match_comparison():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"old", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+
+
+async def test_unchanged_widget_is_a_304(client):
+    first = await client.get("/api/widget")
+    assert first.status_code == 200
+    assert set(first.json()) == FIELDS
+    assert first.json()["date"] == date.today().isoformat()
+    etag = first.headers["ETag"]
+
+    again = await client.get("/api/widget", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+
+async def test_writes_for_today_change_the_etag(client):
+    etag = (await client.get("/api/widget")).headers["ETag"]
+
+    await _meal("2020-01-01", 999)  # another day: the document stays the same
+    assert (await client.get("/api/widget", headers={"If-None-Match": etag})).status_code == 304
+
+    await _meal(date.today().isoformat(), 250)
+    response = await client.get("/api/widget", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert (response.json()["meals"], response.json()["calories"]) == (1, 250)
+
+
+async def test_cold_cache_serves_the_stored_document(client, monkeypatch):
+    await _meal(date.today().isoformat(), 250)
+    warm = await client.get("/api/widget")
+    monkeypatch.setattr(main, "WIDGETS", WidgetCache())  # as after a restart
+    cold = await client.get("/api/widget", headers={"If-None-Match": warm.headers["ETag"]})
+    assert cold.status_code == 304
+
+
+async def test_document_is_rebuilt_for_a_new_day(tenant):
+    today = date.today().isoformat()
+    await _meal(today, 250)
+    assert (await get_widget(today)).date == today
+    tomorrow = await get_widget("2099-01-01")
+    assert tomorrow.date == "2099-01-01"
+    assert b'"meals":0' in tomorrow.body.replace(b" ", b"")
@@ -0,0 +1,212 @@
+"""
+Streaming multipart upload handling for HealthClaw.
+
+Food photos are parsed straight off the request stream and written chunk by
+chunk into UPLOAD_DIR (tmpfs when available), so an upload never has to sit
+in memory as a whole — neither as base64 text nor as decoded bytes.
+
+Writes to tmpfs are memory copies and happen inline; when UPLOAD_DIR is on a
+real disk they go through a worker thread, so disk latency stays off the
+event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # older python-multipart releases
+    import multipart
+    from multipart.multipart import parse_options_header
+
+from config import MAX_UPLOAD_BYTES, UPLOAD_DIR
+
+# Form fields are small text values; anything bigger is a malformed request
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The multipart body could not be accepted."""
+
+
+class UploadTooLarge(UploadError):
+    """The uploaded file exceeds MAX_UPLOAD_BYTES."""
+
+
+@dataclass
+class SpooledUpload:
+    """Result of spooling a multipart request: text fields plus one file on disk."""
+
+    fields: dict[str, str] = field(default_factory=dict)
+    file_path: str | None = None
+    file_field: str | None = None
+    content_type: str | None = None
+    size: int = 0
+
+    def cleanup(self) -> None:
+        if self.file_path and os.path.exists(self.file_path):
+            os.unlink(self.file_path)
+
+
+def _is_tmpfs(path) -> bool:
+    """Whether `path` lives on a tmpfs mount (Linux; False when unknown)."""
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    path = os.path.realpath(path)
+    best, fstype = "", ""
+    for point, kind in mounts:
+        if (path == point or path.startswith(point.rstrip("/") + "/")) and len(point) > len(best):
+            best, fstype = point, kind
+    return fstype == "tmpfs"
+
+
+INLINE_WRITES = _is_tmpfs(UPLOAD_DIR)
+
+
+def _write_all(fd: int, data: bytes | bytearray) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _extension_for(content_type: str | None) -> str:
+    if content_type and "png" in content_type:
+        return "png"
+    if content_type and "heic" in content_type:
+        return "heic"
+    return "jpg"
+
+
+async def spool_multipart(
+    content_type: str,
+    stream: AsyncIterator[bytes],
+    file_field: str = "image",
+) -> SpooledUpload:
+    """
+    Parse a multipart/form-data stream, spooling `file_field` to UPLOAD_DIR.
+    Other parts are collected as text fields. Raises UploadError on bad input.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+
+    upload = SpooledUpload()
+    state: dict = {
+        "headers": {}, "name": None, "is_file": False, "buf": bytearray(),
+        "file_open": False, "ended": False,
+    }
+    # File bytes parsed from the current chunk, for writing off the loop
+    pending = bytearray()
+    header_field = bytearray()
+    header_value = bytearray()
+    fd: int | None = None
+
+    def on_part_begin() -> None:
+        state["headers"] = {}
+        state["name"] = None
+        state["is_file"] = False
+        state["buf"] = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        state["headers"][bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        nonlocal fd
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        state["name"] = name
+        if name == file_field and b"filename" in options:
+            if upload.file_path is not None:
+                raise UploadError(f"Only one '{file_field}' file is accepted")
+            part_type = state["headers"].get(b"content-type", b"").decode("latin-1") or None
+            path = os.path.join(
+                UPLOAD_DIR,
+                f"healthclaw-food-{uuid.uuid4().hex[:8]}.{_extension_for(part_type)}",
+            )
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            upload.file_path = path
+            upload.file_field = name
+            upload.content_type = part_type
+            state["is_file"] = True
+            state["file_open"] = True
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["is_file"]:
+            upload.size += end - start
+            if upload.size > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+            if INLINE_WRITES:
+                _write_all(fd, memoryview(data)[start:end])
+            else:
+                pending.extend(memoryview(data)[start:end])
+        else:
+            state["buf"].extend(data[start:end])
+            if len(state["buf"]) > MAX_FIELD_BYTES:
+                raise UploadError(f"Form field '{state['name']}' is too large")
+
+    def on_part_end() -> None:
+        if state["is_file"]:
+            state["file_open"] = False  # closed by flush() once its bytes are written
+        elif state["name"]:
+            upload.fields[state["name"]] = state["buf"].decode("utf-8", "replace")
+
+    def on_end() -> None:
+        state["ended"] = True
+
+    async def flush() -> None:
+        nonlocal fd
+        if fd is None:
+            return
+        if pending:
+            await asyncio.to_thread(_write_all, fd, pending)
+            pending.clear()
+        if not state["file_open"]:
+            os.close(fd)
+            fd = None
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            await flush()
+        parser.finalize()
+        await flush()
+        if not state["ended"] or fd is not None:
+            raise UploadError("Multipart body ended before its closing boundary")
+    except Exception as e:
+        if fd is not None:
+            os.close(fd)
+        upload.cleanup()
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError(f"Malformed multipart body: {e}") from e
+
+    return upload
@@ -0,0 +1,57 @@
+"""
+Precomputed document for the iOS home screen widget.
+
+The widget needs only today's headline numbers, so instead of pulling full
+summaries it reads one small fixed-shape JSON document:
+
+    {"date": "2026-10-18", "steps": 8412, "active_calories": 512.3,
+     "exercise_min": 34.0, "body_battery": 71, "sleep_min": 452.0,
+     "meals": 3, "calories": 1840.5, "protein_g": 92.1, "carbs_g": 201.4,
+     "fat_g": 63.0}
+
+Writes that can change it (syncs and meal edits) rebuild it in their own
+transaction and store it in the widget_state table (see database.py); reads
+are served from a per-tenant copy in memory with an ETag, so a widget
+refresh that finds nothing new is a 304. The document is for the server's
+current date and is rebuilt on the first read after midnight.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class WidgetDocument:
+    date: str
+    etag: str
+    body: bytes
+
+    @classmethod
+    def from_body(cls, date: str, body: bytes) -> "WidgetDocument":
+        return cls(date, '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"', body)
+
+
+class WidgetCache:
+    """Latest widget document per tenant."""
+
+    def __init__(self):
+        self._documents: dict[str, WidgetDocument] = {}
+
+    def get(self, tenant: str, date: str) -> WidgetDocument | None:
+        doc = self._documents.get(tenant)
+        return doc if doc is not None and doc.date == date else None
+
+    def put(self, tenant: str, doc: WidgetDocument) -> None:
+        self._documents[tenant] = doc
+
+
+WIDGETS = WidgetCache()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header covers `etag` (weak comparison, as for GET)."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))